@@ -0,0 +1,5 @@
+"""
+Benchmarks of the engine hot paths, run from the repository root :
+    python -m benchmarks run -o results.json
+    python -m benchmarks compare baseline.json results.json
+"""
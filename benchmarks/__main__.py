@@ -0,0 +1,43 @@
+from typing import List, Optional
+import argparse
+import sys
+
+from . import runner
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Runs and compares the NasNas benchmarks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="run the benchmarks")
+    run_parser.add_argument('-o', '--output', help="json file where the results are written")
+    run_parser.add_argument('-k', '--filter', help="run only the cases whose name contains this string")
+    run_parser.add_argument('--repeat', type=int, default=5, help="number of measures of each case")
+    run_parser.add_argument('--min-time', type=float, default=0.1, help="minimum duration of a measure, in seconds")
+    run_parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data")
+
+    compare_parser = subparsers.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline', help="results of the reference run")
+    compare_parser.add_argument('current', help="results of the run to check")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="slowdown ratio above which a case is a regression (0.1 is 10%%)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        # registering the cases
+        from . import cases
+        results = runner.run(args.filter, args.repeat, args.min_time, args.seed)
+        if args.output:
+            runner.save(results, args.output)
+        return 1 if results['errors'] else 0
+
+    regressions = runner.compare(runner.load(args.baseline), runner.load(args.current), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) : {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
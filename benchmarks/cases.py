@@ -0,0 +1,334 @@
+"""
+Benchmarks of the engine hot paths.
+
+All the cases run with a single headless App on synthetic data generated from a fixed seed.
+Cases creating textures or render textures still need an OpenGL context : without any display (CI),
+run them under a virtual framebuffer (xvfb-run), otherwise they are reported as errors.
+"""
+import atexit
+import os
+import random
+import shutil
+import tempfile
+
+# without a display, NasNas must not query the video modes
+os.environ.setdefault("NASNAS_HEADLESS", "1")
+
+from sfml import sf
+
+import src.NasNas as ns
+from src.NasNas.tilemapping.cache import tmx_cache
+from src.NasNas.tilemapping.tmx import read_tmx
+from src.NasNas.tilemapping.tilesets import Tileset, MapTileset
+from src.NasNas.tilemapping.layers import TileLayer, ObjectGroup
+from src.NasNas.tilemapping.animations import TileAnimator
+from src.NasNas.ui.styles import BoxBorder
+
+from .runner import benchmark
+from .synthetic import TILE_SIZE, write_tmx
+
+_TEMP_DIR = tempfile.mkdtemp(prefix="nasnas_benchmarks_")
+atexit.register(shutil.rmtree, _TEMP_DIR, True)
+tmx_cache.directory = os.path.join(_TEMP_DIR, "cache")
+
+_app = None
+
+
+def get_app() -> ns.App:
+    global _app
+    if _app is None:
+        _app = ns.App("NasNas benchmarks", headless=True)
+    return _app
+
+
+def temp_path(name: str) -> str:
+    return os.path.join(_TEMP_DIR, name)
+
+
+def make_map(path: str, objectgroups: bool = False) -> ns.TiledMap:
+    """Creates a TiledMap with its tilesets but without their textures, which are not needed to build the tiles"""
+    get_app()
+    tiled_map = ns.TiledMap(path)
+    for tileset_data in tiled_map.data['tilesets']:
+        tileset = Tileset(tileset_data['tileset'], path)
+        tiled_map.tilesets.append(MapTileset(tileset, tileset_data['firstgid']))
+    for layer_data in tiled_map.data['layers']:
+        layer = TileLayer(tiled_map, layer_data)
+        layer.parse()
+        tiled_map.layers[layer.name] = layer
+    if objectgroups:
+        for objectgroup_data in tiled_map.data['objectgroups']:
+            objectgroup = ObjectGroup(tiled_map, objectgroup_data)
+            objectgroup.parse()
+            tiled_map.objectgroups[objectgroup.name] = objectgroup
+    return tiled_map
+
+
+@benchmark(32, 128, 256)
+def tilelayer_parse(size):
+    """Parsing a size x size layer and building the vertex arrays of all its chunks"""
+    tiled_map = make_map(write_tmx(temp_path(f"parse{size}.tmx"), size, size, layers=1))
+    layer_data = tiled_map.data['layers'][0]
+
+    def parse():
+        tiled_map.animator = TileAnimator()
+        layer = TileLayer(tiled_map, layer_data)
+        layer.parse()
+        for chunk in layer.chunks.values():
+            chunk.build()
+    return parse
+
+
+@benchmark("csv", "base64", "base64-zlib", "cached")
+def tmx_load(encoding):
+    """Reading a 256x256 map with 2 layers, from the xml file or from the cache"""
+    path = write_tmx(temp_path(f"load-{encoding}.tmx"), 256, 256, layers=2,
+                     encoding="base64-zlib" if encoding == "cached" else encoding)
+    if encoding == "cached":
+        tmx_cache.build(path, read_tmx)
+        return lambda: tmx_cache.load(path)
+    return lambda: read_tmx(path)
+
+
+@benchmark(1, 4, 16)
+def tiledmap_update(cameras):
+    """Streaming the chunks around moving views and updating the animated tiles of a 256x256 map"""
+    tiled_map = make_map(write_tmx(temp_path("update.tmx"), 256, 256, layers=2))
+    map_width, map_height = 256 * TILE_SIZE, 256 * TILE_SIZE
+    views = []
+    for _ in range(cameras):
+        position = [random.uniform(0, map_width - 320), random.uniform(0, map_height - 180)]
+        velocity = [random.uniform(-8, 8), random.uniform(-8, 8)]
+        views.append((position, velocity))
+
+    def update():
+        for position, velocity in views:
+            for i, limit in enumerate((map_width - 320, map_height - 180)):
+                position[i] += velocity[i]
+                if not 0 <= position[i] <= limit:
+                    velocity[i] = -velocity[i]
+                    position[i] = min(max(position[i], 0), limit)
+            area = ns.Rect(position, (320, 180))
+            for layer in tiled_map.layers.values():
+                layer.preload(area)
+        tiled_map.update()
+    return update
+
+
+def _platformer(rects: int, swept: bool):
+    app = get_app()
+    tiled_map = make_map(write_tmx(temp_path(f"platformer{rects}.tmx"), 128, 64, layers=1, collisions=rects), True)
+    tiled_map.set_collisions_objectgroup("collisions")
+    app.level = tiled_map
+
+    texture = sf.Texture.create(16, 16)
+    frames = [ns.AnimFrame(ns.Rect((0, 0), (16, 16)), 100, (8, 16))]
+    sprite = ns.Sprite("bench", texture, {"idle": ns.Anim(frames), "walk": ns.Anim(frames)})
+    entity = ns.PlatformerEntity("bench", sprite)
+    entity.position = (64, 16)
+    entity.swept_collisions = swept
+    state = {'tick': 0}
+
+    def update():
+        tick = state['tick'] = state['tick'] + 1
+        if (tick // 120) % 2:
+            entity.walk_left()
+        else:
+            entity.walk_right()
+        if tick % 40 == 0:
+            entity.jump()
+        entity.update(1/60)
+        # back to the top of the map when the entity fell out of it
+        if not 0 <= entity.x <= 128 * TILE_SIZE or entity.y > 64 * TILE_SIZE:
+            entity.position = (random.uniform(16, 128 * TILE_SIZE - 16), 16)
+    return update
+
+
+@benchmark(10, 100, 1000)
+def platformer_update(rects):
+    """Updating a platformer entity walking on a 128x64 map having the given number of collision rectangles"""
+    return _platformer(rects, False)
+
+
+@benchmark(10, 100, 1000)
+def platformer_swept_update(rects):
+    """Same as platformer_update, with the swept collisions"""
+    return _platformer(rects, True)
+
+
+@benchmark(64, 256)
+def collisions_layer(size):
+    """Building the collision grid of a size x size layer and merging its solid cells into rectangles"""
+    tiled_map = make_map(write_tmx(temp_path(f"grid{size}.tmx"), size, size, layers=1))
+    name = next(iter(tiled_map.layers))
+    return lambda: tiled_map.set_collisions_layer(name)
+
+
+@benchmark(100, 1000)
+def broadphase_update(count):
+    """Moving the given number of entity sized rectangles and finding their overlapping pairs"""
+    broadphase = ns.SweepAndPrune()
+    rects = []
+    for _ in range(count):
+        rect = ns.Rect((random.uniform(0, 2048), random.uniform(0, 1024)), (16, 24))
+        velocity = (random.uniform(-2, 2), random.uniform(-2, 2))
+        rects.append((rect, velocity))
+        broadphase.insert(rect, rect)
+
+    def update():
+        for rect, (vx, vy) in rects:
+            rect.left = (rect.left + vx) % 2048
+            rect.top = (rect.top + vy) % 1024
+            broadphase.update(rect, rect)
+        broadphase.update_pairs()
+    return update
+
+
+def _shapes_scene(layers: int, width: float, height: float, offscreen: bool) -> ns.Scene:
+    scene = ns.Scene(width, height, offscreen)
+    for order in range(layers):
+        shapes = []
+        for _ in range(100):
+            shape = sf.RectangleShape((random.randint(4, 64), random.randint(4, 64)))
+            shape.position = (random.uniform(0, width), random.uniform(0, height))
+            shape.fill_color = sf.Color(random.randrange(256), random.randrange(256), random.randrange(256))
+            shapes.append(shape)
+        scene.add_layer(ns.Layer(f"layer{order}", *shapes), order)
+    return scene
+
+
+@benchmark(1, 4, 16)
+def scene_render(layers):
+    """Rendering an offscreen scene with the given number of layers of 100 shapes each"""
+    app = get_app()
+    scene = _shapes_scene(layers, app.V_WIDTH, app.V_HEIGHT, True)
+    app.game_camera.scene = scene
+    return scene.render
+
+
+@benchmark("offscreen", "direct")
+def render_passes(mode):
+    """Drawing a 4 screens wide scene of 4 layers with two split screen cameras, on a render texture"""
+    app = get_app()
+    scene = _shapes_scene(4, 4 * app.V_WIDTH, app.V_HEIGHT, mode == "offscreen")
+    target = sf.RenderTexture(app.V_WIDTH, app.V_HEIGHT)
+    # the second camera is kept by the App for the next params
+    if not any(cam.name == "bench2" for cam in app.cameras):
+        app.create_camera("bench2", 0, ns.Rect((app.V_WIDTH, 0), (app.V_WIDTH / 2, app.V_HEIGHT)),
+                          ns.Rect((0.5, 0), (0.5, 1)))
+    for cam in app.cameras:
+        cam.scene = scene
+
+    def render():
+        if scene.offscreen:
+            scene.render()
+        else:
+            scene.prepare()
+        app.render_graph.execute(target)
+        target.display()
+    return render
+
+
+@benchmark(1.0, 0.5)
+def mask_update(resolution):
+    """Rendering a full screen mask with 20 lights at the given resolution"""
+    app = get_app()
+    lights = []
+    for _ in range(20):
+        light = sf.CircleShape(random.uniform(16, 96))
+        light.position = (random.uniform(0, app.V_WIDTH), random.uniform(0, app.V_HEIGHT))
+        light.fill_color = sf.Color.WHITE
+        lights.append(light)
+    mask = ns.Mask("bench", app.V_WIDTH, app.V_HEIGHT, sf.Color(20, 20, 40), *lights, resolution=resolution)
+    return mask.update
+
+
+@benchmark(10, 100)
+def bitmaptext_rebuild(length):
+    """Rebuilding a bitmap text of the given length"""
+    get_app()
+    font = ns.BitmapFont(sf.Texture.create(128, 64), (8, 8))
+    text = ns.BitmapText("".join(random.choice(font.chars_map) for _ in range(length)), font)
+
+    def rebuild():
+        text.font = font
+    return rebuild
+
+
+@benchmark(1, 100)
+def bitmaptext_counter(step):
+    """Setting the text of a bitmap counter incremented by step"""
+    get_app()
+    font = ns.BitmapFont(sf.Texture.create(128, 64), (8, 8))
+    text = ns.BitmapText("SCORE 0", font)
+    state = {'score': 0}
+
+    def update():
+        state['score'] += step
+        text.text = f"SCORE {state['score']}"
+    return update
+
+
+@benchmark(1000, 10000)
+def layer_cull(count):
+    """Culling a layer of the given number of bitmap texts spread over a 16 screens wide area"""
+    app = get_app()
+    font = ns.BitmapFont(sf.Texture.create(128, 64), (8, 8))
+    texts = []
+    for _ in range(count):
+        text = ns.BitmapText("COIN", font)
+        text.position = (random.uniform(0, 16 * app.V_WIDTH), random.uniform(0, app.V_HEIGHT))
+        texts.append(text)
+    layer = ns.Layer("texts", *texts)
+    view = ns.Rect((0, 0), (app.V_WIDTH, app.V_HEIGHT))
+    state = {'x': 0.0}
+
+    def cull():
+        state['x'] = (state['x'] + 4) % (15 * app.V_WIDTH)
+        view.left = state['x']
+        layer.cull(view)
+    return cull
+
+
+@benchmark("full", "incremental")
+def layer_ysort(mode):
+    """Sorting by y a layer of 2000 bitmap texts, 20 of which move each frame"""
+    get_app()
+    font = ns.BitmapFont(sf.Texture.create(128, 64), (8, 8))
+    texts = [ns.BitmapText("COIN", font) for _ in range(2000)]
+    for text in texts:
+        text.position = (random.uniform(0, 2048), random.uniform(0, 2048))
+    layer = ns.Layer("texts", *texts, ysorted=mode == "incremental")
+
+    def ysort():
+        for text in random.sample(texts, 20):
+            text.position = (text.position.x, random.uniform(0, 2048))
+        layer.ysort()
+    return ysort
+
+
+@benchmark(64, 256)
+def boxborder_generate(size):
+    """Generating the texture of a size x size box border"""
+    get_app()
+    border = BoxBorder(sf.Texture.create(48, 48), (0, 0), (16, 16))
+
+    def generate():
+        # generated textures are cached by size
+        border.clear_cache()
+        border.generate_texture(size, size)
+    return generate
+
+
+@benchmark(1, 2, 4, 8, 16)
+def transition_pixels_in(pixel_size):
+    """Creating a PixelsIn transition and running its first 10 updates"""
+    get_app()
+
+    def run():
+        transition = ns.transitions.PixelsIn(100, pixel_size)
+        transition.start()
+        for _ in range(10):
+            transition.update()
+        transition.end()
+    return run
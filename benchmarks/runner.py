@@ -0,0 +1,145 @@
+"""
+Benchmarks runner : times the registered cases and compares the results of two runs.
+"""
+from typing import Callable, Dict, List, Optional
+import datetime
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import traceback
+
+
+class Benchmark:
+    def __init__(self, name: str, setup: Callable, params: list):
+        """
+        Args:
+            name (str): name of the benchmark
+            setup (callable): called with each param, returns the function to time
+            params (list): parameters the benchmark is run with
+        """
+        self.name = name
+        self.setup = setup
+        self.params = params
+
+    def case_name(self, param) -> str:
+        return self.name if param is None else f"{self.name}[{param}]"
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(*params):
+    """
+    Registers a benchmark case. The decorated function is called with each param (or None)
+    to prepare the data and returns the function to time, so the setup is not measured.
+    """
+    def decorator(setup: Callable):
+        BENCHMARKS.append(Benchmark(setup.__name__, setup, list(params) or [None]))
+        return setup
+    return decorator
+
+
+def measure(function: Callable, repeat: int, min_time: float) -> Dict[str, float]:
+    """
+    Times a function. The number of calls per measure is calibrated so a measure lasts at least min_time,
+    the statistics are computed on the time per call of repeat measures, in seconds.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run(pattern: Optional[str] = None, repeat: int = 5, min_time: float = 0.1, seed: int = 0) -> dict:
+    """Runs the benchmarks whose case name contains pattern, returns the results"""
+    results = {}
+    errors = {}
+    for bench in BENCHMARKS:
+        for param in bench.params:
+            name = bench.case_name(param)
+            if pattern and pattern not in name:
+                continue
+            # synthetic data is generated from a fixed seed, so runs are reproducible
+            random.seed(seed)
+            try:
+                function = bench.setup(param)
+                results[name] = measure(function, repeat, min_time)
+                print(f"{name:<40} {1000 * results[name]['median']:>12.4f} ms")
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+                print(f"{name:<40} {'error':>12}   {errors[name]}")
+                traceback.print_exc(file=sys.stderr)
+
+    return {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'min_time': min_time,
+            'seed': seed,
+        },
+        'results': results,
+        'errors': errors,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[str]:
+    """
+    Prints the median time ratio of each case of both runs.
+    Returns the names of the cases slower than the baseline by more than threshold (0.1 is 10%).
+    """
+    regressions = []
+    print(f"{'case':<40} {'baseline (ms)':>14} {'current (ms)':>14} {'ratio':>8}")
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print(f"{name:<40} {'-':>14} {1000 * result['median']:>14.4f} {'new':>8}")
+            continue
+        old = baseline['results'][name]['median']
+        ratio = result['median'] / old if old > 0 else float('inf')
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "improved"
+        print(f"{name:<40} {1000 * old:>14.4f} {1000 * result['median']:>14.4f} {ratio:>8.2f} {flag}")
+    for name in baseline['results']:
+        if name not in current['results']:
+            print(f"{name:<40} {1000 * baseline['results'][name]['median']:>14.4f} {'-':>14} {'missing':>8}")
+    return regressions
+
+
+def save(results: dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
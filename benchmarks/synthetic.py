@@ -0,0 +1,86 @@
+"""
+Generation of synthetic Tiled maps for the benchmarks.
+"""
+from typing import List, Tuple
+import base64
+import random
+import struct
+import zlib
+
+TILE_SIZE = 16
+TILESET_COLUMNS = 16
+TILESET_ROWS = 16
+# tiles ids of the generated tileset having an animation
+ANIMATED_TILES = [0, 1, 2, 3]
+
+
+def _layer_data(gids: List[int], encoding: str) -> str:
+    if encoding == "csv":
+        return '<data encoding="csv">' + ",".join(str(gid) for gid in gids) + '</data>'
+    raw = struct.pack(f"<{len(gids)}I", *gids)
+    if encoding == "base64-zlib":
+        return '<data encoding="base64" compression="zlib">' + base64.b64encode(zlib.compress(raw)).decode() + '</data>'
+    return '<data encoding="base64">' + base64.b64encode(raw).decode() + '</data>'
+
+
+def random_gids(count: int, fill: float = 0.7, flipped: float = 0.1) -> List[int]:
+    """Returns random gids, fill is the ratio of non empty tiles and flipped the ratio of transformed tiles"""
+    gids = []
+    tile_count = TILESET_COLUMNS * TILESET_ROWS
+    for _ in range(count):
+        if random.random() < fill:
+            gid = random.randrange(tile_count) + 1
+            if random.random() < flipped:
+                gid |= random.choice((0x80000000, 0x40000000, 0x20000000))
+            gids.append(gid)
+        else:
+            gids.append(0)
+    return gids
+
+
+def random_rects(count: int, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+    """Returns count random tile aligned rectangles, in pixels"""
+    rects = []
+    for _ in range(count):
+        w = random.randint(1, 8) * TILE_SIZE
+        h = random.randint(1, 4) * TILE_SIZE
+        x = random.randrange(0, max(1, width * TILE_SIZE - w), TILE_SIZE)
+        y = random.randrange(0, max(1, height * TILE_SIZE - h), TILE_SIZE)
+        rects.append((x, y, w, h))
+    return rects
+
+
+def generate_tmx(width: int, height: int, layers: int = 2, encoding: str = "csv", collisions: int = 0) -> str:
+    """Returns the content of a .tmx file with an embedded tileset, random tile layers and collisions rectangles"""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<map version="1.2" orientation="orthogonal" renderorder="right-down" width="{width}" height="{height}" '
+        f'tilewidth="{TILE_SIZE}" tileheight="{TILE_SIZE}" infinite="0">',
+        f' <tileset firstgid="1" name="synthetic" tilewidth="{TILE_SIZE}" tileheight="{TILE_SIZE}" '
+        f'tilecount="{TILESET_COLUMNS * TILESET_ROWS}" columns="{TILESET_COLUMNS}">',
+        f'  <image source="synthetic.png" width="{TILESET_COLUMNS * TILE_SIZE}" height="{TILESET_ROWS * TILE_SIZE}"/>',
+    ]
+    for tile_id in ANIMATED_TILES:
+        lines.append(f'  <tile id="{tile_id}"><animation>')
+        for frame in range(4):
+            lines.append(f'   <frame tileid="{(tile_id + frame) % len(ANIMATED_TILES)}" duration="{100 + 50 * tile_id}"/>')
+        lines.append('  </animation></tile>')
+    lines.append(' </tileset>')
+
+    for index in range(layers):
+        lines.append(f' <layer id="{index + 1}" name="layer{index}" width="{width}" height="{height}">')
+        lines.append('  ' + _layer_data(random_gids(width * height), encoding))
+        lines.append(' </layer>')
+
+    lines.append(f' <objectgroup id="{layers + 1}" name="collisions">')
+    for index, (x, y, w, h) in enumerate(random_rects(collisions, width, height)):
+        lines.append(f'  <object id="{index + 1}" x="{x}" y="{y}" width="{w}" height="{h}"/>')
+    lines.append(' </objectgroup>')
+    lines.append('</map>')
+    return "\n".join(lines)
+
+
+def write_tmx(path: str, *args, **kwargs) -> str:
+    with open(path, 'w') as file:
+        file.write(generate_tmx(*args, **kwargs))
+    return path
@@ -10,6 +10,16 @@ class Player(ns.PlatformerEntity):
         self.jump_velocity = sf.Vector2(0, -15)
         self.score = 0
 
+        # coins are picked when the player starts overlapping them
+        @self.on_overlap_enter
+        def pick_coin(other):
+            # a coin overlapped by both players is picked by the first one only
+            if other.name == "coin" and other in self.game.broadphase:
+                self.score += 1
+                # removing the coin from its layer also removes it from the broad-phase
+                self.game.entities_layer.remove(other)
+                self.game.coins.remove(other)
+
     def update(self, dt, inputs=None):
         if self.controls['up'] in inputs:
             if self.remaining_jumps > 0 and not self.falling:
@@ -35,14 +45,6 @@ class Player(ns.PlatformerEntity):
         else:
             self.idle()
 
-        to_remove = []
-        for coin in self.game.coins:
-            if self.global_bounds.intersects(coin.global_bounds):
-                self.score += 1
-                self.game.entities_layer.remove(coin)
-                to_remove.append(coin)
-        self.game.coins = [c for c in self.game.coins if c not in to_remove]
-
         super().update(dt)
 
 
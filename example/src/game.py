@@ -8,7 +8,7 @@ from example.src import menus
 
 class MyGame(ns.App):
     def __init__(self):
-        super().__init__("NasNas - Example Game", 960, 576, 320, 192, 60)
+        super().__init__("NasNas - Example Game", 960, 576, 320, 192, 60, tick_rate=60)
 
         self.window.key_repeat_enabled = False
         self.window.vertical_synchronization = True
@@ -33,7 +33,7 @@ class MyGame(ns.App):
                 ns.Rect(tileset.get_tile_tex_coord(frame['id']), (tileset.tile_width, tileset.tile_height)),
                 frame['duration'])
             )
-        coin_spr = ns.Sprite(name="coin", texture=ns.Res.tilesets.Assets, anims={"idle": coin_anim})
+        coin_spr = ns.Sprite(name="coin", texture=tileset.texture, anims={"idle": coin_anim})
 
         for point in self.level.objectgroups['coins'].points:
             new_coin = ns.BaseEntity("coin", coin_spr)
@@ -71,14 +71,17 @@ class MyGame(ns.App):
         self.text_bitmap4.position = sf.Vector2(2 * 16, 7 * 16) + sf.Vector2(0, -60)
 
         # creating the layers
-        map_back_layer = ns.Layer("map_back", self.level.layers["back"])
-        map_front_layer = ns.Layer("map_front", self.level.layers["front"])
+        map_back_layer = ns.Layer("map_back", self.level.layers["back"], static=True)
+        map_front_layer = ns.Layer("map_front", self.level.layers["front"], static=True)
         texts_layers = ns.Layer("texts", self.text_bitmap, self.text_bitmap2, self.text_bitmap3, self.text_bitmap4)
-        self.entities_layer = ns.Layer("entities", self.player1, self.player2, *self.coins)
+        # entities are drawn from top to bottom, the layer only reorders the entities which moved.
+        # the batch keeps this order, drawing consecutive entities sharing a texture at once
+        self.entities_layer = ns.Layer("entities", self.player1, self.player2, *self.coins, batched=True, ysorted=True)
         self.map_collisions_layer = ns.Layer("map_collisions", self.level.objectgroups["collisions"], self.level.objectgroups["coins"], self.level.objectgroups["path"])
 
         # creating a mask layer and adding drawables to it
-        self.mask = ns.Mask("light", self.level.width * 16, self.level.height * 16, sf.Color(20, 10, 80, 238))
+        self.mask = ns.Mask("light", self.level.width * 16, self.level.height * 16, sf.Color(20, 10, 80, 238),
+                            resolution=0.5, visible_only=True)
 
         self.p1_light = entities.Light(self.player1.position, self.mask.fill_color)
         self.p2_light = entities.Light(self.player2.position, self.mask.fill_color)
@@ -97,12 +100,10 @@ class MyGame(ns.App):
         self.HUD_camera = self.create_camera("HUD_camera", 5, ns.Rect((0, 0), self.window.ui_view.size))
 
         # players scores text
-        self.p1_score_text = sf.Text(str(self.player1.score))
-        self.p1_score_text.font = ns.Res.arial
-        self.p1_score_text.character_size = 16
-        self.p2_score_text = sf.Text(str(self.player2.score))
-        self.p2_score_text.font = ns.Res.arial
-        self.p2_score_text.character_size = 16
+        self.p1_score_text = ns.BitmapText(str(self.player1.score), bitmap_font)
+        self.p1_score_text.scale = (2, 2)
+        self.p2_score_text = ns.BitmapText(str(self.player2.score), bitmap_font)
+        self.p2_score_text.scale = (2, 2)
         self.p2_score_text.position = sf.Vector2(self.window.ui_view.size.x - self.window.ui_view.size.x/2, 0)
 
         # adding the text to HUD_scene
@@ -170,6 +171,8 @@ class MyGame(ns.App):
                 else:
                     self.scene.add_layer(self.map_collisions_layer, 9)
                 self.debug = not self.debug
+                # profiling the frames while in debug mode
+                self.profiler.enabled = self.debug
 
             elif event["code"] == ns.Keyboard.M:        # camera quake
                 self.game_camera.quake(duration=5, amplitude=2)
@@ -190,11 +193,10 @@ class MyGame(ns.App):
             for drawable in layer:
                 if isinstance(drawable, ns.BaseEntity):
                     drawable.update(self.dt, self.inputs)
-            layer.ysort()
 
         # updating score texts
-        self.p1_score_text.string = str(self.player1.score)
-        self.p2_score_text.string = str(self.player2.score)
+        self.p1_score_text.text = str(self.player1.score)
+        self.p2_score_text.text = str(self.player2.score)
 
         # updating lights
         self.p1_light.update()
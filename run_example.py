@@ -20,9 +20,18 @@ if not found:
     except:
         print("arial.ttf not found")
 loading_window.display()
+
+
+def loading_progress(loaded, total, name):
+    # drawing a loading bar at the bottom of the loading window
+    bar = sf.RectangleShape((160 * loaded / total, 4))
+    bar.position = (0, 86)
+    bar.fill_color = sf.Color.WHITE
+    loading_window.draw(bar)
+    loading_window.display()
 #################################
 
-ns.Res.load()
+ns.Res.load(progress=loading_progress)
 ns.Res.print_tree()
 
 from example.src.game import MyGame
@@ -5,13 +5,14 @@ from .tilemapping import *
 from . import ui
 
 __all__ = [
-    'App', 'Camera', 'Scene', 'Layer', 'Mask', 'Sprite', 'Anim', 'AnimFrame', 'BitmapText', 'BitmapFont',
+    'App', 'Camera', 'Scene', 'RenderGraph', 'RenderPass', 'Layer', 'Mask', 'SpriteBatch',
+    'Sprite', 'Anim', 'AnimFrame', 'BitmapText', 'BitmapFont',
     'BaseEntity', 'PlatformerEntity',
     'transitions',
 
-    'Keyboard', 'Rect', 'SCREEN_W', 'SCREEN_H', 'LineShape', 'EllipseShape',
+    'Keyboard', 'Rect', 'SCREEN_W', 'SCREEN_H', 'LineShape', 'EllipseShape', 'SpatialHash', 'SweepAndPrune',
 
-    'Res', 'find_resource', 'RES_DIR',
+    'Res', 'find_resource', 'RES_DIR', 'TextureAtlas', 'AtlasRegion',
 
     'TiledMap',
 
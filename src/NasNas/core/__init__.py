@@ -1,18 +1,20 @@
 from .app import App
 from .camera import Camera
 from .scenes import Scene
+from .render_graph import RenderGraph, RenderPass
 from .layers import Layer, Mask
+from .batch import SpriteBatch
 from .sprites import Sprite, AnimFrame, Anim
 from .entities import BaseEntity, PlatformerEntity
 from .text import BitmapText, BitmapFont
 from .debug import Logger
-from .window import RenderWindow
+from .window import RenderWindow, HeadlessWindow
 from . import transitions
 
 __all__ = [
-    'App', 'Camera', 'Scene', 'Layer', 'Mask',
+    'App', 'Camera', 'Scene', 'RenderGraph', 'RenderPass', 'Layer', 'Mask', 'SpriteBatch',
     'Sprite', 'Anim', 'AnimFrame', 'BitmapText', 'BitmapFont',
     'BaseEntity', 'PlatformerEntity',
     'transitions',
-    'Logger', 'RenderWindow'
+    'Logger', 'RenderWindow', 'HeadlessWindow'
 ]
@@ -5,6 +5,9 @@ from sfml import sf
 from ..data.game_obj import GameObject
 from ..data import const
 from ..data.rect import Rect
+from ..data.broadphase import SweepAndPrune
+from ..data.callbacks import HasCallbacks
+from ..reslib import Res
 from .. import ui
 
 from . import camera
@@ -12,11 +15,14 @@ from . import scenes
 from . import debug
 from . import transitions
 from . import window
+from .profiler import Profiler
+from .render_graph import RenderGraph
 
 
 class App:
     def __init__(self, title: str = "NasNas game", w_width: int = 960, w_height: int = 540,
-                 v_width: float = 960, v_height: float = 540, fps: Optional[int] = 60):
+                 v_width: float = 960, v_height: float = 540, fps: Optional[int] = 60,
+                 tick_rate: Optional[int] = None, max_steps: int = 5, headless: bool = False):
         """
         Initializes the engine and creates:
             - a window
@@ -29,6 +35,13 @@ class App:
             v_width (int): game view width
             v_height (int): game view height
             fps (int): desired fps
+            tick_rate (int): if given, the game is updated at this fixed rate (ticks per second)
+                whatever the framerate is, and self.dt is always 1/tick_rate.
+                Otherwise, the game is updated once per frame with the frame duration as dt
+            max_steps (int): maximum number of ticks run to catch up in one frame, in fixed timestep mode
+            headless (bool): if True, no window is created and nothing is rendered. The game logic runs unchanged,
+                for servers, bots and benchmarks. Set NASNAS_HEADLESS environment variable to import the
+                engine on a machine without display
         """
         GameObject.game = self
 
@@ -39,7 +52,11 @@ class App:
         self.name = title
 
         self.desired_fps = fps
-        self._window = window.RenderWindow(sf.VideoMode(w_width, w_height), self.name)
+        self.headless = headless
+        if headless:
+            self._window = window.HeadlessWindow(w_width, w_height, self.name)
+        else:
+            self._window = window.RenderWindow(sf.VideoMode(w_width, w_height), self.name)
 
         if self.desired_fps:
             self._window.framerate_limit = self.desired_fps
@@ -50,14 +67,16 @@ class App:
 
         # inputs from keyboard are stored in this list
         self._inputs: List[int] = []
-        # list of all cameras/view used in the game
-        self._cameras: List[camera.Camera] = []
+        # all cameras/view used in the game, a render pass is executed for each camera in render order
+        self.render_graph = RenderGraph()
         # list of all scenes used in the game, usually 1 is enough
         self._scenes: List[scenes.Scene] = []
         # list of all playing transitions
         self._transitions: List[transitions.Transition] = []
         # list of all menus
         self._menus: List[ui.Menu] = []
+        # overlaps between entities, entities add themselves and update their bounds
+        self.broadphase = SweepAndPrune()
 
         # Scene is where everything is drawn on
         self.scene = self.create_scene(w_width, w_height)
@@ -69,11 +88,34 @@ class App:
         self.clock = sf.Clock()
         self.dt = 1.0
 
+        # fixed timestep simulation
+        self.tick_rate = tick_rate
+        self.max_steps = max_steps
+        self.ticks = 0
+        self._accumulator = 0.0
+        self._alpha = 1.0
+
         self.debug = False
         self.debug_texts = []  # list of DebugText
 
+        # times the phases of the game loop when enabled, displayed in debug mode
+        self.profiler = Profiler()
+        self.profiler_overlay: Optional[debug.ProfilerOverlay] = None
+
         self.scale_view()
 
+    @property
+    def fixed_timestep(self) -> bool:
+        return self.tick_rate is not None
+
+    @property
+    def alpha(self) -> float:
+        """
+        Interpolation factor between the previous and the current tick states, from 0 to 1.
+        Drawables can use it to render smooth movements in fixed timestep mode, it is always 1 otherwise.
+        """
+        return self._alpha
+
     @property
     def window(self) -> window.RenderWindow:
         return self._window
@@ -96,7 +138,8 @@ class App:
 
     @property
     def cameras(self) -> List[camera.Camera]:
-        return self._cameras
+        """Cameras in render order, add or remove them with create_camera and remove_camera"""
+        return self.render_graph.cameras
 
     @property
     def scenes(self) -> List[scenes.Scene]:
@@ -110,18 +153,19 @@ class App:
     def menus(self) -> List[ui.Menu]:
         return self._menus
 
-    def create_scene(self, width: int, height: int):
+    def create_scene(self, width: int, height: int, offscreen: bool = False):
         """
         Creates a new Scene and returns it.
 
         Args:
             width (int): width of the new scene
             height (int): height of the new scene
+            offscreen (bool): if True, the scene is rendered on its own texture before the cameras draw it
 
         Returns:
             Returns the created Scene.
         """
-        s = scenes.Scene(width, height)
+        s = scenes.Scene(width, height, offscreen)
         self.scenes.append(s)
         return s
 
@@ -148,9 +192,12 @@ class App:
         cam = camera.Camera(name, order)
         cam.reset(camwindow.topleft, camwindow.size)
         cam.reset_viewport(viewport.topleft, viewport.size)
-        self.cameras.append(cam)
+        self.render_graph.add(cam)
         return cam
 
+    def remove_camera(self, cam: camera.Camera):
+        self.render_graph.remove(cam)
+
     def add_debug_text(self, instance: object, attr_name: str, position: tuple, float_round: int = None):
         """
         Adds a DebugText to self.debug_texts. The text will be drawn at the given position
@@ -171,6 +218,8 @@ class App:
             self.debug_texts.append(debug.DebugText(instance, attr_name, position))
 
     def toggle_fullscreen(self):
+        if self.headless:
+            return
         if not self.fullscreen:
             self.window.close()
             self._window = window.RenderWindow(sf.VideoMode(const.SCREEN_W, const.SCREEN_H), self.name, sf.Style.NONE)
@@ -247,49 +296,134 @@ class App:
         Write here your game logic
         """
 
+    def tick(self):
+        """
+        Runs one simulation step with the current self.dt. It does not use the window,
+        so the simulation can be ticked without rendering (servers, tests).
+        """
+        # finishing the loading of the resources prefetched in the background
+        if Res.is_loading:
+            Res.update()
+
+        with self.profiler.section("update"):
+            self.update()
+        with self.profiler.section("broadphase"):
+            self.update_overlaps()
+        self.ticks += 1
+
+    def update_overlaps(self):
+        """Finds the overlapping entities and calls their on_overlap_enter and on_overlap_exit callbacks"""
+        entered, exited = self.broadphase.update_pairs()
+        for name, pairs in (("on_overlap_enter", entered), ("on_overlap_exit", exited)):
+            for a, b in pairs:
+                if isinstance(a, HasCallbacks):
+                    a.callbacks.call(name, b)
+                if isinstance(b, HasCallbacks):
+                    b.callbacks.call(name, a)
+
+    def step(self, frame_time: float):
+        """
+        Advances the simulation by frame_time seconds.
+        In fixed timestep mode, runs as many ticks as fit in the accumulated time, up to max_steps.
+        The time left is kept for the next frames and gives the interpolation alpha.
+
+        Args:
+            frame_time (float): time elapsed since the last step, in seconds
+        """
+        if not self.fixed_timestep:
+            self.dt = frame_time
+            self.tick()
+            return
+
+        fixed_dt = 1 / self.tick_rate
+        self._accumulator += frame_time
+        steps = 0
+        while self._accumulator >= fixed_dt and steps < self.max_steps:
+            self.dt = fixed_dt
+            self.tick()
+            self._accumulator -= fixed_dt
+            steps += 1
+        if self._accumulator >= fixed_dt:
+            # too slow to catch up, dropping the late ticks instead of accumulating more and more delay
+            self._accumulator %= fixed_dt
+        self._alpha = self._accumulator / fixed_dt
+
     def _render(self):
         """
         Draw all Scenes and Layers in order.
         Layer 0 will be drawn first, layer 1 will be drawn over layer 0 etc
         Internal usage only, do not override or call this method.
         """
-        for scene in self.scenes:
-            scene.render()
-        for cam in self.cameras:
-            cam.update()
-        self.cameras.sort(key=lambda x: x.render_order)
-        for cam in self.cameras:
-            if cam.visible:
-                self.window.view = cam
-                if cam.has_scene():
-                    self.window.draw(cam.scene)
+        # cameras are updated first, so the scenes are prepared for the views they are drawn with
+        with self.profiler.section("cameras"):
+            for cam in self.cameras:
+                cam.update()
+        with self.profiler.section("render"):
+            for scene in self.scenes:
+                if scene.offscreen:
+                    scene.render()
+                else:
+                    scene.prepare()
+        # each camera draws its scene on the window, directly with its view unless the scene is offscreen
+        with self.profiler.section("passes"):
+            self.render_graph.execute(self.window)
 
         # drawing transitions on top of everything else directly on the window
         self.window.view = self.window.ui_view
-        for menu in self.menus:
-            menu.update()
-            self.window.draw(menu)
-        for transition in self.transitions:
-            transition.update()
-            self.window.draw(transition)
-
-    def run(self):
+        with self.profiler.section("menus"):
+            for menu in self.menus:
+                menu.update()
+                self.window.draw(menu)
+        with self.profiler.section("transitions"):
+            for transition in self.transitions:
+                transition.update()
+                self.window.draw(transition)
+
+    def _run_headless(self):
         """
-        Starts the game loop.
+        Runs one iteration of the headless game loop : the game logic, cameras and transitions are updated
+        but nothing is rendered. Time goes one tick per iteration, or one frame at the desired fps.
         """
-        while self.window.is_open:
-            self.dt = self.clock.restart().seconds
-            self.window.title = self.name+" - FPS:" + str(round(1 / self.dt))
-
-            for event in self.window.events:
-                if not self._menus:
-                    self._store_inputs(event)
-                    self.event_handler(event)
-                else:
-                    self._inputs = []
-                    self._menus[-1].event_handler(event)
+        self.profiler.begin_frame()
+        if self.fixed_timestep:
+            self.step(1 / self.tick_rate)
+        else:
+            self.step(1 / (self.desired_fps or 60))
+        with self.profiler.section("cameras"):
+            for cam in self.cameras:
+                cam.update()
+        with self.profiler.section("transitions"):
+            for transition in list(self.transitions):
+                transition.update()
+        self.profiler.end_frame()
+
+    def run(self, ticks: Optional[int] = None):
+        """
+        Starts the game loop.
 
-            self.update()
+        Args:
+            ticks (int): if given, the loop stops after this number of ticks instead of running until the window is closed
+        """
+        end = None if ticks is None else self.ticks + ticks
+        while self.window.is_open and (end is None or self.ticks < end):
+            if self.headless:
+                self._run_headless()
+                continue
+
+            frame_time = self.clock.restart().seconds
+            self.window.title = self.name+" - FPS:" + str(round(1 / frame_time))
+            self.profiler.begin_frame()
+
+            with self.profiler.section("events"):
+                for event in self.window.events:
+                    if not self._menus:
+                        self._store_inputs(event)
+                        self.event_handler(event)
+                    else:
+                        self._inputs = []
+                        self._menus[-1].event_handler(event)
+
+            self.step(frame_time)
 
             self.window.clear(sf.Color.BLACK)
 
@@ -300,5 +434,12 @@ class App:
                 for txt in self.debug_texts:
                     txt.update()
                     self.window.draw(txt)
-
-            self.window.display()
+                if self.profiler.enabled:
+                    if self.profiler_overlay is None:
+                        self.profiler_overlay = debug.ProfilerOverlay(self.profiler, (5, self.W_HEIGHT / 2))
+                    self.profiler_overlay.update()
+                    self.window.draw(self.profiler_overlay)
+
+            with self.profiler.section("display"):
+                self.window.display()
+            self.profiler.end_frame()
@@ -0,0 +1,138 @@
+from typing import Dict, List, Set, Tuple
+import math
+
+from sfml import sf
+
+
+class SpriteBatch(sf.Drawable):
+    """
+    Collects sprites and draws consecutive sprites sharing a texture with a single QUADS VertexArray,
+    so sprites on the same texture atlas cost one draw call.
+    Texture rectangle, origin, ratio (entities direction), rotation, position and color of each sprite are honoured.
+    The drawing order is kept : a sprite with another texture than the previous one starts a new run of quads.
+    Untextured rectangles are runs without texture, drawn in the order they were added too.
+
+    Entities are added with their `add_to_batch` method, which also adds their debug collision box.
+    """
+    def __init__(self):
+        super().__init__()
+        # texture id -> vertex arrays of the runs of this texture, kept and reused from one frame to the next
+        self._pools: Dict[int, List[sf.VertexArray]] = {}
+        # texture id -> number of vertex arrays of the pool used by the current runs
+        self._used: Dict[int, int] = {}
+        # textures used since the last clear
+        self._frame_textures: Set[int] = set()
+        # [texture id, texture, vertex array, number of quads used], in drawing order. Rectangles runs have no texture
+        self._runs: List[list] = []
+        self._draw_calls = 0
+
+    @staticmethod
+    def is_batchable(drawable) -> bool:
+        return isinstance(drawable, sf.Sprite) or hasattr(drawable, "add_to_batch")
+
+    def reset(self):
+        """Empties the batch after it was drawn, the vertex arrays are kept and reused"""
+        self._runs = []
+        self._used = {}
+
+    def clear(self):
+        """
+        Empties the batch at the start of a frame.
+        The vertex arrays of the textures not used since the last clear are freed, the others are kept.
+        """
+        for key in list(self._pools.keys()):
+            if key not in self._frame_textures:
+                del self._pools[key]
+        self._frame_textures = set()
+        self.reset()
+
+    def add(self, drawable):
+        """Adds an sf.Sprite, or an object having an `add_to_batch(batch)` method"""
+        if isinstance(drawable, sf.Sprite):
+            self.add_sprite(drawable)
+        else:
+            drawable.add_to_batch(self)
+
+    @staticmethod
+    def _reserve(vertices: sf.VertexArray, count: int):
+        # vertex arrays are reused from one frame to the next, they are only trimmed when drawn
+        if len(vertices) < 4*count:
+            vertices.resize(4*count)
+
+    def _get_run(self, texture) -> list:
+        key = id(texture)
+        if self._runs and self._runs[-1][0] == key:
+            return self._runs[-1]
+        pool = self._pools.setdefault(key, [])
+        index = self._used.get(key, 0)
+        if index == len(pool):
+            pool.append(sf.VertexArray(sf.PrimitiveType.QUADS))
+        self._used[key] = index + 1
+        self._frame_textures.add(key)
+        run = [key, texture, pool[index], 0]
+        self._runs.append(run)
+        return run
+
+    def _add_quad(self, texture) -> Tuple[sf.VertexArray, int]:
+        """Returns the vertex array and the index of the first vertex of a new quad"""
+        run = self._get_run(texture)
+        vertices = run[2]
+        self._reserve(vertices, run[3] + 1)
+        v = 4*run[3]
+        run[3] += 1
+        return vertices, v
+
+    def add_sprite(self, sprite: sf.Sprite):
+        vertices, v = self._add_quad(sprite.texture)
+
+        rectangle = sprite.texture_rectangle
+        left, top, width, height = rectangle.left, rectangle.top, rectangle.width, rectangle.height
+        w, h = abs(width), abs(height)
+        # affine transform of the sprite, computed like sf.Transformable does, to transform the corners without vectors
+        position, origin, scale = sprite.position, sprite.origin, sprite.ratio
+        angle = -math.radians(sprite.rotation)
+        cos, sin = math.cos(angle), math.sin(angle)
+        a, b = scale.x*cos, scale.y*sin
+        c, d = -scale.x*sin, scale.y*cos
+        tx = position.x - origin.x*a - origin.y*b
+        ty = position.y - origin.x*c - origin.y*d
+        color = sprite.color
+        corners = ((0, 0, left, top), (w, 0, left + width, top),
+                   (w, h, left + width, top + height), (0, h, left, top + height))
+        for k, (x, y, u, t) in enumerate(corners):
+            vertex = vertices[v + k]
+            vertex.position = (a*x + b*y + tx, c*x + d*y + ty)
+            vertex.tex_coords = (u, t)
+            vertex.color = color
+
+    def add_rectangle(self, position: Tuple[float, float], size: Tuple[float, float], color: sf.Color):
+        """Adds an untextured rectangle (used for debug shapes), drawn in the order it was added"""
+        vertices, v = self._add_quad(None)
+        x, y = position
+        w, h = size
+        for k, point in enumerate(((x, y), (x + w, y), (x + w, y + h), (x, y + h))):
+            vertex = vertices[v + k]
+            vertex.position = point
+            vertex.color = color
+            vertex.tex_coords = (0, 0)
+
+    @property
+    def draw_calls(self) -> int:
+        """Number of draw calls issued by the last draw"""
+        return self._draw_calls
+
+    def __len__(self):
+        return sum(run[3] for run in self._runs)
+
+    def draw(self, target, states):
+        self._draw_calls = 0
+        for _, texture, vertices, count in self._runs:
+            # dropping the quads left from a previous frame with more sprites, resizing keeps the allocated memory
+            if len(vertices) != 4*count:
+                vertices.resize(4*count)
+            if texture is None:
+                target.draw(vertices, sf.RenderStates(states.blend_mode, states.transform))
+            else:
+                states.texture = texture
+                target.draw(vertices, states)
+            self._draw_calls += 1
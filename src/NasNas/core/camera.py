@@ -5,14 +5,14 @@ from sfml import sf
 
 from ..data.game_obj import GameObject
 from ..data.rect import Rect
-from .utils import to_Vector2
+from .utils import to_Vector2, get_view_bounds
 
 
 class Camera(GameObject, sf.View):
     def __init__(self, name, render_order):
         super().__init__()
         self.name = name
-        self.render_order = render_order
+        self._render_order = render_order
         self.reference = None
         self.state = CameraState()
         self.frames_delay = 15
@@ -40,6 +40,17 @@ class Camera(GameObject, sf.View):
         else:
             raise TypeError("position and size arguments of Camera.reset_viewport() should be a sf.Vector or tuple.")
 
+    @property
+    def render_order(self) -> int:
+        return self._render_order
+
+    @render_order.setter
+    def render_order(self, value: int):
+        self._render_order = value
+        # keeping the render passes sorted
+        if self.game is not None:
+            self.game.render_graph.reorder(self)
+
     @property
     def scene(self):
         return self._scene[0]
@@ -100,6 +111,11 @@ class Camera(GameObject, sf.View):
     def bounds(self) -> Rect:
         return Rect((self.left, self.top), (self.size.x, self.size.y))
 
+    @property
+    def visible_bounds(self) -> Rect:
+        """Area of the scene seen by the camera, the bounding box of the view when the camera is rotated"""
+        return get_view_bounds(self)
+
     def follow(self, entity):
         self.reference = entity
 
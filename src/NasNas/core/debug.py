@@ -23,6 +23,29 @@ class Logger(GameObject):
             print()
 
 
+class ProfilerOverlay(sf.Text):
+    """Displays the statistics of a Profiler, refreshed every refresh_rate frames"""
+    def __init__(self, profiler, position: tuple, refresh_rate: int = 30):
+        super().__init__()
+        self.profiler = profiler
+        self.refresh_rate = refresh_rate
+        self._frames = 0
+        self.font = Res.Fonts.arial
+        self.character_size = 12
+        self.color = sf.Color.WHITE
+        self.position = position
+
+    def update(self):
+        self._frames += 1
+        if self._frames % self.refresh_rate != 1 and self.refresh_rate > 1:
+            return
+        summary = sorted(self.profiler.summary().items(), key=lambda item: -item[1]['mean'])
+        lines = ["phase : mean / p95 / p99 / max (ms)"]
+        for name, stats in summary:
+            lines.append(f"{name} : {stats['mean']:.2f} / {stats['p95']:.2f} / {stats['p99']:.2f} / {stats['max']:.2f}")
+        self.string = "\n".join(lines)
+
+
 class DebugText(sf.Text):
     def __init__(self, instance: object, attr_name: str, position: tuple, float_round=2):
         super().__init__()
@@ -3,11 +3,21 @@ from typing import Dict
 from sfml import sf
 
 from ..data.game_obj import GameObject
+from ..data.callbacks import HasCallbacks, callback
+from ..data.culling import Cullable
 from ..data import rect, keys
+from ..data.collision import move_aabb
 from .sprites import Anim, AnimPlayer
 
 
-class BaseEntity(GameObject, sf.Drawable):
+class BaseEntity(GameObject, HasCallbacks, Cullable, sf.Drawable):
+    """
+    Entities are added to the App broad-phase (game.broadphase) with their collision box,
+    updated at each update. on_overlap_enter and on_overlap_exit callbacks are called with the other entity
+    when two entities start or stop overlapping. Entities removed from their Layer are removed from the broad-phase,
+    entities not added to a layer are removed with game.broadphase.remove(entity).
+    Their bounds are also updated in the culling index of their layers, at the updates where they changed.
+    """
     def __init__(self, name: str, data, gridsize : int = 16):
         super().__init__()
         self.data = data
@@ -25,6 +35,8 @@ class BaseEntity(GameObject, sf.Drawable):
 
         self.gx = self.sprite.position.x
         self.gy = self.sprite.position.y
+        # position at the previous update, used to interpolate the rendering in fixed timestep mode
+        self._previous_position = self.sprite.position
 
         self.rx = 0
         self.ry = 0
@@ -35,6 +47,9 @@ class BaseEntity(GameObject, sf.Drawable):
         self.collision_box_shape.fill_color = sf.Color(200, 0, 0, 150)
 
         self.gridsize = gridsize
+        # entities created without an App (tools, tests) are not tracked by a broad-phase
+        if self.game is not None:
+            self.game.broadphase.insert(self, self.collision_box)
             
     @property
     def anim_state(self):
@@ -63,6 +78,9 @@ class BaseEntity(GameObject, sf.Drawable):
         else:
             self.x = value[0]
             self.y = value[1]
+        # the entity is placed, not moved : its sprite is not interpolated from its previous position
+        self.sprite.position = (round(self.x), round(self.y))
+        self._previous_position = self.sprite.position
 
     @property
     def x(self):
@@ -88,13 +106,40 @@ class BaseEntity(GameObject, sf.Drawable):
         x, y, width, height = bounds.left, bounds.top, bounds.width, bounds.height
         return rect.Rect((x, y), (width, height))
 
+    @property
+    def overlaps(self) -> list:
+        """Entities overlapping this one at the last broad-phase update"""
+        return self.game.broadphase.get_overlaps(self)
+
+    @callback("on_overlap_enter")
+    def on_overlap_enter(self, user_fn):
+        return user_fn
+
+    @callback("on_overlap_exit")
+    def on_overlap_exit(self, user_fn):
+        return user_fn
+
+    @property
+    def interpolated_position(self) -> sf.Vector2:
+        """Rendering position of the entity sprite, between its previous and current positions"""
+        alpha = self.game.alpha
+        return self._previous_position + (self.sprite.position - self._previous_position) * alpha
+
     def update(self, dt: float, keys: list = None):
-        self.sprite.position = (self.x, self.y)
+        self._previous_position = self.sprite.position
         self.sprite.position = (round(self.x), round(self.y))
         self.sprite.ratio = self.direction
-        self.collision_box = self.global_bounds
-        self.collision_box_shape.size = (self.global_bounds.width, self.global_bounds.height)
-        self.collision_box_shape.position = (self.global_bounds.left, self.global_bounds.top)
+        # global_bounds creates a Rect, it is computed once per update
+        bounds, previous = self.global_bounds, self.collision_box
+        # the broad-phase and the layers are only told about the entities which moved or changed frame size
+        if (bounds.left, bounds.top, bounds.width, bounds.height) != \
+                (previous.left, previous.top, previous.width, previous.height):
+            self.collision_box = bounds
+            self.collision_box_shape.size = (bounds.width, bounds.height)
+            self.collision_box_shape.position = (bounds.left, bounds.top)
+            if self.game is not None:
+                self.game.broadphase.update(self, bounds)
+            self.bounds_changed(bounds)
 
         self.update_anim()
 
@@ -104,8 +149,26 @@ class BaseEntity(GameObject, sf.Drawable):
             self.sprite.texture_rectangle = self.anim_player.active_frame.rectangle
             self.sprite.origin = self.anim_player.active_frame.origin
 
+    def _draw_sprite(self, draw):
+        # in fixed timestep mode, the sprite is drawn at its interpolated position
+        if self.game.fixed_timestep and self.game.alpha < 1:
+            position = self.sprite.position
+            interpolated = self.interpolated_position
+            self.sprite.position = (round(interpolated.x), round(interpolated.y))
+            draw(self.sprite)
+            self.sprite.position = position
+        else:
+            draw(self.sprite)
+
+    def add_to_batch(self, batch):
+        """Adds the entity sprite, and its collision box in debug mode, to a SpriteBatch"""
+        self._draw_sprite(batch.add_sprite)
+        if self.game.debug:
+            shape = self.collision_box_shape
+            batch.add_rectangle((shape.position.x, shape.position.y), (shape.size.x, shape.size.y), shape.fill_color)
+
     def draw(self, target, anim_states):
-        target.draw(self.sprite, anim_states)
+        self._draw_sprite(lambda sprite: target.draw(sprite, anim_states))
         if self.game.debug:
             target.draw(self.collision_box_shape)
 
@@ -130,15 +193,22 @@ class PlatformerEntity(BaseEntity):
         self.jump_count = 2
         self.remaining_jumps = 2
         self.falling = True
+        # if True, collisions are resolved by sweeping the collision box along the displacement,
+        # which works at any velocity. Otherwise the original cell based resolution is used
+        self.swept_collisions = False
+        # contacts with the level found by the last swept update
+        self.contacts = []
 
     def jump(self):
-        col_over = []
+        col_over = None
         if self.onground:
-            # these 2 lines get the nearest collision box over the entity
-            self.game.level.collisions.sort(key=lambda b:abs(b.bottom-self.collision_box.top))
-            col_over = [x for x in self.game.level.collisions if x.bottom < self.collision_box.top and x.left <= self.x <= x.right]
+            # getting the nearest collision box over the entity, only the boxes in the cell row above can block the jump
+            area = rect.Rect((self.x, self.collision_box.top - self.gridsize), (0, self.gridsize))
+            boxes = [x for x in self.game.level.get_collisions(area) if x.bottom < self.collision_box.top and x.left <= self.x <= x.right]
+            if boxes:
+                col_over = min(boxes, key=lambda b: abs(b.bottom - self.collision_box.top))
 
-        if not col_over or (col_over and self.collision_box.top // self.gridsize != col_over[0].bottom // self.gridsize):
+        if col_over is None or self.collision_box.top // self.gridsize != col_over.bottom // self.gridsize:
             self.jumping = True
             self.onground = False
             self.velocity.y = self.jump_velocity.y
@@ -174,7 +244,55 @@ class PlatformerEntity(BaseEntity):
         self.direction.x = -1
         self.anim_state = "walk"
 
+    def _nearby_collisions(self, dt: float):
+        """Returns the level collision boxes the entity can reach during this update"""
+        margin_x = (abs(self.velocity.x * dt) + 2) * self.gridsize
+        margin_y = (abs(self.velocity.y * dt) + 2) * self.gridsize
+        area = rect.Rect(
+            (self.collision_box.left - margin_x, self.collision_box.top - margin_y),
+            (self.collision_box.width + 2*margin_x, self.collision_box.height + 2*margin_y)
+        )
+        return self.game.level.get_collisions(area)
+
+    def _update_swept(self, dt: float):
+        # gravity is always applied, the landing contact found each update keeps the entity on ground
+        self.velocity += self.gravity
+        self.falling = self.velocity.y > 0 and not self.onground
+
+        # collision box at the current position, collision_box is at the sprite position of the last update
+        box = rect.Rect((self.collision_box.left + self.x - self.sprite.position.x,
+                         self.collision_box.top + self.y - self.sprite.position.y),
+                        (self.collision_box.width, self.collision_box.height))
+        dx = self.velocity.x * dt * self.gridsize
+        dy = self.velocity.y * dt * self.gridsize
+        boxes = self._nearby_collisions(dt) if self.game.level else []
+        dx, dy, self.contacts = move_aabb(box, dx, dy, boxes)
+
+        on_ground = False
+        for contact in self.contacts:
+            normal_x, normal_y = contact.normal
+            if normal_x:
+                self.velocity.x = 0
+            elif normal_y < 0:
+                self.velocity.y = 0
+                self.land()
+                on_ground = True
+            else:
+                # ceiling hit
+                self.velocity.y = 0
+                self.falling = True
+        if not on_ground:
+            self.onground = False
+
+        self.x += dx
+        self.y += dy
+
     def update(self, dt: float, keys: list = None):
+        if self.swept_collisions:
+            self._update_swept(dt)
+            super().update(dt)
+            return
+
         if not self.onground:
             self.velocity += self.gravity
         if self.velocity.y > 0 and not self.onground:
@@ -183,20 +301,20 @@ class PlatformerEntity(BaseEntity):
             self.falling = False
         self.rx += self.velocity.x * dt
 
-        if self.game.level:
-            for box in self.game.level.collisions:
-                if box.top <= self.collision_box.top < box.bottom or box.top < self.collision_box.bottom <= box.bottom \
-                        or self.collision_box.top <= box.top < self.collision_box.bottom or self.collision_box.top < box.bottom <= self.collision_box.bottom:
-                    # left collision
-                    if self.velocity.x < 0:
-                        if self.collision_box.left//self.gridsize == (box.right -1) // self.gridsize and self.rx < 0.3:
-                            self.rx -= self.velocity.x*dt
-                            self.velocity.x = 0
-                    # rigth collision
-                    if self.velocity.x > 0:
-                        if self.collision_box.right//self.gridsize == box.left // self.gridsize and self.rx > 0.7:
-                            self.rx -= self.velocity.x*dt
-                            self.velocity.x = 0
+        boxes = self._nearby_collisions(dt) if self.game.level else []
+        for box in boxes:
+            if box.top <= self.collision_box.top < box.bottom or box.top < self.collision_box.bottom <= box.bottom \
+                    or self.collision_box.top <= box.top < self.collision_box.bottom or self.collision_box.top < box.bottom <= self.collision_box.bottom:
+                # left collision
+                if self.velocity.x < 0:
+                    if self.collision_box.left//self.gridsize == (box.right -1) // self.gridsize and self.rx < 0.3:
+                        self.rx -= self.velocity.x*dt
+                        self.velocity.x = 0
+                # rigth collision
+                if self.velocity.x > 0:
+                    if self.collision_box.right//self.gridsize == box.left // self.gridsize and self.rx > 0.7:
+                        self.rx -= self.velocity.x*dt
+                        self.velocity.x = 0
 
         while self.rx > 1: self.rx -= 1; self.gx += 1
         while self.rx < 0: self.rx += 1; self.gx -= 1
@@ -204,22 +322,21 @@ class PlatformerEntity(BaseEntity):
         self.ry += self.velocity.y * dt
         bot_collision = False
 
-        if self.game.level:
-            for box in self.game.level.collisions:
-                if box.left / self.gridsize <= self.gx < (box.right) / self.gridsize:
-                    # top collision
-                    if self.velocity.y < 0:
-                        if self.collision_box.top//self.gridsize == (box.bottom - 1) // self.gridsize and self.ry < 0.99:
-                            self.y = box.bottom + self.sprite.origin.y
-                            self.falling = True
-                            self.velocity.y = 0
-                    # bottom collision
-                    if self.gy + 1 == box.top / self.gridsize and self.ry >= 0.99:
-                        self.ry = 0.99
+        for box in boxes:
+            if box.left / self.gridsize <= self.gx < (box.right) / self.gridsize:
+                # top collision
+                if self.velocity.y < 0:
+                    if self.collision_box.top//self.gridsize == (box.bottom - 1) // self.gridsize and self.ry < 0.99:
+                        self.y = box.bottom + self.sprite.origin.y
+                        self.falling = True
                         self.velocity.y = 0
-                        self.land()
-                        bot_collision = True
-                        break
+                # bottom collision
+                if self.gy + 1 == box.top / self.gridsize and self.ry >= 0.99:
+                    self.ry = 0.99
+                    self.velocity.y = 0
+                    self.land()
+                    bot_collision = True
+                    break
 
         if not bot_collision:
             self.onground = False
@@ -1,39 +1,216 @@
+from typing import Dict, List, Optional
+from bisect import bisect_left, bisect_right
+import math
+
 from sfml import sf
 
 from ..data.game_obj import GameObject
+from ..data.rect import Rect
+from ..data.spatial import SpatialHash
+from ..data.culling import Cullable
 from . import transitions
+from .batch import SpriteBatch
 
 
 class Layer(GameObject, sf.Drawable):
     """
     A Layer is a collection of Drawables. It can be drawn on the window.
     Used to organize the order of drawing in the game.
+    A static Layer is cached by the Scene and only redrawn when it is invalidated.
+    A batched Layer draws its consecutive sprites and entities sharing a texture in a single draw call,
+    using a SpriteBatch. The drawing order is kept.
+
+    A culling Layer only draws the drawables seen by the camera drawing it. Cullable drawables (entities,
+    bitmap texts) are kept in a spatial index updated when they move, so only the visible ones are visited.
+    Other drawables having global bounds are checked one by one, the ones without bounds are always drawn.
+
+    A ysorted Layer keeps its drawables sorted by y position, for top down games depth. Each frame, only the
+    cullable drawables which moved and the other drawables whose y changed are moved in the order.
+    With a ysort_bucket, drawables are sorted by rows of this height and keep their order inside a row,
+    so drawables moving inside their row are not moved in the order.
     """
-    def __init__(self, name: str, *args: sf.Drawable):
+    # size of the culling index cells, in pixels
+    CULLING_CELL_SIZE = 256
+
+    def __init__(self, name: str, *args: sf.Drawable, static: bool = False, batched: bool = False, culling: bool = True,
+                 ysorted: bool = False, ysort_bucket: Optional[float] = None):
         super().__init__()
         self.name = name
+        self.static = static
+        self.batched = batched
+        self.culling = culling
+        self._ysorted = ysorted
+        self._ysort_bucket = ysort_bucket
+        # sort key of each drawable of a ysorted layer, in the order of the drawables, and by drawable id
+        self._ykeys: List[float] = []
+        self._ykeys_by_id: Dict[int, float] = {}
+        # cullable drawables which moved since the last ysort
+        self._moved: Dict[int, sf.Drawable] = {}
+        self._batch = SpriteBatch()
+        self._draw_calls = 0
         self._drawables = []
+        self._invalidated = True
+        self._dirty_rects: List[Rect] = []
+        # cullable drawables, and the other drawables which are checked every frame
+        self._index = SpatialHash(self.CULLING_CELL_SIZE)
+        self._unindexed = []
+        # drawable id -> position in the layer, to draw the visible drawables in order. None when the order changed
+        self._positions: Optional[Dict[int, int]] = None
         for arg in args:
             if isinstance(arg, sf.Drawable):
-                self._drawables.append(arg)
+                self._track(arg)
             else:
                 raise TypeError("Layer can only contain Drawables.")
 
+    def _ykey(self, drawable) -> float:
+        position = getattr(drawable, "position", None)
+        y = position.y if position is not None else 0
+        if self._ysort_bucket:
+            return math.floor(y / self._ysort_bucket)
+        return y
+
+    def _find(self, drawable, key: float) -> int:
+        """Returns the position of a drawable of a ysorted layer from its sort key"""
+        i = bisect_left(self._ykeys, key)
+        end = bisect_right(self._ykeys, key, i)
+        while i < end:
+            if self._drawables[i] is drawable:
+                return i
+            i += 1
+        # the cached key is stale, looking for the drawable in the whole layer
+        for i, other in enumerate(self._drawables):
+            if other is drawable:
+                return i
+        raise ValueError(f"{drawable} is not in Layer {self.name}")
+
+    def _insert_sorted(self, drawable, key: float):
+        i = bisect_right(self._ykeys, key)
+        self._ykeys.insert(i, key)
+        self._drawables.insert(i, drawable)
+        self._ykeys_by_id[id(drawable)] = key
+
+    def _track(self, drawable: sf.Drawable):
+        if self._ysorted:
+            self._insert_sorted(drawable, self._ykey(drawable))
+        else:
+            self._drawables.append(drawable)
+        self._positions = None
+        if isinstance(drawable, Cullable):
+            if drawable not in self._index:
+                drawable._culling_layers += (self,)
+                self._index.insert(drawable, drawable.global_bounds)
+        else:
+            self._unindexed.append(drawable)
+
+    def _untrack(self, drawable: sf.Drawable):
+        if self._ysorted:
+            i = self._find(drawable, self._ykeys_by_id[id(drawable)])
+            del self._drawables[i]
+            del self._ykeys[i]
+            if drawable not in self._drawables:
+                del self._ykeys_by_id[id(drawable)]
+                self._moved.pop(id(drawable), None)
+        else:
+            self._drawables.remove(drawable)
+        self._positions = None
+        if drawable in self._index:
+            if drawable in self._drawables:
+                # added several times to the layer
+                return
+            drawable._culling_layers = tuple(layer for layer in drawable._culling_layers if layer is not self)
+            self._index.remove(drawable)
+        else:
+            self._unindexed.remove(drawable)
+
     def add(self, *args: sf.Drawable):
         for arg in args:
             if isinstance(arg, sf.Drawable):
-                self._drawables.append(arg)
+                self._track(arg)
             else:
                 raise TypeError("You can only add Drawables to Layer")
+        self.invalidate()
 
     def remove(self, drawable: sf.Drawable):
+        """Removes a drawable from the layer. Entities leaving the layer are also removed from the App broad-phase"""
         if drawable in self._drawables:
-            self._drawables.remove(drawable)
+            self._untrack(drawable)
+            self.invalidate()
+            if self.game is not None and drawable not in self._drawables and drawable in self.game.broadphase:
+                self.game.broadphase.remove(drawable)
+
+    def update_bounds(self, drawable: Cullable, bounds: Optional[Rect] = None):
+        """Updates the bounds of a cullable drawable in the culling index, called by the drawable when it moves"""
+        self._index.update(drawable, bounds if bounds is not None else drawable.global_bounds)
+        if self._ysorted:
+            self._moved[id(drawable)] = drawable
+
+    def invalidate(self, area: Optional[Rect] = None):
+        """Marks the layer as changed. If an area is given, only this area of a static layer will be redrawn.
+        Dynamic layers are redrawn every frame, they don't need to be invalidated.
+        """
+        if area is None:
+            self._invalidated = True
+        else:
+            self._dirty_rects.append(area)
+
+    @property
+    def invalidated(self) -> bool:
+        """True if the whole layer needs to be redrawn"""
+        return self._invalidated
+
+    @property
+    def dirty_rects(self) -> List[Rect]:
+        """Areas of the layer that changed since the last time it was drawn, including its drawables changes"""
+        rects = list(self._dirty_rects)
+        for drawable in self._drawables:
+            if hasattr(drawable, "dirty_rects"):
+                rects += drawable.dirty_rects
+        return rects
+
+    def clean(self):
+        self._invalidated = False
+        self._dirty_rects = []
+        for drawable in self._drawables:
+            if hasattr(drawable, "clean"):
+                drawable.clean()
+
+    @property
+    def ysorted(self) -> bool:
+        return self._ysorted
 
     def ysort(self):
-        """Sort all drawables of the layer by y position
+        """Sort all drawables of the layer by y position.
+        A ysorted layer is sorted automatically at each update, only the drawables which moved are moved in the order.
         """
-        self._drawables.sort(key=lambda x: x.position.y)
+        if not self._ysorted:
+            self._drawables.sort(key=lambda x: x.position.y)
+            self._positions = None
+            return
+
+        moved = list(self._moved.values())
+        self._moved = {}
+        # drawables which can not tell they moved are checked every time
+        moved += self._unindexed
+        reordered = False
+        for drawable in moved:
+            old_key = self._ykeys_by_id[id(drawable)]
+            key = self._ykey(drawable)
+            if key == old_key:
+                continue
+            i = self._find(drawable, old_key)
+            # nothing to move if the drawable stays between its neighbours
+            if (i == 0 or self._ykeys[i - 1] <= key) and (i == len(self._ykeys) - 1 or key < self._ykeys[i + 1]):
+                self._ykeys[i] = key
+                self._ykeys_by_id[id(drawable)] = key
+                continue
+            del self._drawables[i]
+            del self._ykeys[i]
+            self._insert_sorted(drawable, key)
+            reordered = True
+        if reordered:
+            self._positions = None
+            if self.static:
+                self.invalidate()
 
     def update(self):
         to_remove = []
@@ -42,27 +219,119 @@ class Layer(GameObject, sf.Drawable):
                 if spr.ended:
                     to_remove.append(spr)
         for tr in to_remove:
-            self._drawables.remove(tr)
+            self._untrack(tr)
+        if to_remove:
+            self.invalidate()
+        if self.batched:
+            # once per frame, the batch frees the vertex arrays of the textures no camera drew last frame
+            self._batch.clear()
+        if self._ysorted:
+            self.ysort()
 
-    def draw(self, target, states):
-        for drawable in self._drawables:
+    @property
+    def draw_calls(self) -> int:
+        """Number of draw calls issued by the last draw of a batched layer, else one per drawable"""
+        if self.batched:
+            return self._draw_calls
+        return len(self._drawables)
+
+    def _flush(self, target, states):
+        if len(self._batch):
+            target.draw(self._batch, states)
+            self._draw_calls += self._batch.draw_calls
+            self._batch.reset()
+
+    def _draw_batched(self, target, states, drawables: list):
+        self._draw_calls = 0
+        self._batch.reset()
+        for drawable in drawables:
+            if SpriteBatch.is_batchable(drawable):
+                self._batch.add(drawable)
+            elif not isinstance(drawable, transitions.Transition) or drawable.started:
+                # other drawables are drawn between two batches to keep the drawing order
+                self._flush(target, states)
+                target.draw(drawable, states)
+                self._draw_calls += 1
+        self._flush(target, states)
+
+    def _draw_drawables(self, target, states, drawables: list):
+        if self.batched:
+            self._draw_batched(target, states, drawables)
+            return
+        for drawable in drawables:
             if isinstance(drawable, transitions.Transition):
                 if drawable.started:
                     target.draw(drawable, states)
             else:
                 target.draw(drawable, states)
 
+    def cull(self, area: Rect) -> list:
+        """
+        Returns the drawables which can be seen in the given area, in the layer order : the ones whose global bounds
+        overlap it, and the ones without global bounds (tile layers, object groups...) which are always kept.
+        All the drawables are returned if culling is disabled.
+        """
+        if not self.culling:
+            return self._drawables
+        visible = self._index.query(area)
+        left, top = area.left, area.top
+        right, bottom = left + area.width, top + area.height
+        for drawable in self._unindexed:
+            bounds = getattr(drawable, "global_bounds", None)
+            if bounds is None or (bounds.left < right and left < bounds.left + bounds.width
+                                  and bounds.top < bottom and top < bounds.top + bounds.height):
+                visible.append(drawable)
+        if len(visible) == len(self._drawables):
+            return self._drawables
+        if self._positions is None:
+            self._positions = {id(drawable): position for position, drawable in enumerate(self._drawables)}
+        positions = self._positions
+        visible.sort(key=lambda d: positions[id(d)])
+        return visible
+
+    def draw_area(self, target, area: Rect, states: Optional[sf.RenderStates] = None) -> int:
+        """Draws only the drawables seen in the given area, returns the number of drawables culled"""
+        visible = self.cull(area)
+        self._draw_drawables(target, states or sf.RenderStates(), visible)
+        return len(self._drawables) - len(visible)
+
+    def draw(self, target, states):
+        self._draw_drawables(target, states, self._drawables)
+
     def __iter__(self):
         return iter(self._drawables)
 
+    def __len__(self):
+        return len(self._drawables)
+
 
 class Mask(GameObject, sf.Drawable):
-    def __init__(self, name: str, width: int, height: int, fill_color: sf.Color, *args: sf.Drawable):
+    """
+    A Mask is drawn over the layers below it using a multiply blending, for lighting effects for example.
+
+    Args:
+        name (str): name of the Mask
+        width (int): width of the masked area
+        height (int): height of the masked area
+        fill_color (sf.Color): color of the mask where nothing is drawn
+        resolution (float): resolution of the mask render textures relative to its size.
+            The mask is upscaled when drawn, a low resolution is enough for low frequency effects like lights
+        visible_only (bool): if True, only the area seen by the cameras is rendered
+    """
+    def __init__(self, name: str, width: int, height: int, fill_color: sf.Color, *args: sf.Drawable,
+                 resolution: float = 1.0, visible_only: bool = False):
         super().__init__()
         self.name = name
         self.fill_color = fill_color
-        self.render_texture = sf.RenderTexture(width, height)
-        self.sprite = sf.Sprite(self.render_texture.texture)
+        self.visible_only = visible_only
+        self._size = sf.Vector2(width, height)
+        self._resolution = resolution
+        self._area = Rect((0, 0), (width, height))
+        # render targets are allocated on first update and reused while they are big enough
+        self.render_texture: Optional[sf.RenderTexture] = None
+        self._temp_texture: Optional[sf.RenderTexture] = None
+        self.sprite: Optional[sf.Sprite] = None
+        self._temp_sprite: Optional[sf.Sprite] = None
         self._drawables = []
         for arg in args:
             if isinstance(arg, sf.Drawable):
@@ -70,6 +339,40 @@ class Mask(GameObject, sf.Drawable):
             else:
                 raise TypeError("Mask can only contain Drawables.")
 
+    @property
+    def size(self) -> sf.Vector2:
+        return self._size
+
+    @property
+    def resolution(self) -> float:
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value: float):
+        self._resolution = value
+        self._release()
+
+    def resize(self, width: int, height: int):
+        """Changes the size of the masked area, the render targets will be allocated again on next update"""
+        self._size = sf.Vector2(width, height)
+        self._area = Rect((0, 0), (width, height))
+        self._release()
+
+    def _release(self):
+        self.render_texture = None
+        self._temp_texture = None
+        self.sprite = None
+        self._temp_sprite = None
+
+    def _allocate(self, width: int, height: int):
+        if self.render_texture is None or self.render_texture.size.x < width or self.render_texture.size.y < height:
+            self.render_texture = sf.RenderTexture(width, height)
+            self._temp_texture = sf.RenderTexture(width, height)
+            # smoothing hides the pixels of low resolution masks when upscaled
+            self.render_texture.smooth = self._resolution < 1
+            self.sprite = sf.Sprite(self.render_texture.texture)
+            self._temp_sprite = sf.Sprite(self._temp_texture.texture)
+
     def add(self, *args: sf.Drawable):
         for arg in args:
             if isinstance(arg, sf.Drawable):
@@ -77,19 +380,53 @@ class Mask(GameObject, sf.Drawable):
             else:
                 raise TypeError("Mask can only contain Drawables.")
 
-    def update(self):
-        self.render_texture.clear(self.fill_color)
-        temp_texture = sf.RenderTexture(self.render_texture.size.x, self.render_texture.size.y)
-        temp_texture.clear(self.fill_color)
+    def update(self, areas: Optional[List[Rect]] = None):
+        """
+        Renders the mask.
+
+        Args:
+            areas (list): areas of the mask seen by the cameras. Used only if visible_only is True
+        """
+        if self.visible_only and areas is not None:
+            if not areas:
+                return
+            area = areas[0]
+            for a in areas[1:]:
+                area = area.union(a)
+            self._area = area
+        else:
+            self._area = Rect((0, 0), (self._size.x, self._size.y))
+
+        width = max(1, math.ceil(self._area.width * self._resolution))
+        height = max(1, math.ceil(self._area.height * self._resolution))
+        self._allocate(width, height)
+        texture_size = self.render_texture.size
+        rectangle = sf.Rect((0, 0), (width, height))
+
+        view = sf.View(sf.Rect((self._area.left, self._area.top), (self._area.width, self._area.height)))
+        view.viewport = sf.Rect((0, 0), (width/texture_size.x, height/texture_size.y))
+        self._temp_texture.view = view
+        self._temp_texture.clear(self.fill_color)
         for drawable in self._drawables:
-            temp_texture.draw(drawable, sf.RenderStates(sf.BLEND_MULTIPLY))
-        temp_texture.display()
-        self.render_texture.draw(sf.Sprite(temp_texture.texture), sf.RenderStates(sf.BLEND_MULTIPLY))
+            self._temp_texture.draw(drawable, sf.RenderStates(sf.BLEND_MULTIPLY))
+        self._temp_texture.display()
+
+        self._temp_sprite.texture_rectangle = rectangle
+        self.render_texture.clear(self.fill_color)
+        self.render_texture.draw(self._temp_sprite, sf.RenderStates(sf.BLEND_MULTIPLY))
         self.render_texture.display()
-        self.sprite = sf.Sprite(self.render_texture.texture)
+
+        # upscaling the rendered area to its size in the world
+        self.sprite.texture_rectangle = rectangle
+        self.sprite.position = self._area.topleft
+        self.sprite.ratio = (self._area.width / width, self._area.height / height)
 
     def draw(self, target, states):
-        target.draw(self.sprite, states)
+        if self.sprite is not None:
+            target.draw(self.sprite, states)
 
     def __iter__(self):
         return iter(self._drawables)
+
+    def __len__(self):
+        return len(self._drawables)
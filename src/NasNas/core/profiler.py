@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Tuple, Union
+from array import array
+import csv
+import json
+import math
+import time
+
+
+class PhaseStats:
+    """Rolling statistics of a phase duration, over the last frames kept in a ring buffer"""
+    def __init__(self, history: int):
+        self._values = array('d', bytes(8 * history))
+        self._index = 0
+        self._count = 0
+
+    def add(self, value: float):
+        self._values[self._index] = value
+        self._index = (self._index + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+
+    @property
+    def values(self) -> List[float]:
+        """Recorded durations, from the oldest to the most recent"""
+        if self._count < len(self._values):
+            return list(self._values[:self._count])
+        return list(self._values[self._index:]) + list(self._values[:self._index])
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def last(self) -> float:
+        return self._values[self._index - 1] if self._count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the mean, 95th and 99th percentiles and max durations, in milliseconds"""
+        values = sorted(self._values[:self._count]) if self._count < len(self._values) else sorted(self._values)
+        if not values:
+            return {'mean': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0, 'count': 0}
+
+        def percentile(p: float) -> float:
+            return values[min(len(values) - 1, math.ceil(p * len(values)) - 1)]
+
+        return {
+            'mean': 1000 * sum(values) / len(values),
+            'p95': 1000 * percentile(0.95),
+            'p99': 1000 * percentile(0.99),
+            'max': 1000 * values[-1],
+            'count': len(values),
+        }
+
+
+class _Section:
+    __slots__ = ('_profiler', '_key', '_start')
+
+    def __init__(self, profiler: 'Profiler', key):
+        self._profiler = profiler
+        self._key = key
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._profiler.add(self._key, time.perf_counter() - self._start)
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class Profiler:
+    """
+    Times the phases of the game loop. Phases are timed with `with profiler.section(name):` blocks,
+    a phase entered several times in a frame accumulates its durations.
+    When the profiler is disabled, sections do nothing and cost almost nothing.
+
+    Phases names are strings, or tuples (category, name) for phases of named objects like layers,
+    which avoids formatting strings every frame. They are displayed as "category:name".
+    """
+    def __init__(self, history: int = 300):
+        """
+        Args:
+            history (int): number of frames kept to compute the statistics
+        """
+        self.enabled = False
+        self.history = history
+        self.phases: Dict[str, PhaseStats] = {}
+        self._frame: Dict[Union[str, Tuple[str, str]], float] = {}
+        self._frame_start: Optional[float] = None
+
+    def section(self, *key: str):
+        """Returns a context manager timing the given phase"""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, key[0] if len(key) == 1 else key)
+
+    def add(self, key, duration: float):
+        """Adds a duration, in seconds, to a phase of the current frame"""
+        self._frame[key] = self._frame.get(key, 0.0) + duration
+
+    def begin_frame(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """Records the durations of the phases of the frame which just ended"""
+        if not self.enabled:
+            return
+        if self._frame_start is not None:
+            self.add("frame", time.perf_counter() - self._frame_start)
+            self._frame_start = None
+        for key, duration in self._frame.items():
+            name = key if isinstance(key, str) else f"{key[0]}:{key[1]}"
+            if name not in self.phases:
+                self.phases[name] = PhaseStats(self.history)
+            self.phases[name].add(duration)
+        self._frame = {}
+
+    def reset(self):
+        self.phases = {}
+        self._frame = {}
+        self._frame_start = None
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns the statistics of each phase, in milliseconds"""
+        return {name: stats.summary() for name, stats in self.phases.items()}
+
+    def export(self, path: str):
+        """Writes the statistics of each phase to a .json or a .csv file"""
+        summary = self.summary()
+        if path.endswith(".json"):
+            with open(path, 'w') as file:
+                json.dump(summary, file, indent=2)
+        else:
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(["phase", "mean", "p95", "p99", "max", "count"])
+                for name, stats in summary.items():
+                    writer.writerow([name, stats['mean'], stats['p95'], stats['p99'], stats['max'], stats['count']])
@@ -0,0 +1,111 @@
+from typing import List, Optional
+from bisect import bisect_right
+import time
+
+from ..data.game_obj import GameObject
+
+
+class RenderPass:
+    """A camera drawing its scene on the window, with the statistics of its last execution"""
+    def __init__(self, camera, index: int):
+        self.camera = camera
+        # creation index, cameras with the same render order are drawn in creation order
+        self.index = index
+        # duration of the last execution, in seconds
+        self.time = 0.0
+        # drawables drawn and culled by the last execution, an offscreen scene counts as one drawable
+        self.drawn = 0
+        self.culled = 0
+
+    @property
+    def key(self):
+        return self.camera.render_order, self.index
+
+    def reset(self):
+        self.time = 0.0
+        self.drawn = 0
+        self.culled = 0
+
+    def execute(self, target):
+        cam = self.camera
+        start = time.perf_counter()
+        scene = cam.scene
+        if scene.offscreen:
+            target.view = cam
+            target.draw(scene)
+            self.drawn, self.culled = 1, 0
+        else:
+            self.drawn, self.culled = scene.draw_view(target, cam, cam.visible_bounds)
+        self.time = time.perf_counter() - start
+
+    def __repr__(self):
+        return f"RenderPass({self.camera.name}, time={1000*self.time:.3f}ms, drawn={self.drawn}, culled={self.culled})"
+
+
+class RenderGraph(GameObject):
+    """
+    Passes drawing the scenes on the window, one per camera, in render order.
+    Passes are kept sorted when cameras are added or their render order changes, instead of sorting them every frame.
+    """
+    def __init__(self):
+        self._passes: List[RenderPass] = []
+        self._keys: List[tuple] = []
+        self._count = 0
+
+    def _insert(self, render_pass: RenderPass):
+        key = render_pass.key
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._passes.insert(position, render_pass)
+
+    def _find(self, camera) -> Optional[int]:
+        for position, render_pass in enumerate(self._passes):
+            if render_pass.camera is camera:
+                return position
+        return None
+
+    def add(self, camera):
+        if self._find(camera) is None:
+            self._insert(RenderPass(camera, self._count))
+            self._count += 1
+
+    def remove(self, camera):
+        position = self._find(camera)
+        if position is not None:
+            self._passes.pop(position)
+            self._keys.pop(position)
+
+    def reorder(self, camera):
+        """Moves the pass of a camera after its render order changed"""
+        position = self._find(camera)
+        if position is not None:
+            self._keys.pop(position)
+            self._insert(self._passes.pop(position))
+
+    @property
+    def cameras(self) -> list:
+        """Cameras in render order"""
+        return [render_pass.camera for render_pass in self._passes]
+
+    @property
+    def passes(self) -> List[RenderPass]:
+        """Passes in render order, with the statistics of the last frame"""
+        return list(self._passes)
+
+    def get_pass(self, camera) -> Optional[RenderPass]:
+        position = self._find(camera)
+        return None if position is None else self._passes[position]
+
+    def execute(self, target):
+        """Executes the passes of the visible cameras having a scene"""
+        profiler = self.game.profiler
+        for render_pass in self._passes:
+            cam = render_pass.camera
+            if not cam.visible or not cam.has_scene():
+                render_pass.reset()
+                continue
+            with profiler.section("pass", cam.name):
+                render_pass.execute(target)
+
+    def __len__(self):
+        return len(self._passes)
@@ -1,26 +1,130 @@
-from typing import Dict
+from typing import Dict, List, Optional, Set, Tuple
+import math
 
 from sfml import sf
 
 from ..data.game_obj import GameObject
+from ..data.rect import Rect, merge_rects
 from . import layers
 
 
+class RenderStats:
+    """Rendering statistics of the last Scene.render call, compared to redrawing everything on the whole scene"""
+    def __init__(self):
+        self.pixels_drawn = 0
+        self.draw_calls = 0
+        self._baseline_pixels = 0
+        self._baseline_draw_calls = 0
+
+    def reset(self):
+        self.pixels_drawn = 0
+        self.draw_calls = 0
+        self._baseline_pixels = 0
+        self._baseline_draw_calls = 0
+
+    def add_baseline(self, pixels: int, draw_calls: int):
+        self._baseline_pixels += pixels
+        self._baseline_draw_calls += draw_calls
+
+    @property
+    def pixels_saved(self) -> int:
+        return self._baseline_pixels - self.pixels_drawn
+
+    @property
+    def draw_calls_saved(self) -> int:
+        return self._baseline_draw_calls - self.draw_calls
+
+    def __repr__(self):
+        return f"RenderStats(pixels_drawn={self.pixels_drawn}, pixels_saved={self.pixels_saved}, " \
+               f"draw_calls={self.draw_calls}, draw_calls_saved={self.draw_calls_saved})"
+
+
+class LayerCache:
+    """
+    Offscreen texture caching the rendering of consecutive static layers of a Scene.
+    The cache only covers an area around the cameras views.
+    """
+    # extra area rendered around the cameras views, relative to the views size
+    MARGIN = 0.5
+
+    def __init__(self, static_layers: List[layers.Layer]):
+        self.layers = list(static_layers)
+        self.name = "+".join(layer.name for layer in static_layers)
+        self.area: Optional[Rect] = None
+        self.render_texture: Optional[sf.RenderTexture] = None
+        self.sprite: Optional[sf.Sprite] = None
+        # transparent rectangle erasing the areas drawn again, reused for every area
+        self._clear_shape: Optional[sf.RectangleShape] = None
+
+    def _set_view(self, area: Rect):
+        # drawing the given area of the world at its place in the cached area
+        size = self.render_texture.size
+        view = sf.View(sf.Rect((area.left, area.top), (area.width, area.height)))
+        view.viewport = sf.Rect(((area.left - self.area.left)/size.x, (area.top - self.area.top)/size.y),
+                                (area.width/size.x, area.height/size.y))
+        self.render_texture.view = view
+
+    def render(self, area: Rect):
+        """Renders the layers on the given area"""
+        width, height = math.ceil(area.width), math.ceil(area.height)
+        if self.render_texture is None or self.render_texture.size.x < width or self.render_texture.size.y < height:
+            self.render_texture = sf.RenderTexture(width, height)
+            self.sprite = sf.Sprite(self.render_texture.texture)
+        self.area = area
+        self.render_texture.clear(sf.Color.TRANSPARENT)
+        self._set_view(area)
+        for layer in self.layers:
+            self.render_texture.draw(layer)
+        self.render_texture.display()
+        self.sprite.texture = self.render_texture.texture
+        self.sprite.texture_rectangle = sf.Rect((0, 0), (width, height))
+        self.sprite.position = area.topleft
+
+    def redraw(self, area: Rect):
+        """Renders the layers again on a part of the cached area"""
+        clear = self._clear_shape
+        if clear is None:
+            clear = self._clear_shape = sf.RectangleShape()
+            clear.fill_color = sf.Color.TRANSPARENT
+        clear.size = (area.width, area.height)
+        clear.position = (area.left, area.top)
+        self._set_view(area)
+        self.render_texture.draw(clear, sf.RenderStates(sf.BLEND_NONE))
+        for layer in self.layers:
+            self.render_texture.draw(layer)
+        self.render_texture.display()
+
+
 class Scene(GameObject, sf.Drawable):
-    def __init__(self, width: int, height: int):
+    """
+    A Scene holds ordered layers and masks, drawn by the cameras looking at it.
+    By default each camera draws the layers directly on the window with its own view, culling the drawables
+    it does not see. An offscreen scene is first rendered on its own texture, which the cameras then draw,
+    useful when the whole scene texture is needed (post processing...).
+    """
+    def __init__(self, width: int, height: int, offscreen: bool = False):
         super().__init__()
-        self.render_texture: sf.RenderTexture = sf.RenderTexture(width, height)
-        self.sprite: sf.Sprite = sf.Sprite(self.render_texture.texture)
+        self._size = sf.Vector2(width, height)
+        self.offscreen = offscreen
+        # allocated on first render of an offscreen scene, headless Apps never render their scenes
+        self.render_texture: Optional[sf.RenderTexture] = None
+        self.sprite: Optional[sf.Sprite] = None
         self.layers: Dict[int, layers.Layer] = {}
         self.masks: Dict[int, layers.Mask] = {}
+        # rendering statistics of the last frame
+        self.stats = RenderStats()
+        self._caches: Dict[Tuple[int, ...], LayerCache] = {}
+        self._used_caches: Set[Tuple[int, ...]] = set()
+        # layers, masks and static layers caches sprites to draw this frame, in order, set by prepare
+        self._drawables: List[sf.Drawable] = []
 
     @property
     def width(self) -> int:
-        return self.render_texture.width
+        return self._size.x
 
     @property
     def height(self) -> int:
-        return self.render_texture.height
+        return self._size.y
 
     def add_layer(self, layer: layers.Layer, order: int):
         """ Adds a Layer to the scene at the given order
@@ -61,22 +165,208 @@ class Scene(GameObject, sf.Drawable):
         if mask in self.masks.values():
             self.masks = {key: val for key, val in self.masks.items() if val != mask}
 
-    def render(self):
-        self.render_texture.clear(sf.Color.TRANSPARENT)
+    def get_visible_areas(self) -> List[Rect]:
+        """
+        Returns the areas of the scene seen by the cameras looking at it,
+        clipped to the scene bounds. Overlapping areas are merged.
+        """
+        scene_bounds = Rect((0, 0), (self.width, self.height))
+        areas = []
+        for cam in self.game.cameras:
+            if cam.visible and cam.has_scene() and cam.scene is self:
+                bounds = cam.visible_bounds
+                area = Rect((math.floor(bounds.left), math.floor(bounds.top)),
+                            (math.ceil(bounds.width) + 1, math.ceil(bounds.height) + 1)).intersection(scene_bounds)
+                if area is not None:
+                    areas.append(area)
+        return merge_rects(areas)
+
+    def _get_area_view(self, area: Rect) -> sf.View:
+        """Returns a view drawing the given area of the scene at the same place on the render texture"""
+        view = sf.View(sf.Rect((area.left, area.top), (area.width, area.height)))
+        view.viewport = sf.Rect((area.left/self.width, area.top/self.height), (area.width/self.width, area.height/self.height))
+        return view
+
+    def _render_drawable(self, drawable, areas: List[Rect]):
+        count = len(drawable) if hasattr(drawable, "__len__") else 1
+        self.stats.add_baseline(self.width*self.height, count)
+        for area in areas:
+            self.render_texture.view = self._get_area_view(area)
+            if isinstance(drawable, layers.Layer):
+                # only the drawables seen in the area are drawn
+                culled = drawable.draw_area(self.render_texture, area)
+                self.stats.draw_calls += drawable.draw_calls if drawable.batched else count - culled
+            else:
+                self.render_texture.draw(drawable)
+                self.stats.draw_calls += count
+            self.stats.pixels_drawn += area.width*area.height
+
+    def _update_static(self, static_layers: List[layers.Layer], areas: List[Rect]) -> Optional[LayerCache]:
+        """Updates the cache of consecutive static layers, returns it if it has something to draw"""
+        if not static_layers:
+            return None
+        key = tuple(id(layer) for layer in static_layers)
+        if key not in self._caches:
+            self._caches[key] = LayerCache(static_layers)
+        cache = self._caches[key]
+        self._used_caches.add(key)
+        with self.game.profiler.section("static", cache.name):
+            self._update_cache(cache, static_layers, areas)
+        return cache if areas else None
+
+    def _update_cache(self, cache: LayerCache, static_layers: List[layers.Layer], areas: List[Rect]):
+        count = sum(len(layer) for layer in static_layers)
+        self.stats.add_baseline(self.width*self.height*len(static_layers), count)
+        if not areas:
+            # nothing is visible, the cache will be rendered again when a camera looks at the scene
+            if any(layer.invalidated or layer.dirty_rects for layer in static_layers):
+                cache.area = None
+                for layer in static_layers:
+                    layer.clean()
+            return
+
+        needed = areas[0]
+        for area in areas[1:]:
+            needed = needed.union(area)
+
+        if cache.area is None or not cache.area.contains_rect(needed) or any(layer.invalidated for layer in static_layers):
+            # the cameras moved out of the cached area, rendering a bigger area to avoid doing it again too soon
+            margin_x = needed.width * LayerCache.MARGIN
+            margin_y = needed.height * LayerCache.MARGIN
+            cache_area = Rect((needed.left - margin_x, needed.top - margin_y),
+                              (needed.width + 2*margin_x, needed.height + 2*margin_y))
+            cache_area = cache_area.intersection(Rect((0, 0), (self.width, self.height)))
+            cache.render(cache_area)
+            self.stats.pixels_drawn += cache_area.width*cache_area.height
+            self.stats.draw_calls += count
+        else:
+            dirty_rects = []
+            for layer in static_layers:
+                for rect in layer.dirty_rects:
+                    dirty_rect = cache.area.intersection(rect)
+                    if dirty_rect is not None:
+                        dirty_rects.append(dirty_rect)
+            for dirty_rect in merge_rects(dirty_rects):
+                cache.redraw(dirty_rect)
+                self.stats.pixels_drawn += dirty_rect.width*dirty_rect.height
+                self.stats.draw_calls += count
+
+        for layer in static_layers:
+            layer.clean()
+
+    def prepare(self, areas: Optional[List[Rect]] = None):
+        """
+        Updates the layers, the static layers caches and the masks for the areas seen by the cameras,
+        and lists what the cameras will draw this frame. Called every frame, before the cameras draw the scene.
+        """
+        self.stats.reset()
+        self._used_caches = set()
+        if areas is None:
+            areas = self.get_visible_areas()
 
         max_layers_order = max(self.layers.keys()) if self.layers.keys() else 0
         max_masks_order = max(self.masks.keys()) if self.masks.keys() else 0
 
+        profiler = self.game.profiler
+        drawables = []
+        static_layers = []
+
+        def add_static():
+            cache = self._update_static(static_layers, areas)
+            if cache is not None:
+                drawables.append(cache.sprite)
+
         for i in range(max(max_layers_order, max_masks_order)+1):
             if i in self.layers:
                 self.layers[i].update()
-                self.render_texture.draw(self.layers[i])
+                if self.layers[i].static:
+                    static_layers.append(self.layers[i])
+                else:
+                    add_static()
+                    static_layers = []
+                    drawables.append(self.layers[i])
             if i in self.masks:
-                self.masks[i].update()
-                self.render_texture.draw(self.masks[i])
+                add_static()
+                static_layers = []
+                with profiler.section("mask", self.masks[i].name):
+                    self.masks[i].update(areas)
+                drawables.append(self.masks[i])
+        add_static()
+        self._drawables = drawables
 
+        # freeing the caches of the removed layers
+        self._caches = {key: cache for key, cache in self._caches.items() if key in self._used_caches}
+
+    def draw_view(self, target, view: sf.View, bounds: Rect) -> Tuple[int, int]:
+        """
+        Draws the scene prepared for this frame directly on target with the given view.
+        Drawables of the layers outside bounds are culled. Returns the number of drawables drawn and culled.
+        """
+        target.view = view
+        drawn, culled = 0, 0
+        # pixels of the scene covered by the view, each drawable is drawn on them
+        width = max(0, min(bounds.left + bounds.width, self.width) - max(bounds.left, 0))
+        height = max(0, min(bounds.top + bounds.height, self.height) - max(bounds.top, 0))
+        pixels = width*height
+        profiler = self.game.profiler
+        for drawable in self._drawables:
+            if isinstance(drawable, layers.Layer):
+                self.stats.add_baseline(self.width*self.height, len(drawable))
+                with profiler.section("layer", drawable.name):
+                    layer_culled = drawable.draw_area(target, bounds)
+                drawn += len(drawable) - layer_culled
+                self.stats.draw_calls += drawable.draw_calls if drawable.batched else len(drawable) - layer_culled
+                culled += layer_culled
+            elif isinstance(drawable, layers.Mask):
+                self.stats.add_baseline(self.width*self.height, len(drawable))
+                target.draw(drawable)
+                self.stats.draw_calls += len(drawable)
+                drawn += 1
+            else:
+                # static layers cache, its baseline was counted when it was updated
+                target.draw(drawable)
+                self.stats.draw_calls += 1
+                drawn += 1
+            self.stats.pixels_drawn += pixels
+        return drawn, culled
+
+    def render(self):
+        """
+        Renders the layers and masks on the scene render texture, used by offscreen scenes.
+        Only the areas seen by the cameras are drawn, consecutive static layers are drawn from a cache
+        rendered again only when they are invalidated or when the cameras move out of the cached area.
+        A scene no camera looks at (its sprite is drawn somewhere else) is drawn entirely.
+        """
+        areas = self.get_visible_areas()
+        if not areas:
+            areas = [Rect((0, 0), (self.width, self.height))]
+        self.prepare(areas)
+        if self.render_texture is None:
+            self.render_texture = sf.RenderTexture(self.width, self.height)
+            self.sprite = sf.Sprite(self.render_texture.texture)
+        self.render_texture.clear(sf.Color.TRANSPARENT)
+
+        profiler = self.game.profiler
+        for drawable in self._drawables:
+            if isinstance(drawable, (layers.Layer, layers.Mask)):
+                with profiler.section("layer" if isinstance(drawable, layers.Layer) else "mask", drawable.name):
+                    self._render_drawable(drawable, areas)
+            else:
+                # static layers cache, its baseline was counted when it was updated
+                for area in areas:
+                    self.render_texture.view = self._get_area_view(area)
+                    self.render_texture.draw(drawable)
+                    self.stats.pixels_drawn += area.width*area.height
+                    self.stats.draw_calls += 1
+
+        self.render_texture.view = self.render_texture.default_view
         self.render_texture.display()
         self.sprite.texture = self.render_texture.texture
 
     def draw(self, target, states):
-        target.draw(self.sprite)
+        if self.offscreen:
+            if self.sprite is not None:
+                target.draw(self.sprite, states)
+        else:
+            for drawable in self._drawables:
+                target.draw(drawable, states)
@@ -3,6 +3,7 @@ from typing import Union, Tuple, List
 from sfml import sf
 
 from ..data.rect import Rect
+from ..reslib.atlas import AtlasRegion
 from .utils import to_Vector2
 
 
@@ -12,6 +13,12 @@ class AnimFrame:
         self.duration: int = duration       # duration of the frame in milliseconds
         self.origin: Union[Tuple[int, int], sf.Vector2] = to_Vector2(origin)    # origin of the frame
 
+    def offset(self, offset: sf.Vector2) -> 'AnimFrame':
+        """Returns a copy of the frame with its texture rectangle moved by offset"""
+        rectangle = Rect((self.rectangle.left + offset.x, self.rectangle.top + offset.y),
+                         (self.rectangle.width, self.rectangle.height))
+        return AnimFrame(rectangle, self.duration, self.origin)
+
 
 class Anim:
     """Anim is used to describe an animation
@@ -33,6 +40,10 @@ class Anim:
         self.frames.append(frame)
         self.frames_count += 1
 
+    def offset(self, offset: sf.Vector2) -> 'Anim':
+        """Returns a copy of the animation with its frames texture rectangles moved by offset"""
+        return Anim([frame.offset(offset) for frame in self.frames], self.loop)
+
 
 class AnimPlayer:
     def __init__(self, animation: Anim):
@@ -75,7 +86,17 @@ class AnimPlayer:
 
 
 class Sprite:
-    def __init__(self, name: str, texture, anims: dict):
+    def __init__(self, name: str, texture: Union[sf.Texture, AtlasRegion], anims: dict):
+        """
+        Args:
+            name (str): name of the sprite
+            texture (sf.Texture or AtlasRegion): texture of the frames, or its region in the texture atlas.
+                Frames rectangles are given relative to the packed texture, they are moved to the atlas page
+            anims (dict): animations by name
+        """
         self.name = name
+        if isinstance(texture, AtlasRegion):
+            anims = {anim_name: anim.offset(texture.offset) for anim_name, anim in anims.items()}
+            texture = texture.texture
         self.texture = texture
         self.anims = anims
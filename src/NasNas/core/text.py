@@ -1,8 +1,9 @@
-from typing import Union, Tuple, Optional
+from typing import Dict, List, Union, Tuple, Optional
 
 from sfml import sf
 
 from ..data.rect import Rect
+from ..data.culling import Cullable
 from .utils import to_Vector2
 
 
@@ -14,6 +15,9 @@ class BitmapGlyph:
 
 
 class BitmapFont:
+    # maximum number of texts whose width is cached
+    WIDTHS_CACHE_SIZE = 256
+
     def __init__(self, texture: sf.Texture, char_size: Union[Tuple[int, int], sf.Vector2], chars_map=None, spacings_map=None):
         self.texture = texture
 
@@ -38,32 +42,72 @@ class BitmapFont:
                         spacing = self.spacings_map[character]
                     self.glyphs[character] = BitmapGlyph(Rect((x, y), self.char_size), character, spacing)
                 i += 1
+        self._widths: Dict[str, int] = {}
 
     def get_glyph(self, character: str) -> BitmapGlyph:
         return self.glyphs[character]
 
+    @property
+    def line_height(self) -> int:
+        return self.char_size.y
+
+    def get_width(self, text: str) -> int:
+        """Returns the width in pixels of the longest line of text, widths are cached"""
+        width = self._widths.get(text)
+        if width is None:
+            width = max(sum(self.glyphs[c].spacing for c in line) for line in text.split("\n"))
+            if len(self._widths) >= self.WIDTHS_CACHE_SIZE:
+                self._widths.clear()
+            self._widths[text] = width
+        return width
+
+    def get_height(self, text: str) -> int:
+        """Returns the height in pixels of text, lines are separated by "\\n" """
+        return (text.count("\n") + 1) * self.line_height
+
     def get_glyph_sprite(self, character: str) -> sf.Sprite:
         spr = sf.Sprite(self.texture)
         spr.texture_rectangle = self.glyphs[character].texture_rectangle
         return spr
 
 
-class BitmapText(sf.Drawable):
+class BitmapText(Cullable, sf.Drawable):
+    """
+    Text drawn with a BitmapFont. Each character is a quad of a single VertexArray textured by the font texture,
+    so a text costs one draw call. Lines are separated by "\\n".
+
+    Setting the text rewrites only the quads of the characters which changed or moved,
+    texts updated every frame like counters are cheap.
+    """
     def __init__(self, text: str, font: BitmapFont = None):
         super().__init__()
         self._font: Optional[BitmapFont] = None
         self._text = text
-        self._render_texture = sf.RenderTexture(1, 1)
-        self._sprite = sf.Sprite(self._render_texture.texture)
-        self._glyphs_sprites = []
+        self._vertices = sf.VertexArray(sf.PrimitiveType.QUADS)
+        # position of each character of the text, the quad i is the glyph of the character i
+        self._layout: List[Tuple[int, int]] = []
+        self._transformable = sf.Transformable()
         if font is not None:
             self.font = font
-        self.position = (0, 0)
 
     @property
-    def text(self):
+    def text(self) -> str:
         return self._text
 
+    @text.setter
+    def text(self, value: str):
+        if value == self._text:
+            return
+        if self._font is None:
+            self._text = value
+            return
+        start = 0
+        for old, new in zip(self._text, value):
+            if old != new:
+                break
+            start += 1
+        self._write(value, start)
+
     @property
     def font(self):
         return self._font
@@ -72,53 +116,95 @@ class BitmapText(sf.Drawable):
     def font(self, value):
         if isinstance(value, BitmapFont):
             self._font = value
-            x = 0
-            self._glyphs_sprites = []
-            for character in self.text:
-                glyph = self._font.get_glyph(character)
-                glyph_spr = self._font.get_glyph_sprite(character)
-                glyph_spr.position = (x, 0)
-                self._glyphs_sprites.append(glyph_spr)
-                x += glyph.spacing
-            self.update()
+            # all the quads are rewritten
+            self._layout = []
+            self._write(self._text, 0)
         else:
             raise TypeError("BitmapText font argument should be a BitmapFont instance")
 
+    def _advance(self, character: str, x: int, y: int) -> Tuple[int, int]:
+        if character == "\n":
+            return 0, y + self._font.line_height
+        return x + self._font.glyphs[character].spacing, y
+
+    def _write(self, text: str, start: int):
+        """Lays out text from the character start, the quads of the characters whose glyph and position did not change are kept"""
+        old_text, old_layout = self._text, self._layout
+        self._vertices.resize(4*len(text))
+        layout = old_layout[:start]
+        x, y = self._advance(text[start - 1], *layout[start - 1]) if start else (0, 0)
+        for i in range(start, len(text)):
+            character = text[i]
+            if i >= len(old_layout) or old_text[i] != character or old_layout[i] != (x, y):
+                self._write_quad(i, character, x, y)
+            layout.append((x, y))
+            x, y = self._advance(character, x, y)
+        self._text = text
+        self._layout = layout
+        self.bounds_changed()
+
+    def _write_quad(self, index: int, character: str, x: int, y: int):
+        if character == "\n":
+            # line breaks have an empty quad, so the quad of a character stays at its index
+            w = h = left = top = 0
+        else:
+            rectangle = self._font.glyphs[character].texture_rectangle
+            left, top, w, h = rectangle.left, rectangle.top, rectangle.width, rectangle.height
+        for k, (dx, dy) in enumerate(((0, 0), (w, 0), (w, h), (0, h))):
+            vertex = self._vertices[4*index + k]
+            vertex.position = sf.Vector2(x + dx, y + dy)
+            vertex.tex_coords = sf.Vector2(left + dx, top + dy)
+
     @property
     def position(self) -> sf.Vector2:
-        return self._sprite.position
+        return self._transformable.position
 
     @position.setter
     def position(self, value):
-        self._sprite.position = to_Vector2(value)
+        self._transformable.position = to_Vector2(value)
+        self.bounds_changed()
 
     @property
-    def origin(self):
-        return self._sprite.origin
+    def origin(self) -> sf.Vector2:
+        return self._transformable.origin
+
+    @origin.setter
+    def origin(self, value):
+        self._transformable.origin = to_Vector2(value)
+        self.bounds_changed()
+
+    @property
+    def scale(self) -> sf.Vector2:
+        return self._transformable.ratio
+
+    @scale.setter
+    def scale(self, value):
+        self._transformable.ratio = to_Vector2(value)
+        self.bounds_changed()
 
     @property
     def width(self):
-        res = 0
-        for c in self.text:
-            res += self._font.get_glyph(c).spacing
-        return res
+        return self._font.get_width(self.text)
 
     @property
     def height(self):
-        return self._font.char_size.y
+        return self._font.get_height(self.text)
+
+    @property
+    def local_bounds(self) -> Rect:
+        if self._font is None:
+            return Rect((0, 0), (0, 0))
+        return Rect((0, 0), (self.width, self.height))
 
     @property
     def global_bounds(self):
-        return self._sprite.global_bounds
+        return self._transformable.transform.transform_rectangle(self.local_bounds)
 
     def update(self):
-        self._render_texture = sf.RenderTexture(self.width, self.height)
-        self._render_texture.clear(sf.Color.TRANSPARENT)
-        for spr in self._glyphs_sprites:
-            self._render_texture.draw(spr)
-        self._render_texture.display()
-        self._sprite.texture = self._render_texture.texture
+        """Does nothing, the vertices are updated when the text changes. Kept for the code calling it every frame"""
+        pass
 
     def draw(self, target, states):
-        if self.font:
-            target.draw(self._sprite, states)
+        if self._font and self._text:
+            target.draw(self._vertices, sf.RenderStates(states.blend_mode, states.transform * self._transformable.transform,
+                                                        self._font.texture, states.shader))
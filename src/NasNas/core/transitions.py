@@ -1,3 +1,4 @@
+from typing import Dict, List, Tuple
 import math
 import random
 
@@ -8,37 +9,79 @@ from ..data.callbacks import callback as _callback
 from ..data.game_obj import GameObject as __GameObject
 
 
+class RenderTexturePool:
+    """
+    Render textures shared by the transitions. Allocating a window sized render texture is slow,
+    so transitions take one from the pool when they start and give it back when they end.
+    """
+    def __init__(self):
+        self._free: Dict[Tuple[int, int], List[sf.RenderTexture]] = {}
+
+    def acquire(self, width: int, height: int) -> sf.RenderTexture:
+        textures = self._free.get((width, height))
+        if textures:
+            return textures.pop()
+        return sf.RenderTexture(width, height)
+
+    def release(self, render_texture: sf.RenderTexture):
+        size = render_texture.size
+        self._free.setdefault((size.x, size.y), []).append(render_texture)
+
+    def clear(self):
+        """Frees the render textures not used by a transition"""
+        self._free = {}
+
+
+render_texture_pool = RenderTexturePool()
+
+
 class Transition(__GameObject, __HasCallbacks, sf.Drawable):
     def __init__(self):
         if self.__class__.__name__ == __class__.__name__:
             raise NotImplementedError("Transition class is not instantiable. Please use inheritance to create a Transition.")
         super().__init__()
-        self.render_texture = sf.RenderTexture(self.game.window.ui_view.size.x, self.game.window.ui_view.size.y)
+        self._size = self.game.window.ui_view.size
+        # taken from the pool while the transition is playing
+        self.render_texture = None
+        self.sprite = None
         self.r = self.g = self.b = 0
         self.a = 255
         self.blend_mode = sf.BLEND_NONE
         self.shapes = []
-        self.sprite = sf.Sprite(self.render_texture.texture)
         self.ended = False
         self.started = False
 
+    def _allocate(self):
+        # headless Apps run the transitions logic without rendering them
+        if not self.game.headless and self.render_texture is None:
+            self.render_texture = render_texture_pool.acquire(int(self._size.x), int(self._size.y))
+            self.sprite = sf.Sprite(self.render_texture.texture)
+
+    def _release(self):
+        if self.render_texture is not None:
+            render_texture_pool.release(self.render_texture)
+            self.render_texture = None
+            self.sprite = None
+
     def reset(self):
-        self.render_texture = sf.RenderTexture(self.game.window.ui_view.size.x, self.game.window.ui_view.size.y)
+        size = self.game.window.ui_view.size
+        if size != self._size:
+            self._release()
+        self._size = size
         self.r = self.g = self.b = 0
         self.a = 255
         self.blend_mode = sf.BLEND_NONE
         self.shapes = []
-        self.sprite = sf.Sprite(self.render_texture.texture)
         self.ended = False
         self.started = False
 
     @property
     def width(self):
-        return self.render_texture.size.x
+        return self._size.x
 
     @property
     def height(self):
-        return self.render_texture.size.y
+        return self._size.y
 
     @property
     def fill_color(self):
@@ -58,6 +101,7 @@ class Transition(__GameObject, __HasCallbacks, sf.Drawable):
     def start(self):
         if not self.started:
             self.started = True
+            self._allocate()
             self.game.transitions.append(self)
             self.callbacks.call("on_start")
 
@@ -68,6 +112,7 @@ class Transition(__GameObject, __HasCallbacks, sf.Drawable):
     def end(self):
         if not self.ended:
             self.ended = True
+            self._release()
             self.game.transitions.remove(self)
             self.callbacks.call("on_end")
 
@@ -75,20 +120,23 @@ class Transition(__GameObject, __HasCallbacks, sf.Drawable):
     def updater(update_func):
         def _decorate(self):
             if not self.ended:
-                self.render_texture.clear(self.fill_color)
+                if self.render_texture is not None:
+                    self.render_texture.clear(self.fill_color)
                 if self.started:
                     update_func(self)
-                for shape in self.shapes:
-                    self.render_texture.draw(shape, sf.RenderStates(self.blend_mode))
-                self.render_texture.display()
-                self.sprite.texture = self.render_texture.texture
+                if self.render_texture is not None:
+                    for shape in self.shapes:
+                        self.render_texture.draw(shape, sf.RenderStates(self.blend_mode))
+                    self.render_texture.display()
+                    self.sprite.texture = self.render_texture.texture
         return _decorate
 
     def update(self):
         pass
 
     def draw(self, target, transformations):
-        target.draw(self.sprite)
+        if self.sprite is not None:
+            target.draw(self.sprite)
 
 
 class FadeIn(Transition):
@@ -236,81 +284,251 @@ class RotatingSquareClose(Transition):
         self.shapes[0].origin = (self.shapes[0].size.x/2, self.shapes[0].size.y/2)
 
 
-class PixelsIn(Transition):
-    """ From black screen to transparent square by square """
+class _PixelsTransition(Transition):
+    """
+    Base of the pixels transitions. The screen is split in square cells stored in a single QUADS VertexArray,
+    drawn directly on the window. Cells are switched in a random order shuffled on reset,
+    so an update only rewrites the colors of the next `speed` cells, whatever the number of cells.
+    """
+    # True if the cells are covered at start and uncovered one by one, False for the opposite
+    uncover = True
+
     def __init__(self, speed: int, pixelsize: float):
-        """ Warning : a small pixelsize and big speed will lead to severe frame drops.
-            Avoid using a pixelsize smaller than 8.
-        """
         super().__init__()
         self.speed = speed
         self.pixel_size = pixelsize
-        self.remaining = []
+        self.vertices = sf.VertexArray(sf.PrimitiveType.QUADS)
+        self._order = []
+        self._next = 0
         self.reset()
 
+    def _allocate(self):
+        # the cells are drawn directly on the window, no render texture is needed
+        pass
+
+    def _colors(self):
+        """Returns the colors of the cells before and after being switched"""
+        if self.uncover:
+            return self.fill_color, sf.Color.TRANSPARENT
+        return sf.Color.TRANSPARENT, self.fill_color
+
     def reset(self):
         super().reset()
-        self.remaining = []
-        col_nb = math.ceil(self.render_texture.size.x / self.pixel_size)
-        row_nb = math.ceil(self.render_texture.size.y / self.pixel_size)
-        for x in range(col_nb):
-            for y in range(row_nb):
-                s = sf.RectangleShape()
-                s.position = (x * self.pixel_size, y * self.pixel_size)
-                s.size = (self.pixel_size, self.pixel_size)
-                s.fill_color = sf.Color.BLACK
-                self.shapes.append(s)
-                self.remaining.append(s)
-        self.update()
+        col_nb = math.ceil(self.width / self.pixel_size)
+        row_nb = math.ceil(self.height / self.pixel_size)
+        size = self.pixel_size
+        color = self._colors()[0]
+        self.vertices.resize(4 * col_nb * row_nb)
+        v = 0
+        for y in range(row_nb):
+            for x in range(col_nb):
+                left, top = x * size, y * size
+                for corner in ((left, top), (left + size, top), (left + size, top + size), (left, top + size)):
+                    vertex = self.vertices[v]
+                    vertex.position = sf.Vector2(*corner)
+                    vertex.color = color
+                    v += 1
+        self._order = list(range(col_nb * row_nb))
+        random.shuffle(self._order)
+        self._next = 0
 
     @Transition.updater
     def update(self):
-        if self.remaining:
-            for i in range(self.speed):
-                s = random.choice(self.remaining)
-                s.fill_color = sf.Color.TRANSPARENT
-                self.remaining.remove(s)
-                if not self.remaining:
-                    break
+        if self._next < len(self._order):
+            color = self._colors()[1]
+            vertices = self.vertices
+            for cell in self._order[self._next:self._next + self.speed]:
+                for v in range(4 * cell, 4 * cell + 4):
+                    vertices[v].color = color
+            self._next += self.speed
         else:
             self.end()
 
+    def draw(self, target, transformations):
+        target.draw(self.vertices)
+
+
+class PixelsIn(_PixelsTransition):
+    """ From black screen to transparent square by square """
+    uncover = True
+
 
-class PixelsOut(Transition):
+class PixelsOut(_PixelsTransition):
     """ From transparent screen to black screen square by square """
-    def __init__(self, speed: int, pixelsize: float):
-        """ Warning : a small pixelsize and big speed will lead to severe frame drops.
-            Avoid using a pixelsize smaller than 8.
-        """
+    uncover = False
+
+
+class ShaderTransition(Transition):
+    """
+    Base of the transitions rendered by a fragment shader on a single full screen quad :
+    no render texture is used, a playing transition costs one quad per frame.
+
+    The shader gets the `progress` uniform, from 0 (screen covered) to 1 (screen uncovered),
+    the `size` of the screen in pixels, the transition `color`, and the pixel coordinates in gl_TexCoord[0].
+    Shaders are compiled once and shared by all the transitions using them.
+    """
+    FRAGMENT = ""
+    # True if the transition uncovers the screen, False if it covers it
+    opening = True
+    _shaders: Dict[str, sf.Shader] = {}
+
+    def __init__(self):
         super().__init__()
-        self.speed = speed
-        self.pixel_size = pixelsize
-        self.shapes = []
-        self.remaining = []
+        self.progress = 0.0
+        self.step = 0.0
+        self.quad = sf.VertexArray(sf.PrimitiveType.QUADS, 4)
+        self.shader = None
+        if not self.game.headless:
+            if not sf.Shader.is_available():
+                raise RuntimeError("Shaders are not supported by the graphics driver, use the classic transitions.")
+            if self.FRAGMENT not in ShaderTransition._shaders:
+                ShaderTransition._shaders[self.FRAGMENT] = sf.Shader.from_memory(fragment=self.FRAGMENT)
+            self.shader = ShaderTransition._shaders[self.FRAGMENT]
+
+    def _allocate(self):
+        # drawn directly on the window
+        pass
 
     def reset(self):
         super().reset()
-        self.remaining = []
-        col_nb = math.ceil(self.render_texture.size.x / self.pixel_size)
-        row_nb = math.ceil(self.render_texture.size.y / self.pixel_size)
-        for x in range(col_nb):
-            for y in range(row_nb):
-                s = sf.RectangleShape()
-                s.position = (x * self.pixel_size, y * self.pixel_size)
-                s.size = (self.pixel_size, self.pixel_size)
-                s.fill_color = sf.Color.TRANSPARENT
-                self.shapes.append(s)
-                self.remaining.append(s)
-        self.update()
+        self.progress = 0.0
+        corners = ((0, 0), (self.width, 0), (self.width, self.height), (0, self.height))
+        for i, corner in enumerate(corners):
+            vertex = self.quad[i]
+            vertex.position = sf.Vector2(*corner)
+            vertex.tex_coords = sf.Vector2(*corner)
+
+    def set_uniforms(self, shader: sf.Shader):
+        """Sets the uniforms specific to the transition, called before each draw"""
+        pass
 
     @Transition.updater
     def update(self):
-        if self.remaining:
-            for i in range(self.speed):
-                s = random.choice(self.remaining)
-                s.fill_color = sf.Color.BLACK
-                self.remaining.remove(s)
-                if not self.remaining:
-                    break
-        else:
+        self.progress += self.step
+        if self.progress >= 1:
+            self.progress = 1.0
             self.end()
+
+    def draw(self, target, transformations):
+        if self.shader is not None:
+            self.shader.set_parameter("progress", self.progress if self.opening else 1 - self.progress)
+            self.shader.set_parameter("size", self.width, self.height)
+            self.shader.set_parameter("color", self.fill_color)
+            self.set_uniforms(self.shader)
+            target.draw(self.quad, sf.RenderStates(shader=self.shader))
+
+
+_FRAGMENT_HEADER = """
+uniform float progress;
+uniform vec2 size;
+uniform vec4 color;
+"""
+
+FADE_FRAGMENT = _FRAGMENT_HEADER + """
+void main() {
+    gl_FragColor = vec4(color.rgb, color.a * (1.0 - progress));
+}
+"""
+
+CIRCLE_FRAGMENT = _FRAGMENT_HEADER + """
+void main() {
+    float radius = progress * length(size * 0.5);
+    float inside = step(distance(gl_TexCoord[0].xy, size * 0.5), radius);
+    gl_FragColor = vec4(color.rgb, color.a * (1.0 - inside));
+}
+"""
+
+ROTATING_SQUARE_FRAGMENT = _FRAGMENT_HEADER + """
+void main() {
+    float half_side = progress * length(size * 0.5);
+    // the square turns by 2 degrees each time its side grows by 1 pixel, like the classic transitions
+    float angle = radians(4.0 * half_side);
+    vec2 p = gl_TexCoord[0].xy - size * 0.5;
+    p = vec2(cos(angle) * p.x + sin(angle) * p.y, cos(angle) * p.y - sin(angle) * p.x);
+    float inside = step(max(abs(p.x), abs(p.y)), half_side);
+    gl_FragColor = vec4(color.rgb, color.a * (1.0 - inside));
+}
+"""
+
+PIXELS_FRAGMENT = _FRAGMENT_HEADER + """
+uniform float pixel_size;
+
+void main() {
+    vec2 cell = floor(gl_TexCoord[0].xy / pixel_size);
+    float order = fract(sin(dot(cell, vec2(12.9898, 78.233))) * 43758.5453);
+    float inside = step(order, progress);
+    gl_FragColor = vec4(color.rgb, color.a * (1.0 - inside));
+}
+"""
+
+
+class ShaderFadeIn(ShaderTransition):
+    """ Shader version of FadeIn """
+    FRAGMENT = FADE_FRAGMENT
+
+    def __init__(self, speed=5):
+        super().__init__()
+        self.speed = speed
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.step = self.speed / 255
+
+
+class ShaderFadeOut(ShaderFadeIn):
+    """ Shader version of FadeOut """
+    opening = False
+
+
+class ShaderCircleOpen(ShaderTransition):
+    """ Shader version of CircleOpen """
+    FRAGMENT = CIRCLE_FRAGMENT
+
+    def __init__(self, speed=5):
+        super().__init__()
+        self.speed = speed
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.step = self.speed / math.sqrt((self.width/2)**2 + (self.height/2)**2)
+
+
+class ShaderCircleClose(ShaderCircleOpen):
+    """ Shader version of CircleClose """
+    opening = False
+
+
+class ShaderRotatingSquareOpen(ShaderCircleOpen):
+    """ Shader version of RotatingSquareOpen """
+    FRAGMENT = ROTATING_SQUARE_FRAGMENT
+
+
+class ShaderRotatingSquareClose(ShaderRotatingSquareOpen):
+    """ Shader version of RotatingSquareClose """
+    opening = False
+
+
+class ShaderPixelsIn(ShaderTransition):
+    """ Shader version of PixelsIn, cells are uncovered in a pseudo random order computed by the shader """
+    FRAGMENT = PIXELS_FRAGMENT
+
+    def __init__(self, speed: int, pixelsize: float):
+        super().__init__()
+        self.speed = speed
+        self.pixel_size = pixelsize
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        cells = math.ceil(self.width / self.pixel_size) * math.ceil(self.height / self.pixel_size)
+        self.step = self.speed / cells
+
+    def set_uniforms(self, shader: sf.Shader):
+        shader.set_parameter("pixel_size", self.pixel_size)
+
+
+class ShaderPixelsOut(ShaderPixelsIn):
+    """ Shader version of PixelsOut """
+    opening = False
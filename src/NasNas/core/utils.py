@@ -1,10 +1,23 @@
 from typing import Union, Tuple
+import math
 
 from sfml import sf
 
+from ..data.rect import Rect
+
 
 def to_Vector2(arg: Union[Tuple[int, int], sf.Vector2]) -> sf.Vector2:
     if isinstance(arg, sf.Vector2):
         return arg
     else:
-        return sf.Vector2(arg[0], arg[1])
\ No newline at end of file
+        return sf.Vector2(arg[0], arg[1])
+
+
+def get_view_bounds(view: sf.View) -> Rect:
+    """Returns the area of the world seen by the given view, the bounding box of the view if it is rotated"""
+    width, height = view.size.x, view.size.y
+    if view.rotation % 180:
+        angle = math.radians(view.rotation)
+        cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+        width, height = view.size.x*cos + view.size.y*sin, view.size.x*sin + view.size.y*cos
+    return Rect((view.center.x - width/2, view.center.y - height/2), (width, height))
@@ -30,3 +30,54 @@ class RenderWindow(GameObject, HasCallbacks, sf.RenderWindow):
 
     def on_resize(self):
         self.game.scale_view()
+
+
+class HeadlessWindow(GameObject, HasCallbacks):
+    """
+    Stand-in of the RenderWindow used by headless Apps. It has no display : drawing does nothing
+    and it never receives events, it stays open until closed.
+    """
+    def __init__(self, width: int, height: int, title: str):
+        super().__init__()
+        self.size = sf.Vector2(width, height)
+        self.base_size = sf.Vector2(width, height)
+        self.base_title = title
+        self.title = title
+        self.framerate_limit = 0
+        self.vertical_synchronization = False
+        self.mouse_cursor_visible = False
+        self.default_view = sf.View(sf.Rect((0, 0), (width, height)))
+        self.view = self.default_view
+        self._is_open = True
+        self._ui_view = Camera("ui_view", -1)
+        self._ui_view.reset((0, 0), (self.game.V_WIDTH, self.game.V_HEIGHT))
+        self._ui_view.reset_viewport((0, 0), (1, 1))
+
+    @property
+    def ui_view(self):
+        return self._ui_view
+
+    @property
+    def is_open(self) -> bool:
+        return self._is_open
+
+    @property
+    def events(self):
+        return []
+
+    @callback("on_close")
+    def on_close(self, user_fn):
+        return user_fn
+
+    def close(self):
+        self._is_open = False
+        self.callbacks.call("on_close")
+
+    def clear(self, color=None):
+        pass
+
+    def draw(self, drawable, states=None):
+        pass
+
+    def display(self):
+        pass
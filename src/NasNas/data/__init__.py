@@ -2,5 +2,7 @@ from .const import SCREEN_W, SCREEN_H
 from .keys import Keyboard
 from .rect import Rect
 from .shapes import LineShape, EllipseShape
+from .spatial import SpatialHash
+from .broadphase import SweepAndPrune
 
-__all__ = ['Keyboard', 'Rect', 'LineShape', 'EllipseShape', 'SCREEN_W', 'SCREEN_H']
+__all__ = ['Keyboard', 'Rect', 'LineShape', 'EllipseShape', 'SpatialHash', 'SweepAndPrune', 'SCREEN_W', 'SCREEN_H']
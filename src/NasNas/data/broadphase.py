@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Tuple
+from operator import attrgetter
+
+
+class _Proxy:
+    __slots__ = ('obj', 'left', 'top', 'right', 'bottom')
+
+    def __init__(self, obj, left: float, top: float, right: float, bottom: float):
+        self.obj = obj
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+
+
+_left = attrgetter('left')
+
+
+class SweepAndPrune:
+    """
+    Broad-phase of moving rectangles, finding all the overlapping pairs at once.
+    Objects are kept sorted by their left edge and swept from left to right, only the objects whose horizontal
+    extent overlaps are compared. Objects move a little between two updates, so the list is nearly sorted
+    and sorting it again is almost linear : an update costs about O(n + pairs) instead of O(n²).
+
+    Objects are tracked by identity, rectangles can be any object having `left`, `top`, `width` and `height`
+    attributes. Overlaps are strict, rectangles sharing an edge do not overlap.
+    """
+    def __init__(self):
+        self._proxies: Dict[int, _Proxy] = {}
+        self._sorted: List[_Proxy] = []
+        # (id, id) -> (object, object), ids ordered
+        self._pairs: Dict[Tuple[int, int], Tuple[Any, Any]] = {}
+        # object id -> {other object id: other object}
+        self._overlaps: Dict[int, Dict[int, Any]] = {}
+
+    def __contains__(self, obj) -> bool:
+        return id(obj) in self._proxies
+
+    def __len__(self):
+        return len(self._proxies)
+
+    def insert(self, obj, rect):
+        """Adds an object to the broad-phase, or updates its rectangle if already added"""
+        key = id(obj)
+        if key in self._proxies:
+            self.update(obj, rect)
+        else:
+            proxy = _Proxy(obj, rect.left, rect.top, rect.left + rect.width, rect.top + rect.height)
+            self._proxies[key] = proxy
+            self._sorted.append(proxy)
+
+    def update(self, obj, rect):
+        """Updates the rectangle of an object, the pairs are updated by the next update_pairs call"""
+        proxy = self._proxies.get(id(obj))
+        if proxy is None:
+            self.insert(obj, rect)
+        else:
+            proxy.left = rect.left
+            proxy.top = rect.top
+            proxy.right = rect.left + rect.width
+            proxy.bottom = rect.top + rect.height
+
+    def remove(self, obj):
+        """Removes an object and its pairs, no exit is reported for them"""
+        key = id(obj)
+        proxy = self._proxies.pop(key, None)
+        if proxy is not None:
+            self._sorted.remove(proxy)
+            for other in self._overlaps.pop(key, {}):
+                self._overlaps[other].pop(key, None)
+                self._pairs.pop((key, other) if key < other else (other, key), None)
+
+    def clear(self):
+        self._proxies = {}
+        self._sorted = []
+        self._pairs = {}
+        self._overlaps = {}
+
+    def update_pairs(self) -> Tuple[List[Tuple[Any, Any]], List[Tuple[Any, Any]]]:
+        """
+        Finds the overlapping pairs from the current rectangles.
+        Returns the pairs which started overlapping and the pairs which stopped overlapping since the last call.
+        """
+        self._sorted.sort(key=_left)
+        pairs = {}
+        active: List[_Proxy] = []
+        for proxy in self._sorted:
+            left = proxy.left
+            # dropping the objects ending before this one starts
+            active = [other for other in active if other.right > left]
+            for other in active:
+                if other.top < proxy.bottom and proxy.top < other.bottom:
+                    a, b = id(proxy.obj), id(other.obj)
+                    if a < b:
+                        pairs[(a, b)] = (proxy.obj, other.obj)
+                    else:
+                        pairs[(b, a)] = (other.obj, proxy.obj)
+            active.append(proxy)
+
+        entered = [pair for key, pair in pairs.items() if key not in self._pairs]
+        exited = [pair for key, pair in self._pairs.items() if key not in pairs]
+        for a, b in exited:
+            self._overlaps[id(a)].pop(id(b), None)
+            self._overlaps[id(b)].pop(id(a), None)
+        for a, b in entered:
+            self._overlaps.setdefault(id(a), {})[id(b)] = b
+            self._overlaps.setdefault(id(b), {})[id(a)] = a
+        self._pairs = pairs
+        return entered, exited
+
+    @property
+    def pairs(self) -> List[Tuple[Any, Any]]:
+        """Overlapping pairs found by the last update_pairs call"""
+        return list(self._pairs.values())
+
+    def get_overlaps(self, obj) -> List[Any]:
+        """Returns the objects overlapping the given one at the last update_pairs call"""
+        return list(self._overlaps.get(id(obj), {}).values())
+
+    def overlaps(self, a, b) -> bool:
+        """Returns True if the two objects overlapped at the last update_pairs call"""
+        return id(b) in self._overlaps.get(id(a), {})
+
+    def query(self, rect) -> List[Any]:
+        """Returns the objects whose current rectangle overlaps rect. Checks every object"""
+        left, top = rect.left, rect.top
+        right, bottom = left + rect.width, top + rect.height
+        return [p.obj for p in self._sorted if p.left < right and left < p.right and p.top < bottom and top < p.bottom]
@@ -18,9 +18,9 @@ class CallbackHandler:
     def register(self, name: str, function):
         self._callbacks[name] = function
 
-    def call(self, name: str):
+    def call(self, name: str, *args):
         if name in self._callbacks:
-            self._callbacks[name]()
+            self._callbacks[name](*args)
 
 
 class HasCallbacks:
@@ -0,0 +1,126 @@
+"""
+Swept axis aligned bounding boxes : collisions of moving rectangles are found from their whole displacement,
+so fast objects can not go through thin obstacles whatever their velocity.
+
+Rectangles can be any object having `left`, `top`, `width` and `height` attributes.
+"""
+from typing import Any, List, NamedTuple, Optional, Tuple
+import math
+
+# rectangles overlapping by less than this distance, in pixels, are touching : positions computed with floats
+# can end a hair inside a box, which must still block the moving rectangle
+EPSILON = 1e-6
+
+
+class Box(NamedTuple):
+    """Plain rectangle, the functions of this module accept any object with the same attributes"""
+    left: float
+    top: float
+    width: float
+    height: float
+
+
+class Contact(NamedTuple):
+    # fraction of the displacement done before the impact, from 0 to 1
+    time: float
+    # normal of the hit face, pointing towards the moving rectangle, like (0, -1) when landing on a box
+    normal: Tuple[int, int]
+    box: Any
+    # distance travelled along the axis before the impact, for sweep_axis contacts
+    distance: float = 0.0
+
+
+def sweep_aabb(moving, dx: float, dy: float, box) -> Optional[Contact]:
+    """
+    Returns the first contact of the moving rectangle displaced by (dx, dy) with box,
+    or None if they do not collide during the displacement. Rectangles already overlapping are ignored.
+    """
+    left, top = moving.left, moving.top
+    right, bottom = left + moving.width, top + moving.height
+    box_right, box_bottom = box.left + box.width, box.top + box.height
+    if left < box_right and box.left < right and top < box_bottom and box.top < bottom:
+        return None
+
+    # times at which the rectangles start and stop overlapping on each axis
+    if dx > 0:
+        x_entry, x_exit = (box.left - right) / dx, (box_right - left) / dx
+    elif dx < 0:
+        x_entry, x_exit = (box_right - left) / dx, (box.left - right) / dx
+    elif left < box_right and box.left < right:
+        x_entry, x_exit = -math.inf, math.inf
+    else:
+        return None
+    if dy > 0:
+        y_entry, y_exit = (box.top - bottom) / dy, (box_bottom - top) / dy
+    elif dy < 0:
+        y_entry, y_exit = (box_bottom - top) / dy, (box.top - bottom) / dy
+    elif top < box_bottom and box.top < bottom:
+        y_entry, y_exit = -math.inf, math.inf
+    else:
+        return None
+
+    entry = max(x_entry, y_entry)
+    if entry >= min(x_exit, y_exit) or entry < 0 or entry > 1:
+        return None
+    if x_entry > y_entry:
+        normal = (-1 if dx > 0 else 1, 0)
+    else:
+        normal = (0, -1 if dy > 0 else 1)
+    return Contact(entry, normal, box)
+
+
+def sweep_axis(moving, delta: float, axis: int, boxes) -> Optional[Contact]:
+    """
+    Returns the first contact of the moving rectangle displaced by delta along an axis (0 for x, 1 for y)
+    with the given boxes, or None. Boxes already overlapping the rectangle are ignored.
+    """
+    if delta == 0:
+        return None
+    if axis == 0:
+        start, size, side_start, side_size = moving.left, moving.width, moving.top, moving.height
+    else:
+        start, size, side_start, side_size = moving.top, moving.height, moving.left, moving.width
+    end, side_end = start + size, side_start + side_size
+
+    contact = None
+    for box in boxes:
+        if axis == 0:
+            box_start, box_end, box_side_start, box_side_end = box.left, box.left + box.width, box.top, box.top + box.height
+        else:
+            box_start, box_end, box_side_start, box_side_end = box.top, box.top + box.height, box.left, box.left + box.width
+        # boxes only touching the sides of the rectangle do not block it
+        if not (box_side_start < side_end - EPSILON and side_start + EPSILON < box_side_end):
+            continue
+        if delta > 0:
+            distance = box_start - end
+        else:
+            distance = start - box_end
+        # boxes behind or overlapping the rectangle do not block it, boxes it is a hair inside of do
+        if distance < -EPSILON:
+            continue
+        distance = max(distance, 0.0)
+        time = distance / abs(delta)
+        if time <= 1 and (contact is None or time < contact.time):
+            normal = -1 if delta > 0 else 1
+            contact = Contact(time, (normal, 0) if axis == 0 else (0, normal), box, distance)
+    return contact
+
+
+def move_aabb(moving, dx: float, dy: float, boxes: list) -> Tuple[float, float, List[Contact]]:
+    """
+    Moves a rectangle by (dx, dy) among boxes, one axis after the other : the horizontal displacement is swept first,
+    then the vertical one from the new horizontal position, so the rectangle slides along the boxes it hits.
+    Returns the allowed displacement and the contacts, at most one per axis.
+    The displacement to a contact is exactly the distance to the box, so the rectangle ends touching it.
+    """
+    contacts = []
+    contact = sweep_axis(moving, dx, 0, boxes)
+    if contact is not None:
+        dx = math.copysign(contact.distance, dx)
+        contacts.append(contact)
+
+    contact = sweep_axis(Box(moving.left + dx, moving.top, moving.width, moving.height), dy, 1, boxes)
+    if contact is not None:
+        dy = math.copysign(contact.distance, dy)
+        contacts.append(contact)
+    return dx, dy, contacts
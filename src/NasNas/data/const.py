@@ -1,8 +1,30 @@
+import os
+import sys
+
 from sfml import sf
 
-desktop_mode = sf.VideoMode.get_desktop_mode()
-all_modes = sf.VideoMode.get_fullscreen_modes()
 
-fullscreen_mode = all_modes[0]
-SCREEN_W = float(fullscreen_mode.width)
-SCREEN_H = float(fullscreen_mode.height)
+def has_display() -> bool:
+    """Returns False when running without display (servers, CI) or when headless mode is forced"""
+    if os.environ.get("NASNAS_HEADLESS"):
+        return False
+    if sys.platform.startswith(("linux", "freebsd")):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
+
+# querying video modes needs a display, a common resolution is used without one
+desktop_mode = None
+all_modes = []
+if has_display():
+    desktop_mode = sf.VideoMode.get_desktop_mode()
+    all_modes = sf.VideoMode.get_fullscreen_modes()
+
+if all_modes:
+    fullscreen_mode = all_modes[0]
+    SCREEN_W = float(fullscreen_mode.width)
+    SCREEN_H = float(fullscreen_mode.height)
+else:
+    fullscreen_mode = None
+    SCREEN_W = 1920.0
+    SCREEN_H = 1080.0
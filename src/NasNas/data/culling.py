@@ -0,0 +1,13 @@
+class Cullable:
+    """
+    Drawables whose global bounds are kept in the spatial index of the culling Layers containing them.
+    They call bounds_changed when their global bounds change, so the layers only index again the drawables
+    which moved instead of checking all of them every frame.
+    """
+    # layers indexing the drawable, set by the layers
+    _culling_layers: tuple = ()
+
+    def bounds_changed(self, bounds=None):
+        """Updates the drawable in the layers indexes, with its new bounds or its global_bounds if not given"""
+        for layer in self._culling_layers:
+            layer.update_bounds(self, bounds)
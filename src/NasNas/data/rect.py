@@ -1,4 +1,4 @@
-from typing import Union, Tuple
+from typing import Union, Tuple, Optional, List
 
 from sfml import sf
 
@@ -62,3 +62,66 @@ class Rect(sf.Rect):
                     self.top + self.height <= other_rect.top:
                 return False
             return True
+
+    def contains_rect(self, other_rect) -> bool:
+        return self.left <= other_rect.left and other_rect.left + other_rect.width <= self.right \
+            and self.top <= other_rect.top and other_rect.top + other_rect.height <= self.bottom
+
+    def intersection(self, other_rect) -> Optional['Rect']:
+        """Returns the overlapping area of the two rectangles, or None if they don't overlap"""
+        left = max(self.left, other_rect.left)
+        top = max(self.top, other_rect.top)
+        right = min(self.right, other_rect.left + other_rect.width)
+        bottom = min(self.bottom, other_rect.top + other_rect.height)
+        if right <= left or bottom <= top:
+            return None
+        return Rect((left, top), (right - left, bottom - top))
+
+    def union(self, other_rect) -> 'Rect':
+        """Returns the smallest rectangle containing the two rectangles"""
+        left = min(self.left, other_rect.left)
+        top = min(self.top, other_rect.top)
+        right = max(self.right, other_rect.left + other_rect.width)
+        bottom = max(self.bottom, other_rect.top + other_rect.height)
+        return Rect((left, top), (right - left, bottom - top))
+
+
+def _sweep_merge(boxes: List[Tuple[float, float, float, float]]) -> List[Tuple[float, float, float, float]]:
+    # boxes sorted by left edge, only the boxes not ended before the current left edge can overlap it
+    boxes.sort()
+    done = []
+    active = []
+    for box in boxes:
+        left, top, right, bottom = box
+        still_active = []
+        for other in active:
+            if other[2] <= left:
+                done.append(other)
+            else:
+                still_active.append(other)
+        active = still_active
+        merged = True
+        while merged:
+            merged = False
+            for k, (l, t, r, b) in enumerate(active):
+                if l < right and left < r and t < bottom and top < b:
+                    left, top, right, bottom = min(left, l), min(top, t), max(right, r), max(bottom, b)
+                    del active[k]
+                    merged = True
+                    break
+        active.append((left, top, right, bottom))
+    return done + active
+
+
+def merge_rects(rects: List[Rect]) -> List[Rect]:
+    """
+    Merges the overlapping rectangles of the list into their bounding rectangles.
+    Rectangles are merged by sweeping them from left to right, a bounding rectangle grown over rectangles
+    already swept is merged by another sweep, rarely needed.
+    """
+    boxes = [(r.left, r.top, r.left + r.width, r.top + r.height) for r in rects]
+    count = None
+    while count != len(boxes):
+        count = len(boxes)
+        boxes = _sweep_merge(boxes)
+    return [Rect((left, top), (right - left, bottom - top)) for left, top, right, bottom in boxes]
@@ -0,0 +1,172 @@
+from typing import Any, Dict, List, Optional, Tuple
+import math
+
+
+class SpatialHash:
+    """
+    A uniform grid index. Every stored object is bucketed in all the cells its rectangle overlaps,
+    so looking for objects near an area only visits the few cells covering that area
+    instead of every stored object.
+
+    Stored objects are tracked by identity, rectangles can be any object having
+    `left`, `top`, `width` and `height` attributes (Rect, sf.Rect, Camera.bounds ...).
+    Query results are returned in insertion order.
+    """
+    def __init__(self, cell_size: float):
+        if cell_size <= 0:
+            raise ValueError("SpatialHash cell_size should be greater than 0.")
+        self._cell_size = cell_size
+        # cell coordinates -> {object id: object}
+        self._cells: Dict[Tuple[int, int], Dict[int, Any]] = {}
+        # object id -> (object, (left, top, right, bottom), cells range, insertion order)
+        self._entries: Dict[int, Tuple[Any, Tuple[float, float, float, float], Tuple[int, int, int, int], int]] = {}
+        self._counter = 0
+        # min column, min row, max column, max row ever used, for column and row queries
+        self._extent: Optional[List[int]] = None
+
+    @property
+    def cell_size(self) -> float:
+        return self._cell_size
+
+    def _cells_range(self, left: float, top: float, right: float, bottom: float) -> Tuple[int, int, int, int]:
+        # the right and bottom edges are included, so rectangles touching on a cell border share that cell
+        i0 = math.floor(left / self._cell_size)
+        j0 = math.floor(top / self._cell_size)
+        i1 = max(i0, math.floor(right / self._cell_size))
+        j1 = max(j0, math.floor(bottom / self._cell_size))
+        return i0, j0, i1, j1
+
+    def insert(self, obj, rect=None):
+        """
+        Adds an object to the index. If no rect is given, the object itself is used as rectangle.
+        Inserting an object already in the index updates its rectangle.
+        """
+        key = id(obj)
+        if key in self._entries:
+            self.update(obj, rect)
+            return
+        if rect is None:
+            rect = obj
+        bounds = (rect.left, rect.top, rect.left + rect.width, rect.top + rect.height)
+        cells = self._cells_range(*bounds)
+        self._entries[key] = (obj, bounds, cells, self._counter)
+        self._counter += 1
+        self._add_to_cells(key, obj, cells)
+
+    def remove(self, obj):
+        key = id(obj)
+        if key in self._entries:
+            self._remove_from_cells(key, self._entries[key][2])
+            del self._entries[key]
+
+    def update(self, obj, rect=None):
+        """
+        Updates the rectangle of an object already in the index. Cells are only touched
+        if the object moved to other cells.
+        """
+        key = id(obj)
+        if key not in self._entries:
+            self.insert(obj, rect)
+            return
+        if rect is None:
+            rect = obj
+        _, _, old_cells, order = self._entries[key]
+        bounds = (rect.left, rect.top, rect.left + rect.width, rect.top + rect.height)
+        cells = self._cells_range(*bounds)
+        if cells != old_cells:
+            self._remove_from_cells(key, old_cells)
+            self._add_to_cells(key, obj, cells)
+        self._entries[key] = (obj, bounds, cells, order)
+
+    def clear(self):
+        self._cells = {}
+        self._entries = {}
+        self._extent = None
+
+    def _add_to_cells(self, key: int, obj, cells: Tuple[int, int, int, int]):
+        i0, j0, i1, j1 = cells
+        for j in range(j0, j1+1):
+            for i in range(i0, i1+1):
+                if (i, j) not in self._cells:
+                    self._cells[(i, j)] = {}
+                self._cells[(i, j)][key] = obj
+        if self._extent is None:
+            self._extent = [i0, j0, i1, j1]
+        else:
+            self._extent = [min(self._extent[0], i0), min(self._extent[1], j0),
+                            max(self._extent[2], i1), max(self._extent[3], j1)]
+
+    def _remove_from_cells(self, key: int, cells: Tuple[int, int, int, int]):
+        i0, j0, i1, j1 = cells
+        for j in range(j0, j1+1):
+            for i in range(i0, i1+1):
+                cell = self._cells.get((i, j))
+                if cell is not None:
+                    cell.pop(key, None)
+                    if not cell:
+                        del self._cells[(i, j)]
+
+    def _collect(self, i0: int, j0: int, i1: int, j1: int) -> Dict[int, Any]:
+        found = {}
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            # the requested area is bigger than the used area, iterating over the used cells is faster
+            for (i, j), cell in self._cells.items():
+                if i0 <= i <= i1 and j0 <= j <= j1:
+                    found.update(cell)
+        else:
+            for j in range(j0, j1+1):
+                for i in range(i0, i1+1):
+                    cell = self._cells.get((i, j))
+                    if cell:
+                        found.update(cell)
+        return found
+
+    def _sorted(self, keys) -> List[Any]:
+        entries = [self._entries[k] for k in keys]
+        entries.sort(key=lambda e: e[3])
+        return [e[0] for e in entries]
+
+    def query(self, rect) -> List[Any]:
+        """
+        Returns the objects whose rectangle overlaps or touches the given rectangle.
+        """
+        left, top = rect.left, rect.top
+        right, bottom = left + rect.width, top + rect.height
+        found = self._collect(*self._cells_range(left, top, right, bottom))
+        keys = []
+        for key in found:
+            l, t, r, b = self._entries[key][1]
+            if l <= right and r >= left and t <= bottom and b >= top:
+                keys.append(key)
+        return self._sorted(keys)
+
+    def query_cells(self, i0: int, j0: int, i1: int, j1: int) -> List[Any]:
+        """
+        Returns the objects bucketed in the cells from column i0 to i1 and row j0 to j1 (inclusive).
+        """
+        return self._sorted(self._collect(i0, j0, i1, j1))
+
+    def query_column(self, i: int) -> List[Any]:
+        """Returns the objects bucketed in the cell column i"""
+        if self._extent is None:
+            return []
+        return self.query_cells(i, self._extent[1], i, self._extent[3])
+
+    def query_row(self, j: int) -> List[Any]:
+        """Returns the objects bucketed in the cell row j"""
+        if self._extent is None:
+            return []
+        return self.query_cells(self._extent[0], j, self._extent[2], j)
+
+    def cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def __contains__(self, obj) -> bool:
+        return id(obj) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        for entry in sorted(self._entries.values(), key=lambda e: e[3]):
+            yield entry[0]
@@ -1,4 +1,5 @@
 from .resource_manager import Res
 from .resource_path import find_resource, RES_DIR
+from .atlas import TextureAtlas, AtlasRegion
 
-__all__ = ['Res', 'find_resource', 'RES_DIR']
+__all__ = ['Res', 'find_resource', 'RES_DIR', 'TextureAtlas', 'AtlasRegion']
@@ -0,0 +1,215 @@
+"""
+Texture atlas : small textures are packed in a few big textures (pages), so sprites and tiles of different
+images share a texture and can be drawn with the same draw call.
+
+Packed textures are used through AtlasRegion handles, accepted in place of a texture by Sprite,
+and used automatically by the tilesets whose image is packed.
+The packed layout is saved next to the tmx cache and reused while the source images do not change.
+"""
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+
+from sfml import sf
+
+from ..data.rect import Rect
+from .resource_path import find_resource, RES_DIR
+
+# name -> (page, x, y, width, height)
+Layout = Dict[str, Tuple[int, int, int, int, int]]
+
+
+class SkylinePacker:
+    """
+    Bottom left skyline packer : the top edge of the packed rectangles is kept as a list of horizontal segments,
+    each rectangle is placed on the segment where its top is the lowest.
+    """
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        # segments [x, y, width], from left to right
+        self.skyline: List[List[int]] = [[0, 0, width]]
+
+    def _fit(self, index: int, width: int, height: int) -> Optional[int]:
+        """Returns the y position of a rectangle placed at the left of the segment index, or None if it does not fit"""
+        x = self.skyline[index][0]
+        if x + width > self.width:
+            return None
+        y = 0
+        remaining = width
+        while remaining > 0:
+            y = max(y, self.skyline[index][1])
+            if y + height > self.height:
+                return None
+            remaining -= self.skyline[index][2]
+            index += 1
+        return y
+
+    def insert(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """Places a rectangle, returns its position or None if the page is full"""
+        best = None
+        for index, (x, _, _) in enumerate(self.skyline):
+            y = self._fit(index, width, height)
+            if y is not None and (best is None or (y + height, x) < best[0]):
+                best = ((y + height, x), index, x, y)
+        if best is None:
+            return None
+
+        _, index, x, y = best
+        self.skyline.insert(index, [x, y + height, width])
+        # shortening or removing the segments now under the new one
+        i = index + 1
+        while i < len(self.skyline):
+            segment = self.skyline[i]
+            overlap = x + width - segment[0]
+            if overlap <= 0:
+                break
+            segment[0] += overlap
+            segment[2] -= overlap
+            if segment[2] > 0:
+                break
+            del self.skyline[i]
+        # merging the neighbour segments at the same height
+        i = 0
+        while i < len(self.skyline) - 1:
+            if self.skyline[i][1] == self.skyline[i + 1][1]:
+                self.skyline[i][2] += self.skyline[i + 1][2]
+                del self.skyline[i + 1]
+            else:
+                i += 1
+        return x, y
+
+
+class AtlasRegion:
+    """Handle of a texture packed in an atlas : the page texture and the rectangle of the packed texture in the page"""
+    __slots__ = ('name', 'atlas', 'page', 'rectangle')
+
+    def __init__(self, name: str, atlas: 'TextureAtlas', page: int, rectangle: Rect):
+        self.name = name
+        self.atlas = atlas
+        self.page = page
+        self.rectangle = rectangle
+
+    @property
+    def texture(self) -> sf.Texture:
+        return self.atlas.pages[self.page]
+
+    @property
+    def offset(self) -> sf.Vector2:
+        """Position of the packed texture in the page, to add to the texture coordinates"""
+        return sf.Vector2(self.rectangle.left, self.rectangle.top)
+
+    @property
+    def size(self) -> sf.Vector2:
+        return sf.Vector2(self.rectangle.width, self.rectangle.height)
+
+    def __repr__(self):
+        return f"AtlasRegion({self.name}, page={self.page}, rectangle={self.rectangle})"
+
+
+class TextureAtlas:
+    """
+    Pages of packed textures. Textures are named by their path in the assets directory, without extension,
+    like "tilesets/Assets".
+    """
+    LAYOUT_VERSION = 1
+    LAYOUT_PATH = os.path.join(".nasnas_cache", "atlas.json")
+
+    def __init__(self, page_size: int = 2048, max_size: int = 512, padding: int = 1):
+        """
+        Args:
+            page_size (int): maximum width and height of the pages
+            max_size (int): textures wider or higher than this are not packed
+            padding (int): transparent pixels between the packed textures, avoids bleeding when scaled
+        """
+        self.page_size = page_size
+        self.max_size = max_size
+        self.padding = padding
+        self.pages: List[sf.Texture] = []
+        self.regions: Dict[str, AtlasRegion] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.regions
+
+    def __getitem__(self, name: str) -> AtlasRegion:
+        return self.regions[name]
+
+    def __len__(self):
+        return len(self.regions)
+
+    def get(self, name: str) -> Optional[AtlasRegion]:
+        return self.regions.get(name)
+
+    def pack(self, sizes: Dict[str, Tuple[int, int]]) -> Layout:
+        """Returns the position of each texture in the pages, textures too big for the atlas are left out"""
+        packers: List[SkylinePacker] = []
+        layout = {}
+        # packing the highest textures first gives flatter skylines
+        for name in sorted(sizes, key=lambda n: (sizes[n][1], sizes[n][0], n), reverse=True):
+            width, height = sizes[name]
+            if width > self.max_size or height > self.max_size or width > self.page_size or height > self.page_size:
+                continue
+            for page, packer in enumerate(packers):
+                position = packer.insert(width + self.padding, height + self.padding)
+                if position is not None:
+                    break
+            else:
+                page = len(packers)
+                packers.append(SkylinePacker(self.page_size, self.page_size))
+                position = packers[page].insert(width + self.padding, height + self.padding)
+            layout[name] = (page, position[0], position[1], width, height)
+        return layout
+
+    def build(self, images: Dict[str, sf.Image], layout: Layout):
+        """Creates the pages textures from the source images placed as given by the layout"""
+        extents: Dict[int, List[int]] = {}
+        for page, x, y, width, height in layout.values():
+            extent = extents.setdefault(page, [1, 1])
+            extent[0] = max(extent[0], x + width)
+            extent[1] = max(extent[1], y + height)
+
+        pages = [sf.Image.create(*extents[page], sf.Color.TRANSPARENT) for page in range(len(extents))]
+        for name, (page, x, y, width, height) in layout.items():
+            pages[page].blit(images[name], (x, y))
+
+        self.pages = [sf.Texture.from_image(image) for image in pages]
+        self.regions = {name: AtlasRegion(name, self, page, Rect((x, y), (width, height)))
+                        for name, (page, x, y, width, height) in layout.items()}
+
+    def read_layout(self, sources: Dict[str, List[int]], path: Optional[str] = None) -> Optional[Layout]:
+        """
+        Returns the saved layout if it was packed from the same sources and settings, else None.
+        sources gives the modification time (ns) and size of each source image file.
+        """
+        try:
+            with open(find_resource(path or self.LAYOUT_PATH)) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return None
+        settings = [self.LAYOUT_VERSION, self.page_size, self.max_size, self.padding]
+        if saved.get('settings') != settings or saved.get('sources') != sources:
+            return None
+        return {name: tuple(region) for name, region in saved['layout'].items()}
+
+    def write_layout(self, layout: Layout, sources: Dict[str, List[int]], path: Optional[str] = None):
+        path = find_resource(path or self.LAYOUT_PATH)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump({
+                    'settings': [self.LAYOUT_VERSION, self.page_size, self.max_size, self.padding],
+                    'sources': sources,
+                    'layout': layout,
+                }, file)
+        except OSError:
+            # the saved layout only saves the packing time on next launches
+            pass
+
+
+def texture_name(path: str) -> str:
+    """Returns the atlas name of a texture file : its path in the assets directory, without extension"""
+    root = find_resource(RES_DIR)
+    path = os.path.splitext(path)[0]
+    if os.path.abspath(path).startswith(os.path.abspath(root)):
+        path = os.path.relpath(path, root)
+    return path.replace(os.sep, '/')
@@ -1,5 +1,7 @@
-from typing import Dict, Union
+from typing import Callable, Dict, List, Optional, Union
 import os
+import queue
+import threading
 
 from sfml import sf
 
@@ -8,35 +10,101 @@ from .resource_path import find_resource
 from .tileset_manager import TilesetManager
 
 
+TEXTURE_EXTENSIONS = [".png", ".jpg", ".bmp"]
+FONT_EXTENSIONS = [".ttf"]
+MAP_EXTENSIONS = [".tmx"]
+
+
+class Resource:
+    """
+    Handle of a resource file found in the assets directory.
+    The file is only loaded the first time the resource is accessed,
+    or when it is prefetched by the BackgroundLoader.
+    """
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.ext = os.path.splitext(path)[1]
+        self._value: Union[None, sf.Texture, sf.Font, tm.TiledMap] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    @property
+    def type_name(self) -> str:
+        if self._value is not None:
+            return type(self._value).__name__
+        if self.ext in TEXTURE_EXTENSIONS:
+            return "Texture"
+        if self.ext in FONT_EXTENSIONS:
+            return "Font"
+        return "TiledMap"
+
+    def decode(self):
+        """
+        CPU side of the loading : decodes images and parses maps files.
+        Does not need a graphic context, so it can be run on a worker thread.
+        """
+        if self.ext in TEXTURE_EXTENSIONS:
+            return sf.Image.from_file(self.path)
+        elif self.ext in MAP_EXTENSIONS:
+            return tm.TiledMap(self.path)
+        return None
+
+    def finish(self, decoded=None):
+        """
+        Main thread side of the loading : uploads textures to the GPU, loads fonts and builds maps.
+        If decoded is None, the file is read directly.
+        """
+        if self._value is not None:
+            return self._value
+        if self.ext in TEXTURE_EXTENSIONS:
+            if decoded is not None:
+                self._value = sf.Texture.from_image(decoded)
+            else:
+                self._value = sf.Texture.from_file(self.path)
+        elif self.ext in FONT_EXTENSIONS:
+            font = sf.Font.from_file(self.path)
+            font.get_texture(8).smooth = False
+            font.get_texture(16).smooth = False
+            font.get_texture(32).smooth = False
+            self._value = font
+        elif self.ext in MAP_EXTENSIONS:
+            tile_map = decoded if decoded is not None else tm.TiledMap(self.path)
+            tile_map.load()
+            self._value = tile_map
+        return self._value
+
+    def load(self):
+        """Loads the resource if needed and returns it"""
+        if self._value is None:
+            return self.finish(self.decode() if self.ext in MAP_EXTENSIONS else None)
+        return self._value
+
+
 def load_resources(obj, path):
+    """Registers all the resources found in the path directory. The files are not loaded yet."""
     for file in os.listdir(find_resource(path)):
         filename, ext = os.path.splitext(file)
         if os.path.isfile(os.path.join(path, file)):
-            if ext in [".png", ".jpg", ".bmp"]:
-                value = sf.Texture.from_file(find_resource(os.path.join(path, file)))
+            res = obj
+            while res._parent:
+                res = res._parent
+
+            if ext in TEXTURE_EXTENSIONS:
+                value = Resource(filename, find_resource(os.path.join(path, file)))
                 setattr(obj, filename, value)
-                res = obj
-                while res._parent:
-                    res = res._parent
                 setattr(res._textures, filename, value)
 
-            elif ext in [".ttf"]:
-                value = sf.Font.from_file(find_resource(os.path.join(path, file)))
-                value.get_texture(8).smooth = False
-                value.get_texture(16).smooth = False
-                value.get_texture(32).smooth = False
+            elif ext in FONT_EXTENSIONS:
+                value = Resource(filename, find_resource(os.path.join(path, file)))
                 setattr(obj, filename, value)
-                res = obj
-                while res._parent:
-                    res = res._parent
                 setattr(res._fonts, filename, value)
 
-            elif ext in [".tmx"]:
-                value = tm.TiledMap(find_resource(os.path.join(path, file)))
+            elif ext in MAP_EXTENSIONS:
+                value = Resource(filename, find_resource(os.path.join(path, file)))
                 setattr(obj, filename, value)
-                res = obj
-                while res._parent:
-                    res = res._parent
                 setattr(res._maps, filename, value)
 
             elif ext in [".tsx"]:
@@ -48,11 +116,86 @@ def load_resources(obj, path):
             setattr(obj, filename, directory)
 
 
+class LoadingJob:
+    """Progress of a group of resources being prefetched"""
+    def __init__(self, resources: List[Resource], callback: Optional[Callable[[int, int, str], None]] = None):
+        self.resources = resources
+        self.callback = callback
+        self.done = 0
+
+    @property
+    def total(self) -> int:
+        return len(self.resources)
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.
+
+    @property
+    def finished(self) -> bool:
+        return self.done >= self.total
+
+    def _advance(self, resource: Resource):
+        self.done += 1
+        if self.callback:
+            self.callback(self.done, self.total, resource.name)
+
+
+class BackgroundLoader:
+    """
+    Decodes resources on a worker thread. The decoded resources are finished (uploaded to the GPU)
+    on the main thread when update() is called, the game loop calls it every frame.
+    """
+    def __init__(self):
+        self._requests: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = 0
+
+    @property
+    def busy(self) -> bool:
+        return self._pending > 0
+
+    def prefetch(self, resources: List[Resource], callback: Optional[Callable[[int, int, str], None]] = None) -> LoadingJob:
+        job = LoadingJob(resources, callback)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="NasNas resources loader", daemon=True)
+            self._thread.start()
+        for resource in resources:
+            self._pending += 1
+            self._requests.put((job, resource))
+        return job
+
+    def _work(self):
+        while True:
+            job, resource = self._requests.get()
+            try:
+                decoded = None if resource.loaded else resource.decode()
+            except Exception as error:
+                decoded = error
+            self._results.put((job, resource, decoded))
+
+    def update(self, max_count: Optional[int] = None):
+        """Finishes the resources decoded by the worker thread, at most max_count of them if given"""
+        count = 0
+        while self._pending and (max_count is None or count < max_count):
+            try:
+                job, resource, decoded = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            count += 1
+            if isinstance(decoded, Exception):
+                raise decoded
+            resource.finish(decoded)
+            job._advance(resource)
+
+
 class Dir:
     def __init__(self, name, parent=None):
         self._name = name
         self._parent = parent
-        self._data: Dict[str, Union[Dir, sf.Texture, tm.TiledMap, sf.Font]] = {}
+        self._data: Dict[str, Union[Dir, Resource, sf.Texture, tm.TiledMap, sf.Font]] = {}
 
     def __getattr__(self, item) -> Union[sf.Font, sf.Texture, tm.TiledMap]:
         if item[0] == '_':
@@ -60,7 +203,11 @@ class Dir:
         if item == '..':
             return self._parent
         if item in self._data:
-            return self._data[item]
+            value = self._data[item]
+            if isinstance(value, Resource):
+                # loading the resource on first access, the handle is kept so the texture atlas can find it
+                value = value.load()
+            return value
         raise AttributeError(f"File or directory '{item}' not found in directory '{self._name}'")
 
     def __setattr__(self, key, value):
@@ -76,22 +223,60 @@ class Dir:
         for key in self._data.keys():
             yield key
 
+    @staticmethod
+    def _value(value):
+        # loaded files are returned as their Texture, Font or TiledMap, the others as their handle
+        if isinstance(value, Resource) and value.loaded:
+            return value.load()
+        return value
+
     def values(self):
-        return self._data.values()
+        """
+        Returns the subdirectories and the files, without loading them.
+        Loaded files are returned as their Texture, Font or TiledMap, the files not loaded yet as their Resource handle.
+        """
+        return [self._value(value) for value in self._data.values()]
 
     def items(self):
-        return self._data.items()
+        """Returns the names and values of the files and subdirectories, like values()"""
+        return [(key, self._value(value)) for key, value in self._data.items()]
+
+    def handles(self):
+        """Returns the names and Resource handles of the files and the subdirectories, loaded or not"""
+        return list(self._data.items())
+
+    def loaded_items(self):
+        """Returns the names and values of the files already loaded, without loading the others"""
+        items = []
+        for key, value in self._data.items():
+            if isinstance(value, Resource):
+                if not value.loaded:
+                    continue
+                value = value.load()
+            if not isinstance(value, Dir):
+                items.append((key, value))
+        return items
+
+    def resources(self):
+        """Yields the handles of the resources of the directory and its subdirectories, loaded or not"""
+        for value in self._data.values():
+            if isinstance(value, Dir):
+                for resource in value.resources():
+                    yield resource
+            elif isinstance(value, Resource):
+                yield value
 
     def all_files(self):
-        for file in self.values():
-            if isinstance(file, Dir):
-                for f in file.all_files():
+        """Yields the files of the directory and its subdirectories already loaded, without loading the others"""
+        for _, file in self.loaded_items():
+            yield file
+        for value in self._data.values():
+            if isinstance(value, Dir):
+                for f in value.all_files():
                     yield f
-            else:
-                yield file
 
     def print_tree(self, indent=0):
-        items = [i for i in self.items()]
+        items = [i for i in self._data.items()]
         dirs = [d for d in items if isinstance(d[1], Dir)]
         dirs.sort(key=lambda x: x[0])
         files = [f for f in items if not isinstance(f[1], Dir)]
@@ -109,4 +294,5 @@ class Dir:
                 print("└" + "─", end='')
             else:
                 print("├" + "─", end='')
-            print(f" {name} : {type(val).__name__}")
+            type_name = val.type_name if isinstance(val, Resource) else type(val).__name__
+            print(f" {name} : {type_name}")
@@ -1,6 +1,12 @@
-from .resource_loader import load_resources, Dir
+from typing import Callable, List, Optional, Sequence, Union
+import os
+
+from sfml import sf
+
+from .resource_loader import load_resources, Dir, Resource, BackgroundLoader, LoadingJob
 from .resource_path import find_resource, RES_DIR
 from .tileset_manager import TilesetManager
+from .atlas import TextureAtlas, texture_name
 
 
 class ResMeta(type):
@@ -16,6 +22,8 @@ class ResMeta(type):
     _maps: Dir = Dir("maps")
     _fonts: Dir = Dir("fonts")
     _parent = None
+    _loader: BackgroundLoader = BackgroundLoader()
+    _atlas: Optional[TextureAtlas] = None
 
     @property
     def Textures(cls) -> Dir:
@@ -29,10 +37,18 @@ class ResMeta(type):
     def Fonts(cls) -> Dir:
         return cls._fonts
 
+    @property
+    def atlas(cls) -> Optional[TextureAtlas]:
+        return cls._atlas
+
     @property
     def is_ready(cls) -> bool:
         return cls._ready
 
+    @property
+    def is_loading(cls) -> bool:
+        return cls._loader.busy
+
     @classmethod
     def __iter__(mcs):
         for x in mcs._assets:
@@ -46,6 +62,10 @@ class ResMeta(type):
     def items(mcs):
         return mcs._assets.items()
 
+    @classmethod
+    def handles(mcs):
+        return mcs._assets.handles()
+
     def __getattr__(cls, item) -> Dir:
         if item[0] == "_":
             return cls.__dict__[item]
@@ -67,23 +87,131 @@ class Res(metaclass=ResMeta):
     Res.Textures contains all textures at the same level.
     Res.Maps contains all tiled maps.
     Res.Fonts contains all fonts.
+
+    With Res.load(lazy=True), resources are loaded on first access instead,
+    and can be loaded in the background with Res.prefetch().
+
+    Small textures can be packed in a texture atlas with Res.load(atlas=[...]) or Res.build_atlas(),
+    Res.atlas then gives their AtlasRegion, by path like Res.atlas["sprites/player"].
     """
     @classmethod
-    def load(cls):
+    def load(cls, lazy: bool = False, progress: Optional[Callable[[int, int, str], None]] = None,
+             atlas: Optional[Sequence[str]] = None):
         """Load all resources into Res.
         You need to call this method once at the start of your game
         if you want to use the resource manager.
+
+        Args:
+            lazy (bool):
+                If True, the resources are only registered and each of them will be loaded on first access.
+                Use prefetch() to load them in the background.
+            progress (callable):
+                Called after each loaded resource with the number of loaded resources, the total number
+                of resources and the name of the last loaded resource. Not called in lazy mode.
+            atlas (list):
+                Paths of the directories or textures to pack in the texture atlas, "" packs all the textures.
+                The atlas is built before the maps are loaded, so their tilesets use it.
         """
         cls._assets._parent = cls
         load_resources(cls._assets, find_resource(RES_DIR))
+        if atlas is not None:
+            cls.build_atlas(*atlas)
+
+        if not lazy:
+            resources = list(cls._assets.resources())
+            count = 0
+
+            def load(resource):
+                nonlocal count
+                resource.load()
+                count += 1
+                if progress:
+                    progress(count, len(resources), resource.name)
+
+            # textures and fonts are loaded first, tilesets and maps need them
+            for res in resources:
+                # packed textures are loaded only if accessed directly
+                if res.type_name != "TiledMap" and not (cls._atlas and texture_name(res.path) in cls._atlas):
+                    load(res)
+            for tileset in TilesetManager:
+                tileset.load()
+            for res in resources:
+                if res.type_name == "TiledMap":
+                    load(res)
 
-        for tileset in TilesetManager:
-            tileset.load()
+        cls._ready = True
 
-        for tile_map in cls.Maps.values():
-            tile_map.load()
+    @classmethod
+    def prefetch(cls, *paths: str, progress: Optional[Callable[[int, int, str], None]] = None) -> LoadingJob:
+        """Loads the given resources in the background. If no path is given, all the resources not loaded yet are.
+        Images are decoded and maps are parsed on a worker thread, the textures are uploaded on the main thread
+        by Res.update(), called every frame by the App.
+
+        Args:
+            paths (str): paths of the resources relative to the assets directory, like "tilesets/Assets"
+            progress (callable): called on the main thread after each loaded resource,
+                with the number of loaded resources, the total number of resources and the resource name
+
+        Returns:
+            A LoadingJob, giving the progress of the prefetch.
+        """
+        if paths:
+            resources = [r for path in paths for r in cls._find_resources(path)]
+        else:
+            resources = list(cls._assets.resources())
+        resources = [r for r in resources if not r.loaded]
+        return cls._loader.prefetch(resources, progress)
 
-        cls._ready = True
+    @classmethod
+    def build_atlas(cls, *paths: str, page_size: int = 2048, max_size: int = 512, padding: int = 1) -> TextureAtlas:
+        """Packs the textures found in the given paths in a texture atlas, available as Res.atlas.
+        The packed layout is saved and reused on next launches while the images do not change.
+
+        Args:
+            paths (str): paths of the directories or textures relative to the assets directory. All the textures if empty
+            page_size (int): maximum width and height of the atlas pages
+            max_size (int): textures wider or higher than this are not packed
+            padding (int): transparent pixels between the packed textures
+
+        Returns:
+            The TextureAtlas.
+        """
+        resources = [r for path in (paths or ("",)) for r in cls._find_resources(path)]
+        files = {texture_name(r.path): r.path for r in resources if r.type_name == "Texture"}
+        sources = {}
+        for name, path in files.items():
+            stat = os.stat(path)
+            sources[name] = [stat.st_mtime_ns, stat.st_size]
+
+        atlas = TextureAtlas(page_size, max_size, padding)
+        images = {name: sf.Image.from_file(path) for name, path in files.items()}
+        layout = atlas.read_layout(sources)
+        if layout is None:
+            layout = atlas.pack({name: (image.size.x, image.size.y) for name, image in images.items()})
+            atlas.write_layout(layout, sources)
+        atlas.build(images, layout)
+        cls._atlas = atlas
+        return atlas
+
+    @classmethod
+    def _find_resources(cls, path: str) -> List[Resource]:
+        res: Union[Dir, Resource] = cls._assets
+        for name in path.replace("\\", "/").split("/"):
+            if name:
+                if not isinstance(res, Dir) or name not in res._data:
+                    raise AttributeError(f"Resource {path} not found in {RES_DIR}")
+                res = res._data[name]
+        if isinstance(res, Dir):
+            return list(res.resources())
+        if isinstance(res, Resource):
+            return [res]
+        # already loaded
+        return []
+
+    @classmethod
+    def update(cls, max_count: Optional[int] = None):
+        """Finishes the loading of the prefetched resources decoded by the worker thread"""
+        cls._loader.update(max_count)
 
     @classmethod
     def get_tree(cls):
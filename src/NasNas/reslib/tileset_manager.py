@@ -1,8 +1,7 @@
 from typing import Dict
-from xml.etree import ElementTree
 
-from .resource_path import find_resource
 from ..tilemapping.tilesets import Tileset
+from ..tilemapping.cache import load_tsx
 
 
 class TilesetManagerMeta(type):
@@ -26,8 +25,7 @@ class TilesetManagerMeta(type):
 class TilesetManager(metaclass=TilesetManagerMeta):
     @classmethod
     def load_tsx(cls, path: str):
-        xml = ElementTree.parse(find_resource(path)).getroot()
-        t = Tileset(xml, path)
+        t = Tileset(load_tsx(path), path)
         cls._data[t.name] = t
 
     @classmethod
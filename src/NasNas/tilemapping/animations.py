@@ -0,0 +1,126 @@
+from typing import Dict, List, Tuple
+import heapq
+
+from sfml import sf
+
+from .tilesets import MapTileset
+from .tiles import calculate_tex_coords
+
+
+class TileAnimation:
+    """
+    Timeline of an animated tile of a tileset.
+    The timeline is shared by all the cells displaying this tile, they are all updated at once
+    when the frame changes, so they always stay in sync.
+    """
+    def __init__(self, tileset: MapTileset, tile_id: int):
+        self.tileset = tileset
+        self.tile_id = tile_id
+        self.frames: List[int] = [frame['id'] for frame in tileset.animations[tile_id]]
+        self.durations: List[int] = [frame['duration'] for frame in tileset.animations[tile_id]]
+        self.duration: int = sum(self.durations)
+        self.index = 0
+        # time in milliseconds when the next frame starts
+        self.next_change = self.durations[0] if self.duration > 0 else None
+
+        # cells using the animation : chunk -> [(vertex array, index of the first vertex, transformations)]
+        self.cells: Dict[object, List[Tuple[sf.VertexArray, int, Tuple[int, ...]]]] = {}
+        self._tex_coords: Dict[Tuple[int, Tuple[int, ...]], List[sf.Vector2]] = {}
+
+    def get_tex_coords(self, index: int, transformations: Tuple[int, ...]) -> List[sf.Vector2]:
+        """Returns the texture coordinates of the frame number index, with the given transformations"""
+        key = (index, transformations)
+        if key not in self._tex_coords:
+            tile_id = self.frames[index]
+            tx = (tile_id % self.tileset.columns) * self.tileset.tile_width
+            ty = (tile_id // self.tileset.columns) * self.tileset.tile_height
+            self._tex_coords[key] = calculate_tex_coords(self.tileset, tx, ty, list(transformations))
+        return self._tex_coords[key]
+
+    def add_cell(self, chunk, vertices: sf.VertexArray, vertex_index: int, transformations: Tuple[int, ...]):
+        if chunk not in self.cells:
+            self.cells[chunk] = []
+        self.cells[chunk].append((vertices, vertex_index, transformations))
+        self._write_cell(vertices, vertex_index, transformations)
+
+    def remove_chunk(self, chunk):
+        self.cells.pop(chunk, None)
+
+    def _write_cell(self, vertices: sf.VertexArray, vertex_index: int, transformations: Tuple[int, ...]):
+        tex_coords = self.get_tex_coords(self.index, transformations)
+        vertices[vertex_index + 0].tex_coords = tex_coords[0]
+        vertices[vertex_index + 1].tex_coords = tex_coords[1]
+        vertices[vertex_index + 2].tex_coords = tex_coords[2]
+        vertices[vertex_index + 3].tex_coords = tex_coords[3]
+
+    def seek(self, time: int) -> bool:
+        """
+        Moves the timeline to the given time in milliseconds.
+        The cells are rewritten only if the frame changed. Returns True if it did.
+        """
+        if self.next_change is None:
+            return False
+        elapsed = time % self.duration
+        index = 0
+        end = self.durations[0]
+        while end <= elapsed:
+            index += 1
+            end += self.durations[index]
+        self.next_change = time - elapsed + end
+        if index == self.index:
+            return False
+        self.index = index
+        for chunk, cells in self.cells.items():
+            for vertices, vertex_index, transformations in cells:
+                self._write_cell(vertices, vertex_index, transformations)
+            chunk.layer.invalidate(chunk.bounds)
+        return True
+
+
+class TileAnimator:
+    """
+    Schedules the animated tiles of a TiledMap using a single clock.
+    Animations are kept in a heap sorted by their next frame change, updating costs nothing
+    until a frame actually changes.
+    """
+    def __init__(self):
+        self.clock = sf.Clock()
+        self.animations: Dict[Tuple[MapTileset, int], TileAnimation] = {}
+        self._schedule: List[Tuple[int, int, TileAnimation]] = []
+        self._count = 0
+
+    @property
+    def time(self) -> int:
+        return self.clock.elapsed_time.milliseconds
+
+    def get(self, tileset: MapTileset, tile_id: int) -> TileAnimation:
+        """Returns the timeline of the given animated tile, creates it if needed"""
+        key = (tileset, tile_id)
+        if key not in self.animations:
+            animation = TileAnimation(tileset, tile_id)
+            animation.seek(self.time)
+            self.animations[key] = animation
+            if animation.next_change is not None:
+                heapq.heappush(self._schedule, (animation.next_change, self._count, animation))
+                self._count += 1
+        return self.animations[key]
+
+    def register(self, chunk, tileset: MapTileset, tile_id: int,
+                 vertices: sf.VertexArray, vertex_index: int, transformations: List[int]):
+        """Registers a cell of a chunk displaying an animated tile"""
+        self.get(tileset, tile_id).add_cell(chunk, vertices, vertex_index, tuple(transformations))
+
+    def unregister(self, chunk):
+        """Forgets all the cells of the given chunk"""
+        for animation in self.animations.values():
+            animation.remove_chunk(chunk)
+
+    def update(self):
+        if not self._schedule:
+            return
+        time = self.time
+        while self._schedule[0][0] <= time:
+            _, _, animation = heapq.heappop(self._schedule)
+            animation.seek(time)
+            heapq.heappush(self._schedule, (animation.next_change, self._count, animation))
+            self._count += 1
@@ -0,0 +1,259 @@
+"""
+On disk cache of the parsed Tiled files.
+
+Parsed maps and tilesets (see tmx.py) are stored in a binary file per source file :
+a fixed size header, the pickled data without its arrays, then the raw arrays (tile gids and their flip flags).
+When the source file did not change, the arrays are read back as memory mapped views of the cache file,
+no XML or CSV parsing is done.
+
+A cache file is valid only if its format version, byte order, and the source file modification time and size
+match, otherwise it is ignored and rewritten.
+
+The cache directory must be trusted like the game code : the data of the cache files is unpickled,
+a crafted cache file can run arbitrary code. Do not use a directory other users or downloaded content can write to.
+
+The cache can be prebuilt, for example when packaging a game :
+    python -m NasNas.tilemapping.cache assets
+"""
+from typing import Callable, List, Optional
+from array import array
+import argparse
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+from ..reslib.resource_path import find_resource
+from .tmx import read_tmx, read_tsx
+
+
+class _CachedArray:
+    """Placeholder of an array in the pickled data, the array itself is stored after the data"""
+    __slots__ = ('offset', 'count', 'typecode')
+
+    def __init__(self, offset: int, count: int, typecode: str):
+        self.offset = offset
+        self.count = count
+        self.typecode = typecode
+
+    def __getstate__(self):
+        return self.offset, self.count, self.typecode
+
+    def __setstate__(self, state):
+        self.offset, self.count, self.typecode = state
+
+
+class TmxCache:
+    MAGIC = b"NNTC"
+    # bump the version each time the cache format or the parsed data layout changes,
+    # cache files written by other versions are then rebuilt
+    VERSION = 3
+    # magic, version, byte order, source mtime (ns), source size, pickled data length
+    HEADER = struct.Struct("<4sHHqqI")
+    EXTENSION = ".nntc"
+
+    def __init__(self, directory: str = ".nasnas_cache"):
+        """
+        Args:
+            directory (str): directory where cache files are read and written, relative to the resources root
+        """
+        self.directory = directory
+        self.enabled = True
+        # packaging tools may not keep the files modification time, set to False to validate with the size only
+        self.check_mtime = True
+
+    @staticmethod
+    def _key(path: str) -> str:
+        root = find_resource("")
+        if root and os.path.isabs(path) and path.startswith(root):
+            path = os.path.relpath(path, root)
+        return os.path.normpath(path).replace(os.sep, '/')
+
+    def get_cache_path(self, path: str) -> str:
+        """Returns the path of the cache file of the given source file"""
+        key = self._key(path)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return find_resource(os.path.join(self.directory, f"{os.path.basename(key)}-{digest}{self.EXTENSION}"))
+
+    def _is_valid(self, header: tuple, source_stat: os.stat_result) -> bool:
+        magic, version, byteorder, mtime, size, _ = header
+        return (magic == self.MAGIC and version == self.VERSION and byteorder == _BYTEORDER
+                and size == source_stat.st_size and (not self.check_mtime or mtime == source_stat.st_mtime_ns))
+
+    def load(self, path: str) -> Optional[dict]:
+        """
+        Returns the cached data of the given source file, or None if there is no valid cache file.
+        The cache file is unpickled, the cache directory must be trusted.
+        """
+        if not self.enabled:
+            return None
+        try:
+            source_stat = os.stat(find_resource(path))
+            with open(self.get_cache_path(path), 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        data = None
+        resolved = None
+        try:
+            header = self.HEADER.unpack_from(mapped, 0)
+            if self._is_valid(header, source_stat):
+                start = self.HEADER.size
+                data = pickle.loads(mapped[start:start + header[5]])
+                arrays_start = _align(start + header[5])
+                resolved = _resolve(data, memoryview(mapped), arrays_start, len(mapped))
+        except Exception:
+            # truncated or corrupted cache file, it will be rewritten
+            pass
+        finally:
+            # the mapping stays open while the returned arrays use it
+            if resolved is None:
+                data = None
+                try:
+                    mapped.close()
+                except BufferError:
+                    # views of a partly resolved file are still referenced, the mapping is closed with them
+                    pass
+        return resolved
+
+    def store(self, path: str, data: dict, source_stat: os.stat_result):
+        """
+        Writes the cache file of the given source file.
+        source_stat should be the stat of the source file taken before it was parsed.
+        """
+        if not self.enabled:
+            return
+        arrays: List[bytes] = []
+        payload = pickle.dumps(_extract(data, arrays, [0]), pickle.HIGHEST_PROTOCOL)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, _BYTEORDER,
+                                  source_stat.st_mtime_ns, source_stat.st_size, len(payload))
+        cache_path = self.get_cache_path(path)
+        tmp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, 'wb') as file:
+                file.write(header)
+                file.write(payload)
+                file.write(b'\0' * (_align(len(header) + len(payload)) - len(header) - len(payload)))
+                for raw in arrays:
+                    file.write(raw)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # the cache is an optimization only, a read only resources directory should not prevent loading
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, path: str, reader: Callable[[str], dict]) -> dict:
+        """Returns the data of the given source file, from the cache if valid, else parsed with reader and cached"""
+        data = self.load(path)
+        if data is None:
+            data = self.build(path, reader)
+        return data
+
+    def build(self, path: str, reader: Callable[[str], dict]) -> dict:
+        """Parses the given source file with reader and writes its cache file"""
+        source_stat = os.stat(find_resource(path))
+        data = reader(path)
+        self.store(path, data, source_stat)
+        return data
+
+    def clear(self):
+        """Removes all the cache files"""
+        directory = find_resource(self.directory)
+        if os.path.isdir(directory):
+            for file in os.listdir(directory):
+                if file.endswith(self.EXTENSION):
+                    os.remove(os.path.join(directory, file))
+
+
+_BYTEORDER = 0 if sys.byteorder == "little" else 1
+
+
+def _align(offset: int) -> int:
+    return (offset + 3) & ~3
+
+
+def _extract(value, arrays: List[bytes], offset: List[int]):
+    """Returns a copy of value where arrays are replaced by _CachedArray, their bytes are appended to arrays"""
+    if isinstance(value, (array, memoryview)):
+        raw = value.tobytes()
+        typecode = value.typecode if isinstance(value, array) else value.format
+        placeholder = _CachedArray(offset[0], len(value), typecode)
+        # arrays are kept aligned on 4 bytes so they can be mapped as uint32
+        raw += b'\0' * (_align(len(raw)) - len(raw))
+        arrays.append(raw)
+        offset[0] += len(raw)
+        return placeholder
+    if isinstance(value, dict):
+        return {k: _extract(v, arrays, offset) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_extract(v, arrays, offset) for v in value]
+    return value
+
+
+def _resolve(value, view: memoryview, start: int, length: int):
+    """Replaces the _CachedArray of value by typed views of the mapped cache file"""
+    if isinstance(value, _CachedArray):
+        begin = start + value.offset
+        end = begin + array(value.typecode).itemsize * value.count
+        if end > length:
+            raise ValueError("Truncated cache file.")
+        return view[begin:end].cast(value.typecode)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            value[k] = _resolve(v, view, start, length)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            value[i] = _resolve(v, view, start, length)
+    return value
+
+
+tmx_cache = TmxCache()
+
+
+def load_tmx(path: str) -> dict:
+    """Returns the parsed data of a .tmx map, using the cache"""
+    return tmx_cache.get(path, read_tmx)
+
+
+def load_tsx(path: str) -> dict:
+    """Returns the parsed data of a .tsx tileset, using the cache"""
+    return tmx_cache.get(path, read_tsx)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m NasNas.tilemapping.cache",
+                                     description="Prebuilds the cache of Tiled maps and tilesets.")
+    parser.add_argument('paths', nargs='*', default=["assets"], help=".tmx/.tsx files or directories to cache")
+    parser.add_argument('--cache-dir', default=tmx_cache.directory, help="cache directory")
+    parser.add_argument('--clear', action='store_true', help="remove the existing cache files first")
+    args = parser.parse_args(argv)
+
+    tmx_cache.directory = args.cache_dir
+    if args.clear:
+        tmx_cache.clear()
+
+    readers = {".tmx": read_tmx, ".tsx": read_tsx}
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                files += [os.path.join(dirpath, f) for f in sorted(filenames)]
+        else:
+            files.append(path)
+
+    count = 0
+    for file in files:
+        ext = os.path.splitext(file)[1]
+        if ext in readers:
+            tmx_cache.build(file, readers[ext])
+            print(f"{file} -> {tmx_cache.get_cache_path(file)}")
+            count += 1
+    print(f"{count} file(s) cached in {tmx_cache.directory}")
+
+
+if __name__ == '__main__':
+    main()
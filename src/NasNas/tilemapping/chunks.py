@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, Tuple, Union
+from array import array
+
+from sfml import sf
+
+from ..data.rect import Rect
+from .tilesets import MapTileset
+from .tiles import TileTransformation, calculate_tex_coords
+
+
+class TileChunk(sf.Drawable):
+    """
+    A rectangular group of tiles of a TileLayer.
+    All the tiles of the chunk using the same tileset are batched in a single QUADS VertexArray,
+    so drawing a chunk costs one draw call per tileset.
+    Vertex arrays are built when the chunk gets near a camera and released when it is evicted by the map.
+    """
+    def __init__(self, layer, x: int, y: int, width: int, height: int,
+                 data: Optional[Union[array, memoryview]] = None, flags: Optional[Union[array, memoryview]] = None):
+        """
+        Args:
+            layer (TileLayer): the TileLayer the chunk belongs to
+            x (int): column of the top left tile of the chunk, in tiles
+            y (int): row of the top left tile of the chunk, in tiles
+            width (int): width of the chunk, in tiles
+            height (int): height of the chunk, in tiles
+            data (array): gids of the chunk tiles, for infinite maps chunks. Defaults to the layer data
+            flags (array): transformation flags of the chunk tiles, for infinite maps chunks. Defaults to the layer flags
+        """
+        super().__init__()
+        self.layer = layer
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.bounds = Rect((x * layer.map.tile_width, y * layer.map.tile_height),
+                           (width * layer.map.tile_width, height * layer.map.tile_height))
+
+        self.data = data
+        self.flags = flags
+        self.vertices: Dict[MapTileset, sf.VertexArray] = {}
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _rows(self):
+        """Yields the row index, gids and flags of each row of the chunk"""
+        if self.data is not None:
+            for j in range(self.height):
+                start = j * self.width
+                yield self.y + j, self.data[start:start + self.width], self.flags[start:start + self.width]
+        else:
+            layer = self.layer
+            for j in range(self.y, self.y + self.height):
+                start = (self.x - layer.start_x) + (j - layer.start_y) * layer.width
+                yield j, layer.data[start:start + self.width], layer.flags[start:start + self.width]
+
+    def build(self):
+        """Fills the vertex arrays of the chunk from the layer data"""
+        layer_map = self.layer.map
+        cells: Dict[MapTileset, List[Tuple[int, int, int, List[int]]]] = {}
+        for j, row, row_flags in self._rows():
+            for i, gid in enumerate(row, self.x):
+                if gid != 0:
+                    tileset = layer_map.get_tileset(gid)
+                    if tileset not in cells:
+                        cells[tileset] = []
+                    transformations = TileTransformation.from_flags(row_flags[i - self.x])
+                    cells[tileset].append((i, j, gid - tileset.first_gid, transformations))
+
+        animator = layer_map.animator
+        animator.unregister(self)
+        self.vertices = {}
+        for tileset, tiles in cells.items():
+            vertices = sf.VertexArray(sf.PrimitiveType.QUADS)
+            vertices.resize(4*len(tiles))
+            tw, th = tileset.tile_width, tileset.tile_height
+            for index, (i, j, tile_id, transformations) in enumerate(tiles):
+                v = 4*index
+                x, y = i*tw, j*th
+                vertices[v + 0].position = sf.Vector2(x, y)
+                vertices[v + 1].position = sf.Vector2(x + tw, y)
+                vertices[v + 2].position = sf.Vector2(x + tw, y + th)
+                vertices[v + 3].position = sf.Vector2(x, y + th)
+                if tile_id in tileset.animations:
+                    # animated tiles texture coordinates are written by the map TileAnimator
+                    animator.register(self, tileset, tile_id, vertices, v, transformations)
+                else:
+                    tex_coords = calculate_tex_coords(tileset, (tile_id % tileset.columns) * tw,
+                                                      (tile_id // tileset.columns) * th, transformations)
+                    for k in range(4):
+                        vertices[v + k].tex_coords = tex_coords[k]
+            self.vertices[tileset] = vertices
+        self._loaded = True
+
+    def unload(self):
+        """Releases the vertex arrays of the chunk, they are built again when needed"""
+        self.layer.map.animator.unregister(self)
+        self.vertices = {}
+        self._loaded = False
+
+    def draw(self, target, states):
+        for tileset, vertices in self.vertices.items():
+            states.texture = tileset.texture
+            target.draw(vertices, states)
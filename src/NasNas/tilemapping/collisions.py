@@ -0,0 +1,115 @@
+from typing import List, Optional
+
+from ..data.rect import Rect
+
+
+class CollisionGrid:
+    """
+    Solidity of the cells of a tile layer, one byte per cell (1 solid, 0 empty).
+    Cells are looked up in constant time, and can be merged into rectangles for the code using collision boxes.
+    """
+    def __init__(self, x: int, y: int, width: int, height: int, tile_width: int, tile_height: int,
+                 cells: Optional[bytearray] = None):
+        """
+        Args:
+            x (int): column of the top left cell, in tiles (infinite maps can start at negative positions)
+            y (int): row of the top left cell, in tiles
+            width (int): number of columns
+            height (int): number of rows
+            tile_width (int): width of a cell, in pixels
+            tile_height (int): height of a cell, in pixels
+            cells (bytearray): solidity of the cells, row by row. Empty grid by default
+        """
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.tile_width, self.tile_height = tile_width, tile_height
+        self.cells = cells if cells is not None else bytearray(width * height)
+
+    @classmethod
+    def from_layer(cls, layer, solid_property: Optional[str] = None) -> 'CollisionGrid':
+        """
+        Builds the grid of a TileLayer. Every non empty tile is solid, or if solid_property is given,
+        only the tiles having this property set to true in their tileset.
+        """
+        tiled_map = layer.map
+        # solidity of each gid, so cells are resolved with a single lookup
+        gids = bytearray(max((t.last_gid for t in tiled_map.tilesets), default=0) + 1)
+        for tileset in tiled_map.tilesets:
+            if solid_property is None:
+                gids[tileset.first_gid:tileset.last_gid + 1] = bytes([1]) * tileset.tile_count
+            else:
+                for tile_id, properties in tileset.properties.items():
+                    if properties.get(solid_property) is True:
+                        gids[tileset.first_gid + tile_id] = 1
+
+        if not layer.infinite:
+            grid = cls(layer.start_x, layer.start_y, layer.width, layer.height, tiled_map.tile_width, tiled_map.tile_height)
+            grid.cells = bytearray(gids[gid] if gid < len(gids) else 0 for gid in layer.data)
+            return grid
+
+        chunks = list(layer.chunks.values())
+        if not chunks:
+            return cls(0, 0, 0, 0, tiled_map.tile_width, tiled_map.tile_height)
+        x0 = min(c.x for c in chunks)
+        y0 = min(c.y for c in chunks)
+        x1 = max(c.x + c.width for c in chunks)
+        y1 = max(c.y + c.height for c in chunks)
+        grid = cls(x0, y0, x1 - x0, y1 - y0, tiled_map.tile_width, tiled_map.tile_height)
+        for chunk in chunks:
+            for j, row, _ in chunk._rows():
+                start = (j - y0) * grid.width + chunk.x - x0
+                grid.cells[start:start + chunk.width] = bytes(gids[gid] if gid < len(gids) else 0 for gid in row)
+        return grid
+
+    def is_solid(self, i: int, j: int) -> bool:
+        """Returns True if the cell at column i and row j is solid, cells outside the grid are empty"""
+        i -= self.x
+        j -= self.y
+        if 0 <= i < self.width and 0 <= j < self.height:
+            return self.cells[i + j * self.width] == 1
+        return False
+
+    def is_solid_at(self, x: float, y: float) -> bool:
+        """Returns True if the cell containing the point (x, y), in pixels, is solid"""
+        return self.is_solid(int(x // self.tile_width), int(y // self.tile_height))
+
+    def set_solid(self, i: int, j: int, solid: bool = True):
+        """Changes the solidity of a cell, the merged rectangles are not updated"""
+        i -= self.x
+        j -= self.y
+        if 0 <= i < self.width and 0 <= j < self.height:
+            self.cells[i + j * self.width] = 1 if solid else 0
+        else:
+            raise IndexError(f"Cell ({i + self.x}, {j + self.y}) is outside the collision grid")
+
+    def merge_rectangles(self) -> List[Rect]:
+        """
+        Returns rectangles, in pixels, covering exactly the solid cells.
+        Runs of solid cells are extended downwards as long as the rows below have the same run,
+        the greedy merge gives few rectangles, not always the minimal number.
+        """
+        free = bytearray(self.cells)
+        width = self.width
+        rects = []
+        for j in range(self.height):
+            row_start = j * width
+            row_end = row_start + width
+            start = free.find(1, row_start, row_end)
+            while start != -1:
+                end = free.find(0, start, row_end)
+                if end == -1:
+                    end = row_end
+                run = free[start:end]
+                # extending the run down while the cells below are solid and not merged yet
+                height = 1
+                below = start + width
+                while j + height < self.height and free[below:below + end - start] == run:
+                    height += 1
+                    below += width
+                for k in range(height):
+                    free[start + k * width:end + k * width] = bytes(end - start)
+                i = start - row_start
+                rects.append(Rect(((self.x + i) * self.tile_width, (self.y + j) * self.tile_height),
+                                  ((end - start) * self.tile_width, height * self.tile_height)))
+                start = free.find(1, end, row_end)
+        return rects
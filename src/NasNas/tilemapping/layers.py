@@ -1,104 +1,242 @@
-from typing import List, Dict, Union, Optional
-from xml.etree import ElementTree
+from typing import List, Dict, Union, Optional, Tuple
+from array import array
 
 from sfml import sf
 
 from ..data.rect import Rect
 from ..data.shapes import EllipseShape, LineShape
+from ..core.utils import get_view_bounds
 from .tiles import Tile
+from .tilesets import convert_properties
+from .chunks import TileChunk
 
 
 class TileLayer(sf.Drawable):
-    def __init__(self, tiledmap, xml: ElementTree.Element):
+    # size of the chunks finite layers are split into, in tiles. Infinite layers use the chunks of the map file
+    CHUNK_SIZE = 16
+
+    def __init__(self, tiledmap, data: dict):
+        """
+        Args:
+            tiledmap (TiledMap): the map the layer belongs to
+            data (dict): the layer data, as read by tmx.read_layer or from the cache
+        """
         super().__init__()
-        self.xml = xml
+        self.layer_data = data
         self.map = tiledmap
 
-        self.id: int = int(self.xml.get('id'))
-        self.name: str = self.xml.get('name')
-        self.width: int = int(self.xml.get('width'))
-        self.height: int = int(self.xml.get('height'))
-        self.visible: bool = not bool(self.xml.get('visible'))
+        self.id: int = data['id']
+        self.name: str = data['name']
+        # position of the top left tile and size of the layer, in tiles. Infinite layers can start at negative positions
+        self.start_x: int = data['x']
+        self.start_y: int = data['y']
+        self.width: int = data['width']
+        self.height: int = data['height']
+        self.visible: bool = data['visible']
+        self.infinite: bool = data['chunks'] is not None
+        self.chunk_width: int = self.CHUNK_SIZE
+        self.chunk_height: int = self.CHUNK_SIZE
 
-        self.tiles: List[List[Optional[Tile]]] = []
+        # gids of the tiles without their transformation flags, and the flags of each tile (see tmx.split_flags)
+        # arrays or memory mapped views of the tmx cache
+        self.data: Union[array, memoryview] = array('I')
+        self.flags: Union[array, memoryview] = array('B')
         self.properties: Dict[str, Union[int, float, str, bool, sf.Color]] = {}
-        self.animated_tiles: Dict[tuple, Tile] = {}
+        self.chunks: Dict[Tuple[int, int], TileChunk] = {}
 
-        self.render_texture: sf.RenderTexture = sf.RenderTexture(self.width*self.map.tile_width,
-                                                                 self.height*self.map.tile_height)
-        self.sprite: sf.Sprite = sf.Sprite(self.render_texture.texture)
+        self._tiles: Dict[Tuple[int, int], Tile] = {}
+        self._dirty_rects: Dict[int, Rect] = {}
 
     def parse(self):
-        # parsing properties of the layer
-        if self.xml.find('properties'):
-            for prop in self.xml.find('properties'):
-                name = prop.get('name')
-                prop_type = prop.get('type')
-                value = prop.get('value')
-                if prop_type == "bool":
-                    value = True if value == "true" else False
-                elif prop_type == "int":
-                    value = int(value)
-                elif prop_type == "float":
-                    value = float(value)
-                elif prop_type == "color":
-                    value = sf.Color(int(value[1:3], 16), int(value[3:5], 16), int(value[5:7], 16), int(value[7:9], 16))
-
-                self.properties[name] = value
-
-        self.render_texture.clear(sf.Color.TRANSPARENT)
-        layer_data = [int(n) for n in self.xml.find('data').text.split(',')]
-        # iterating over the tiles of the layer
-        for j in range(self.height):
-            self.tiles.append([])
-            for i in range(self.width):
-                gid = layer_data[i + j * self.width]
-                if gid != 0:
-                    tile = Tile(self, i, j, gid)
-                    self.tiles[j].append(tile)
-                    self.render_texture.draw(tile)
-                else:
-                    self.tiles[j].append(None)
-
-        self.render_texture.display()
-        self.sprite.texture = self.render_texture.texture
+        self.properties = convert_properties(self.layer_data['properties'])
+        # chunks are only created here, their vertex arrays are built by the map when they get near a camera
+        if self.infinite:
+            chunks_data = self.layer_data['chunks']
+            if chunks_data:
+                self.chunk_width, self.chunk_height = chunks_data[0]['width'], chunks_data[0]['height']
+            for chunk_data in chunks_data:
+                x, y = chunk_data['x'], chunk_data['y']
+                chunk = TileChunk(self, x, y, chunk_data['width'], chunk_data['height'],
+                                  chunk_data['data'], chunk_data['flags'])
+                self.chunks[(x // self.chunk_width, y // self.chunk_height)] = chunk
+        else:
+            self.data = self.layer_data['data']
+            self.flags = self.layer_data['flags']
+            for cy in range(0, self.height, self.CHUNK_SIZE):
+                for cx in range(0, self.width, self.CHUNK_SIZE):
+                    chunk = TileChunk(self, cx, cy, min(self.CHUNK_SIZE, self.width - cx), min(self.CHUNK_SIZE, self.height - cy))
+                    self.chunks[(cx // self.CHUNK_SIZE, cy // self.CHUNK_SIZE)] = chunk
 
     @property
     def position(self):
-        return self.sprite.position
+        return sf.Vector2(0, 0)
 
     @property
     def y(self):
-        return self.sprite.position.y
-
-    def update_tile(self, i, j):
-        tile = self.tiles[j][i]
-        if tile is not None and tile.animated:
-            tile.update()
-            clear = sf.RectangleShape()
-            clear.position = tile.position
-            clear.size = tile.size
-            clear.fill_color = sf.Color.TRANSPARENT
-            self.render_texture.draw(clear, sf.RenderStates(sf.BLEND_NONE))
-            self.render_texture.draw(tile)
+        return 0
+
+    @property
+    def tiles(self) -> 'TileGrid':
+        """Tiles of the layer, accessed with `layer.tiles[j][i]`. Tile objects are created on first access."""
+        return TileGrid(self)
+
+    def get_gid(self, i: int, j: int) -> int:
+        """Returns the gid of the tile at column i and row j, including the transformation flags"""
+        if self.infinite:
+            chunk = self.chunks.get((i // self.chunk_width, j // self.chunk_height))
+            if chunk is None:
+                return 0
+            index = (i - chunk.x) + (j - chunk.y) * chunk.width
+            return chunk.data[index] | (chunk.flags[index] << 29)
+        if 0 <= i < self.width and 0 <= j < self.height:
+            index = i + j * self.width
+            return self.data[index] | (self.flags[index] << 29)
+        raise IndexError(f"Tile ({i}, {j}) is out of TileLayer {self.name} bounds.")
+
+    def get_tile(self, i: int, j: int) -> Optional[Tile]:
+        """Returns the Tile at column i and row j, or None if the cell is empty"""
+        if (i, j) in self._tiles:
+            return self._tiles[(i, j)]
+        gid = self.get_gid(i, j)
+        if gid == 0:
+            return None
+        tile = Tile(self, i, j, gid)
+        self._tiles[(i, j)] = tile
+        return tile
+
+    def get_property(self, name: str, i: int, j: int) -> Union[bool, int, float]:
+        """
+        Returns the value of a bool, int or float tileset property for the tile at column i and row j,
+        0 for empty cells, cells outside the layer and tiles without the property, like get_properties
+        """
+        table = self.map.get_property_table(name)
+        if not self.infinite and not (0 <= i < self.width and 0 <= j < self.height):
+            return table[0]
+        return table[self.get_gid(i, j) & 0x1FFFFFFF]
+
+    def get_properties(self, name: str, i: int, j: int, width: int, height: int) -> List[array]:
+        """
+        Returns the values of a bool, int or float tileset property for a region of width x height tiles
+        starting at column i and row j, one array per row. Cells outside the layer have 0.
+        Rows are converted through the map property table, without creating Tile objects.
+        """
+        table = self.map.get_property_table(name)
+        lookup = table.__getitem__
+        empty = bytes(table.itemsize * width)
+        rows = []
+        for row_j in range(j, j + height):
+            row = array(table.typecode, empty)
+            if self.infinite:
+                cy = row_j // self.chunk_height
+                for cx in range(i // self.chunk_width, (i + width - 1) // self.chunk_width + 1):
+                    chunk = self.chunks.get((cx, cy))
+                    if chunk is None:
+                        continue
+                    start, end = max(i, chunk.x), min(i + width, chunk.x + chunk.width)
+                    index = (row_j - chunk.y) * chunk.width - chunk.x
+                    row[start - i:end - i] = array(table.typecode, map(lookup, chunk.data[index + start:index + end]))
+            elif 0 <= row_j < self.height:
+                start, end = max(i, 0), min(i + width, self.width)
+                if start < end:
+                    index = row_j * self.width
+                    row[start - i:end - i] = array(table.typecode, map(lookup, self.data[index + start:index + end]))
+            rows.append(row)
+        return rows
+
+    def get_chunks(self, area: Rect, margin: int = 0) -> List[TileChunk]:
+        """Returns the chunks intersecting the given area, grown by margin chunks on each side"""
+        chunk_w = self.chunk_width * self.map.tile_width
+        chunk_h = self.chunk_height * self.map.tile_height
+        chunks = []
+        for cy in range(int(area.top // chunk_h) - margin, int((area.top + area.height) // chunk_h) + 1 + margin):
+            for cx in range(int(area.left // chunk_w) - margin, int((area.left + area.width) // chunk_w) + 1 + margin):
+                if (cx, cy) in self.chunks:
+                    chunks.append(self.chunks[(cx, cy)])
+        return chunks
+
+    def preload(self, area: Rect):
+        """
+        Loads the chunks seen in the given area, and the chunks around it so they are ready when the view reaches them
+        """
+        for chunk in self.get_chunks(area, self.map.preload_margin):
+            self.map.load_chunk(chunk)
+
+    def invalidate(self, area: Rect):
+        """Marks an area of the layer as changed since the last time it was drawn"""
+        self._dirty_rects[id(area)] = area
+
+    @property
+    def dirty_rects(self) -> List[Rect]:
+        return list(self._dirty_rects.values())
+
+    def clean(self):
+        self._dirty_rects = {}
 
     def draw(self, target, states):
         if self.visible:
-            target.draw(self.sprite, states)
+            view_bounds = get_view_bounds(target.view)
+            self.preload(view_bounds)
+            # only the chunks seen by the target view are drawn
+            for chunk in self.get_chunks(view_bounds):
+                target.draw(chunk, states)
         else:
             print(f"Trying to draw invisible TileLayer {self.name}")
 
 
+class TileGrid:
+    """
+    Lazy two dimensional access to the tiles of a TileLayer.
+    Rows and columns are absolute map coordinates: infinite layers go from start_y to start_y + height,
+    which can be negative, finite layers start at 0.
+    """
+    def __init__(self, layer: TileLayer):
+        self._layer = layer
+
+    def __getitem__(self, j: int) -> 'TileRow':
+        layer = self._layer
+        if not layer.start_y <= j < layer.start_y + layer.height:
+            raise IndexError(f"Row {j} is out of TileLayer {layer.name} bounds.")
+        return TileRow(layer, j)
+
+    def __len__(self):
+        return self._layer.height
+
+    def __iter__(self):
+        layer = self._layer
+        for j in range(layer.start_y, layer.start_y + layer.height):
+            yield TileRow(layer, j)
+
+
+class TileRow:
+    def __init__(self, layer: TileLayer, j: int):
+        self._layer = layer
+        self._j = j
+
+    def __getitem__(self, i: int) -> Optional[Tile]:
+        layer = self._layer
+        if not layer.start_x <= i < layer.start_x + layer.width:
+            raise IndexError(f"Tile ({i}, {self._j}) is out of TileLayer {layer.name} bounds.")
+        return layer.get_tile(i, self._j)
+
+    def __len__(self):
+        return self._layer.width
+
+    def __iter__(self):
+        layer = self._layer
+        for i in range(layer.start_x, layer.start_x + layer.width):
+            yield layer.get_tile(i, self._j)
+
+
 class ObjectGroup(sf.Drawable):
-    def __init__(self, tiledmap, xml: ElementTree.Element):
+    def __init__(self, tiledmap, data: dict):
         super().__init__()
-        self.xml = xml
+        self.data = data
         self.map = tiledmap
 
-        self.id = int(self.xml.get('id'))
-        self.name = self.xml.get('name')
+        self.id = data['id']
+        self.name = data['name']
 
-        color = self.xml.get('color')
+        color = data['color']
         if color:
             if len(color) == 9:
                 self.color = sf.Color(int(color[3:5], 16), int(color[5:7], 16), int(color[7:9], 16), int(color[1:3], 16))
@@ -113,48 +251,40 @@ class ObjectGroup(sf.Drawable):
         self.polygons = []
         self.lines = []
 
-        self._render_texture = sf.RenderTexture(tiledmap.width*tiledmap.tile_width, tiledmap.height*tiledmap.tile_height)
-        self.sprite = sf.Sprite(self._render_texture.texture)
+        # objects are drawn directly, infinite maps have no size to allocate a texture for
+        self._drawables: List[sf.Drawable] = []
 
     def parse(self):
-        self._render_texture.clear(sf.Color.TRANSPARENT)
+        self._drawables = []
         pts_vertexarray = sf.VertexArray(sf.PrimitiveType.POINTS)
         rect_vertexarray = sf.VertexArray(sf.PrimitiveType.QUADS)
-        for object_elmnt in self.xml.findall('object'):
-            x = float(object_elmnt.get('x'))
-            y = float(object_elmnt.get('y'))
-            width = float(object_elmnt.get('width')) if object_elmnt.get('width') else 0
-            height = float(object_elmnt.get('height')) if object_elmnt.get('height') else 0
-            if not list(object_elmnt):
+        for kind, x, y, width, height, object_points in self.data['objects']:
+            if kind == "rectangle":
                 self.rectangles.append(Rect((x, y), (width, height)))
-            else:
-                child = list(object_elmnt)[0]
-                if child.tag == "ellipse":
-                    ellipse = EllipseShape((width/2, height/2))
-                    ellipse.position = (x, y)
-                    ellipse.fill_color = self.color
-                    self._render_texture.draw(ellipse)
-                elif child.tag == "point":
-                    self.points.append(sf.Vector2(x, y))
-                elif child.tag == "polyline":
-                    points = []
-                    for strpt in child.get('points').split():
-                        points.append(sf.Vector2(float(strpt.split(',')[0]), float(strpt.split(',')[1])))
-                    line = LineShape(*points)
-                    line.position = (x, y)
-                    line.color = self.color
-                    self._render_texture.draw(line)
-                elif child.tag == "polygon":
-                    points = []
-                    for strpt in child.get('points').split():
-                        points.append(sf.Vector2(float(strpt.split(',')[0]), float(strpt.split(',')[1])))
-                    polygone = sf.ConvexShape(len(points))
-                    for i, p in enumerate(points):
-                        polygone.set_point(i, p)
-                    polygone.position = (x, y)
-                    polygone.fill_color = self.color
-                    self.polygons.append(polygone)
-                    self._render_texture.draw(polygone)
+            elif kind == "ellipse":
+                ellipse = EllipseShape((width/2, height/2))
+                ellipse.position = (x, y)
+                ellipse.fill_color = self.color
+                self.ellipses.append(ellipse)
+                self._drawables.append(ellipse)
+            elif kind == "point":
+                self.points.append(sf.Vector2(x, y))
+            elif kind == "polyline":
+                points = [sf.Vector2(px, py) for px, py in object_points]
+                line = LineShape(*points)
+                line.position = (x, y)
+                line.color = self.color
+                self.lines.append(line)
+                self._drawables.append(line)
+            elif kind == "polygon":
+                points = [sf.Vector2(px, py) for px, py in object_points]
+                polygone = sf.ConvexShape(len(points))
+                for i, p in enumerate(points):
+                    polygone.set_point(i, p)
+                polygone.position = (x, y)
+                polygone.fill_color = self.color
+                self.polygons.append(polygone)
+                self._drawables.append(polygone)
 
         rect_vertexarray.resize(4*len(self.rectangles))
         for index in range(0, len(self.rectangles)*4, 4):
@@ -170,14 +300,13 @@ class ObjectGroup(sf.Drawable):
             pts_vertexarray[index].position = self.points[index]
             pts_vertexarray[index].color = self.color
 
-        self._render_texture.draw(rect_vertexarray)
-        self._render_texture.draw(pts_vertexarray)
-        self._render_texture.display()
-        self.sprite.texture = self._render_texture.texture
+        self._drawables.append(rect_vertexarray)
+        self._drawables.append(pts_vertexarray)
 
     @property
     def position(self):
         return sf.Vector2(0, 0)
 
     def draw(self, target, states):
-        target.draw(self.sprite)
+        for drawable in self._drawables:
+            target.draw(drawable, states)
@@ -1,87 +1,224 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
 import os
-from xml.etree import ElementTree
 
 from sfml import sf
 
 from ..data.game_obj import GameObject
 from ..data.rect import Rect
-from ..reslib.resource_path import find_resource
+from ..data.spatial import SpatialHash
 from ..reslib.tileset_manager import TilesetManager
-from .tilesets import Tileset, MapTileset
+from .tilesets import Tileset, MapTileset, TABLE_TYPECODES
 from .layers import TileLayer, ObjectGroup
+from .animations import TileAnimator
+from .collisions import CollisionGrid
+from .cache import load_tmx
 
 
 class TiledMap(GameObject):
+    # size of the collisions index cells, in tiles
+    COLLISIONS_CELL_TILES = 4
+    # default maximum number of chunks having their vertex arrays built, for all the layers of the map.
+    # It is a number of chunks, not of bytes : a loaded chunk holds 4 vertices per tile of the chunk.
+    # Chunks drawn during the last frame are never unloaded, so the limit is exceeded when more chunks are visible
+    MAX_LOADED_CHUNKS = 1024
+    # default distance, in chunks, at which chunks are loaded ahead of the views
+    PRELOAD_MARGIN = 1
+
     def __init__(self, path: str):
         self.name = os.path.basename(path)
         self.path = path
-        self.root = ElementTree.parse(find_resource(os.path.join(os.path.dirname(self.path), self.name))).getroot()
+        # parsed map data, read from the tmx cache when the map file did not change
+        self.data = load_tmx(path)
 
-        self._size: sf.Vector2 = sf.Vector2(int(self.root.get('width')), int(self.root.get('height')))
-        self._tile_size: sf.Vector2 = sf.Vector2(int(self.root.get('tilewidth')), int(self.root.get('tileheight')))
+        self._size: sf.Vector2 = sf.Vector2(self.data['width'], self.data['height'])
+        self._tile_size: sf.Vector2 = sf.Vector2(self.data['tilewidth'], self.data['tileheight'])
 
         self.tilesets: List[MapTileset] = []
         self.layers: Dict[str, TileLayer] = {}
         self.objectgroups: Dict[str, ObjectGroup] = {}
-        self._collisions = []
+        self.animator = TileAnimator()
+        self.max_loaded_chunks = self.MAX_LOADED_CHUNKS
+        self.preload_margin = self.PRELOAD_MARGIN
+        # loaded chunks, from the least to the most recently used, with the frame they were last used in
+        self._loaded_chunks: OrderedDict = OrderedDict()
+        self._frame = 0
+        self._collisions: List[Rect] = []
+        self._collisions_index = SpatialHash(self.COLLISIONS_CELL_TILES * max(self.tile_width, self.tile_height))
+        # solid cells of the collisions layer, None when the collisions come from an objectgroup
+        self.collision_grid: Optional[CollisionGrid] = None
+        # tilesets indexed by _index_tilesets, and their first gid to find the tileset of a gid by bisection
+        self._indexed_tilesets: List[MapTileset] = []
+        self._first_gids: List[int] = []
+        # property name -> value of the property for each gid
+        self._property_tables: Dict[str, array] = {}
 
     def load(self):
         # loading tilesets
-        for tileset_elmnt in self.root.findall('tileset'):
-            name = tileset_elmnt.get('name')
-            if not name:
-                t = TilesetManager.get(os.path.splitext(os.path.basename(tileset_elmnt.get('source')))[0])
+        for tileset_data in self.data['tilesets']:
+            if tileset_data['tileset'] is None:
+                t = TilesetManager.get(os.path.splitext(os.path.basename(tileset_data['source']))[0])
+                # with lazy resources loading, the tileset is loaded by the first map using it
+                if t.texture is None:
+                    t.load()
             else:
-                t = Tileset(tileset_elmnt, self.path)
+                t = Tileset(tileset_data['tileset'], self.path)
                 t.load()
-            self.tilesets.append(MapTileset(t, int(tileset_elmnt.get('firstgid'))))
+            self.tilesets.append(MapTileset(t, tileset_data['firstgid']))
 
         # loading layers
-        for layer_elmnt in self.root.findall('layer'):
-            layer = TileLayer(self, layer_elmnt)
+        for layer_data in self.data['layers']:
+            layer = TileLayer(self, layer_data)
             layer.parse()
             self.layers[layer.name] = layer
 
         # loading objectgroups
-        for objectgroup_elmnt in self.root.findall('objectgroup'):
-            objectgroup = ObjectGroup(self, objectgroup_elmnt)
+        for objectgroup_data in self.data['objectgroups']:
+            objectgroup = ObjectGroup(self, objectgroup_data)
             objectgroup.parse()
             self.objectgroups[objectgroup.name] = objectgroup
 
     def update(self):
-        yrange = []
-        xrange = []
-        for cam in self.game.cameras:
-            yboundsmin = max(0, int(cam.top) // 16 - 2)
-            yboundsmax = min(self.size.x, int(cam.bottom) // 16 + 2)
-            yrange += list(range(yboundsmin, yboundsmax))
-            xboundsmin = max(0, int(cam.left) // 16 - 2)
-            xboundsmax = min(self.size.y, int(cam.right) // 16 + 2)
-            xrange += list(range(xboundsmin, xboundsmax))
-        yrange = list(set(yrange))
-        xrange = list(set(xrange))
-        # iterating over the visible tiles only
-        for j in yrange:
-            for i in xrange:
-                for layer in self.layers.values():
-                    if layer.visible:
-                        layer.update_tile(i, j)
-        for layer in self.layers.values():
-            if layer.visible:
-                layer.render_texture.display()
-                layer.sprite.texture = layer.render_texture.texture
+        with self.game.profiler.section("tiledmap"):
+            # updating the animated tiles, only the cells whose frame changed are rewritten
+            self.animator.update()
+            self.evict_chunks()
+            self._frame += 1
+
+    def load_chunk(self, chunk):
+        """Builds the given chunk if needed and marks it as the most recently used"""
+        if chunk in self._loaded_chunks:
+            self._loaded_chunks.move_to_end(chunk)
+        else:
+            chunk.build()
+        self._loaded_chunks[chunk] = self._frame
+
+    def evict_chunks(self):
+        """
+        Unloads the least recently used chunks until the number of loaded chunks is under max_loaded_chunks.
+        The chunks used since the last update are kept, they would be built again in the next frame.
+        """
+        while len(self._loaded_chunks) > self.max_loaded_chunks:
+            chunk, frame = next(iter(self._loaded_chunks.items()))
+            if frame >= self._frame:
+                break
+            del self._loaded_chunks[chunk]
+            chunk.unload()
+
+    @property
+    def loaded_chunks(self) -> int:
+        return len(self._loaded_chunks)
+
+    @property
+    def infinite(self) -> bool:
+        return self.data['infinite']
+
+    def _index_tilesets(self):
+        """
+        Indexes the tilesets again if the tilesets list changed (tilesets added, removed or replaced).
+        Tilesets are listed by first gid as in the map file.
+        """
+        if self.tilesets != self._indexed_tilesets:
+            self.invalidate_tilesets()
+
+    def invalidate_tilesets(self):
+        """
+        Drops the tilesets index and the property tables. Changes to the tilesets list are found automatically,
+        call it after changing the first gid or the tiles properties of a tileset.
+        """
+        self._indexed_tilesets = list(self.tilesets)
+        self._first_gids = [tileset.first_gid for tileset in self.tilesets]
+        self._property_tables = {}
+        for tileset in self.tilesets:
+            tileset.clear_property_tables()
+
+    def get_tileset(self, gid: int) -> Optional[MapTileset]:
+        """Returns the MapTileset containing the given gid (without transformation flags)"""
+        self._index_tilesets()
+        index = bisect_right(self._first_gids, gid) - 1
+        if index >= 0:
+            tileset = self.tilesets[index]
+            if gid <= tileset.last_gid:
+                return tileset
+        return None
+
+    def get_property_table(self, name: str) -> array:
+        """
+        Returns the values of a bool, int or float tile property indexed by gid (without transformation flags),
+        compiled from the property tables of all the tilesets. Empty cells and tiles without the property have 0.
+        """
+        self._index_tilesets()
+        table = self._property_tables.get(name)
+        if table is None:
+            tables = [tileset.property_table(name) for tileset in self.tilesets]
+            typecode = max((t.typecode for t in tables), key=TABLE_TYPECODES.index, default='B')
+            size = max((tileset.last_gid for tileset in self.tilesets), default=0) + 1
+            table = array(typecode, bytes(array(typecode).itemsize * size))
+            for tileset, tileset_table in zip(self.tilesets, tables):
+                if tileset_table.typecode != typecode:
+                    tileset_table = array(typecode, tileset_table)
+                table[tileset.first_gid:tileset.last_gid + 1] = tileset_table
+            self._property_tables[name] = table
+        return table
+
+    def _set_collisions(self, boxes: List[Rect]):
+        self._collisions = boxes
+        self._collisions_index.clear()
+        for box in self._collisions:
+            self._collisions_index.insert(box)
 
     def set_collisions_objectgroup(self, name):
         if name in self.objectgroups:
-            self._collisions = self.objectgroups[name].rectangles
+            self.collision_grid = None
+            self._set_collisions(self.objectgroups[name].rectangles)
         else:
             raise AttributeError(f"{name} is not an objectgroup of {self.name} TiledMap")
 
+    def set_collisions_layer(self, name: str, solid_property: Optional[str] = None):
+        """
+        Uses the tiles of a TileLayer as collisions : every non empty tile is solid, or if solid_property is given,
+        only the tiles having this boolean property set to true in their tileset (like "solid").
+        The solid cells are merged into as few rectangles as possible for get_collisions.
+        """
+        if name in self.layers:
+            self.collision_grid = CollisionGrid.from_layer(self.layers[name], solid_property)
+            self._set_collisions(self.collision_grid.merge_rectangles())
+        else:
+            raise AttributeError(f"{name} is not a layer of {self.name} TiledMap")
+
+    def is_solid(self, x: float, y: float) -> bool:
+        """Returns True if the point (x, y), in pixels, is in a solid cell of the collisions layer"""
+        if self.collision_grid is None:
+            return False
+        return self.collision_grid.is_solid_at(x, y)
+
+    def add_collision(self, box: Rect):
+        """Adds a collision rectangle to the map at runtime"""
+        self._collisions.append(box)
+        self._collisions_index.insert(box)
+
+    def remove_collision(self, box: Rect):
+        """Removes a collision rectangle from the map at runtime"""
+        for index, collision in enumerate(self._collisions):
+            if collision is box:
+                self._collisions.pop(index)
+                self._collisions_index.remove(box)
+                break
+
+    def get_collisions(self, area) -> List[Rect]:
+        """Returns the collision rectangles overlapping or touching the given area"""
+        return self._collisions_index.query(area)
+
     @property
     def collisions(self) -> List[Rect]:
         return self._collisions
 
+    @property
+    def collisions_index(self) -> SpatialHash:
+        return self._collisions_index
+
     @property
     def size(self) -> sf.Vector2:
         return self._size
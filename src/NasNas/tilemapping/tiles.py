@@ -13,6 +13,23 @@ class TileTransformation:
     ROT180 = HORIZONTAL_FLIP + VERTICAL_FLIP
     ROT270 = VERTICAL_FLIP + DIAGONAL_FLIP
 
+    # transformations of each flags value, flags being the 3 most significant bits of a gid shifted by 29
+    FLAGS_TRANSFORMATIONS = [
+        [],
+        [DIAGONAL_FLIP],
+        [VERTICAL_FLIP],
+        [VERTICAL_FLIP, DIAGONAL_FLIP],
+        [HORIZONTAL_FLIP],
+        [HORIZONTAL_FLIP, DIAGONAL_FLIP],
+        [HORIZONTAL_FLIP, VERTICAL_FLIP],
+        [HORIZONTAL_FLIP, VERTICAL_FLIP, DIAGONAL_FLIP],
+    ]
+
+    @staticmethod
+    def from_flags(flags: int) -> List[int]:
+        """Returns the transformations of a tile from its flags (see tmx.split_flags)"""
+        return TileTransformation.FLAGS_TRANSFORMATIONS[flags]
+
     @staticmethod
     def get_transformations(tile_id: int):
         transformations = []
@@ -25,6 +42,45 @@ class TileTransformation:
         return transformations
 
 
+def calculate_tex_coords(tileset: MapTileset, tx: int, ty: int, transformations: List[int]) -> List[sf.Vector2]:
+    """
+    Returns the texture coordinates of the 4 vertices of the tile located at (tx, ty) on the tileset texture,
+    with the tile transformations applied.
+    """
+    tx += tileset.texture_offset.x
+    ty += tileset.texture_offset.y
+    tex_coords = [
+        sf.Vector2(tx, ty),
+        sf.Vector2(tx + tileset.tile_width, ty),
+        sf.Vector2(tx + tileset.tile_width, ty + tileset.tile_height),
+        sf.Vector2(tx, ty + tileset.tile_height)
+    ]
+    # applying tile transformation to the texture coordinates
+    modifier = [sf.Vector2(0, 0), sf.Vector2(0, 0), sf.Vector2(0, 0), sf.Vector2(0, 0)]
+    index0, index1, index2, index3 = range(4)
+    if TileTransformation.DIAGONAL_FLIP in transformations:
+        if transformations == [TileTransformation.HORIZONTAL_FLIP, TileTransformation.DIAGONAL_FLIP] \
+                or transformations == [TileTransformation.VERTICAL_FLIP, TileTransformation.DIAGONAL_FLIP]:
+            index0 = 2
+            index2 = 0
+            tex_coords[0], tex_coords[2] = tex_coords[2], tex_coords[0]
+        else:
+            index1 = 3
+            index3 = 1
+            tex_coords[1], tex_coords[3] = tex_coords[3], tex_coords[1]
+    if TileTransformation.HORIZONTAL_FLIP in transformations:
+        modifier[index0] += sf.Vector2(tileset.tile_width, 0)
+        modifier[index1] += sf.Vector2(-tileset.tile_width, 0)
+        modifier[index2] += sf.Vector2(-tileset.tile_width, 0)
+        modifier[index3] += sf.Vector2(tileset.tile_width, 0)
+    if TileTransformation.VERTICAL_FLIP in transformations:
+        modifier[index0] += sf.Vector2(0, tileset.tile_height)
+        modifier[index1] += sf.Vector2(0, tileset.tile_height)
+        modifier[index2] += sf.Vector2(0, -tileset.tile_height)
+        modifier[index3] += sf.Vector2(0, -tileset.tile_height)
+    return [tex_coords[i] + modifier[i] for i in range(4)]
+
+
 class Tile(sf.Drawable):
     def __init__(self, tilelayer, x: int, y: int, gid: int):
         super().__init__()
@@ -37,11 +93,8 @@ class Tile(sf.Drawable):
         self._transformations = TileTransformation.get_transformations(self._gid)
         for tr in self._transformations:
             self._gid -= tr
-        for tileset in self._map.tilesets:
-            if tileset.first_gid <= self._gid <= tileset.last_gid:
-                self._id = self._gid - tileset.first_gid
-                self._tileset = tileset
-                break
+        self._tileset = self._map.get_tileset(self._gid)
+        self._id = self._gid - self._tileset.first_gid
 
         self._x = x*self._tileset.tile_width
         self._y = y*self._tileset.tile_height
@@ -63,12 +116,9 @@ class Tile(sf.Drawable):
         self._sprite[3].tex_coords = tex_coords[3]
 
         self._frames = []
-        self._anim_data = []
-        self._anim_index = 0
 
         if self.id in self._tileset.animations:
-            self._anim_data = self.tileset.animations[self.id]
-            for frame in self._anim_data:
+            for frame in self.tileset.animations[self.id]:
                 vert = sf.VertexArray(sf.PrimitiveType.QUADS)
                 vert.resize(4)
                 tx = (frame['id'] % self._tileset.columns) * self._tileset.tile_width
@@ -83,48 +133,14 @@ class Tile(sf.Drawable):
                 vert[2].tex_coords = tex_coords[2]
                 vert[3].tex_coords = tex_coords[3]
                 self._frames.append(vert)
-        self._clock = sf.Clock()
 
     def _calculate_tex_coo(self, tx, ty) -> List[sf.Vector2]:
-        tex_coords = [
-            sf.Vector2(tx, ty),
-            sf.Vector2(tx + self._tileset.tile_width, ty),
-            sf.Vector2(tx + self._tileset.tile_width, ty + self._tileset.tile_height),
-            sf.Vector2(tx, ty + self._tileset.tile_height)
-        ]
-        # applying tile transformation to the texture coordinates
-        modifier = [sf.Vector2(0, 0), sf.Vector2(0, 0), sf.Vector2(0, 0), sf.Vector2(0, 0)]
-        index0, index1, index2, index3 = range(4)
-        if TileTransformation.DIAGONAL_FLIP in self._transformations:
-            if self._transformations == [TileTransformation.HORIZONTAL_FLIP, TileTransformation.DIAGONAL_FLIP] \
-                    or self._transformations == [TileTransformation.VERTICAL_FLIP, TileTransformation.DIAGONAL_FLIP]:
-                index0 = 2
-                index2 = 0
-                tex_coords[0], tex_coords[2] = tex_coords[2], tex_coords[0]
-            else:
-                index1 = 3
-                index3 = 1
-                tex_coords[1], tex_coords[3] = tex_coords[3], tex_coords[1]
-        if TileTransformation.HORIZONTAL_FLIP in self._transformations:
-            modifier[index0] += sf.Vector2(self._tileset.tile_width, 0)
-            modifier[index1] += sf.Vector2(-self._tileset.tile_width, 0)
-            modifier[index2] += sf.Vector2(-self._tileset.tile_width, 0)
-            modifier[index3] += sf.Vector2(self._tileset.tile_width, 0)
-        if TileTransformation.VERTICAL_FLIP in self._transformations:
-            modifier[index0] += sf.Vector2(0, self._tileset.tile_height)
-            modifier[index1] += sf.Vector2(0, self._tileset.tile_height)
-            modifier[index2] += sf.Vector2(0, -self._tileset.tile_height)
-            modifier[index3] += sf.Vector2(0, -self._tileset.tile_height)
-        return [tex_coords[i] + modifier[i] for i in range(4)]
+        return calculate_tex_coords(self._tileset, tx, ty, self._transformations)
 
     def update(self):
         if self._frames:
-            if self._clock.elapsed_time.milliseconds > self._anim_data[self._anim_index]['duration']:
-                self._anim_index += 1
-                if self._anim_index > len(self._frames) - 1:
-                    self._anim_index = 0
-                self._sprite = self._frames[self._anim_index]
-                self._clock.restart()
+            # the frame is given by the timeline shared by all the tiles with the same animation
+            self._sprite = self._frames[self._map.animator.get(self._tileset, self._id).index]
 
     def draw(self, target, state):
         state.texture = self._tileset.texture
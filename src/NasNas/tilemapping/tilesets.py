@@ -1,31 +1,78 @@
-from typing import Dict, Union, List, Optional
+from typing import Dict, Iterable, Union, List, Optional, Tuple
+from array import array
 import os
-from xml.etree import ElementTree
 
 from sfml import sf
 
 from ..reslib.resource_path import split_path
 
 
+def convert_properties(raw_properties: List[Tuple[str, str, str]]) -> Dict[str, Union[bool, int, float, str, sf.Color]]:
+    """Converts properties read from a Tiled file to their python types"""
+    properties = {}
+    for name, prop_type, val in raw_properties:
+        if prop_type == "bool":
+            val = True if val == "true" else False
+        elif prop_type == "int":
+            val = int(val)
+        elif prop_type == "float":
+            val = float(val)
+        elif prop_type == "color":
+            val = sf.Color(int(val[1:3], 16), int(val[3:5], 16), int(val[5:7], 16), int(val[7:9], 16))
+        properties[name] = val
+    return properties
+
+
+# array typecodes of the property tables, from the narrowest : bools, ints, floats
+TABLE_TYPECODES = "Bqd"
+
+
+def table_typecode(values: Iterable) -> str:
+    """Returns the array typecode able to store the given property values, which must be bools, ints or floats"""
+    typecode = 'B'
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, int):
+            if typecode == 'B':
+                typecode = 'q'
+        elif isinstance(value, float):
+            typecode = 'd'
+        else:
+            raise TypeError(f"Only bool, int and float properties can be compiled in a table, got {value!r}")
+    return typecode
+
+
 class Tileset:
     """ Base class for tilesets, called when loading a tileset """
-    def __init__(self, xml: ElementTree.Element, path: str):
-        self.xml_root: ElementTree.Element = xml
+    def __init__(self, data: dict, path: str):
+        """
+        Args:
+            data (dict): the tileset data, as read by tmx.read_tileset or from the cache
+            path (str): path of the file the tileset comes from
+        """
+        self.data = data
         self.path = path
 
-        image = self.xml_root.find('image')
-
-        self.name: str = self.xml_root.get('name')
-        self.columns: int = int(self.xml_root.get('columns'))
-        self.rows: int = int(image.get('height')) // int(self.xml_root.get('tileheight'))
-        self.tile_width: int = int(self.xml_root.get('tilewidth'))
-        self.tile_height: int = int(self.xml_root.get('tileheight'))
-        self.tile_count: int = int(self.xml_root.get('tilecount'))
-        self.texture_source = image.get('source')
+        self.name: str = data['name']
+        self.columns: int = data['columns']
+        self.rows: int = data['imageheight'] // data['tileheight']
+        self.tile_width: int = data['tilewidth']
+        self.tile_height: int = data['tileheight']
+        self.tile_count: int = data['tilecount']
+        self.texture_source = data['image']
         self.texture: Optional[sf.Texture] = None
-
-        self.properties: Dict[int, Dict[str, Union[bool, int, float, str, sf.Color]]] = {}
-        self.animations: Dict[int, List[Dict[str, int]]] = {}
+        # position of the tileset image in its texture, not null when the image is packed in the texture atlas
+        self.texture_offset = sf.Vector2(0, 0)
+
+        self.properties: Dict[int, Dict[str, Union[bool, int, float, str, sf.Color]]] = {
+            tile_id: convert_properties(props) for tile_id, props in data['properties'].items()
+        }
+        self.animations: Dict[int, List[Dict[str, int]]] = {
+            tile_id: [{'id': frame_id, 'duration': duration} for frame_id, duration in frames]
+            for tile_id, frames in data['animations'].items()
+        }
+        self._property_tables: Dict[str, array] = {}
 
     def load(self):
         texture_path = split_path(os.path.dirname(self.path)) + split_path(os.path.splitext(self.texture_source)[0])
@@ -34,49 +81,42 @@ class Tileset:
         res = Res
         if texture_path[0] == "assets":
             texture_path.pop(0)
+
+        region = Res.atlas.get("/".join(texture_path)) if Res.atlas else None
+        if region is not None:
+            self.texture = region.texture
+            self.texture_offset = region.offset
+            return
+
         for folder in texture_path:
             res = getattr(res, folder)
 
         self.texture = res
 
-        for tile in self.xml_root.findall('tile'):
-            tile_id = int(tile.get('id'))
-            for child in tile:
-                if child.tag == "properties":
-                    if tile_id not in self.properties:
-                        self.properties[tile_id] = {}
-
-                    for prop in child:
-                        name = prop.get('name')
-                        prop_type = prop.get('type')
-                        val = prop.get('value')
-                        if prop_type == "bool":
-                            val = True if val == "true" else False
-                        elif prop_type == "int":
-                            val = int(val)
-                        elif prop_type == "float":
-                            val = float(val)
-                        elif prop_type == "color":
-                            val = sf.Color(int(val[1:3], 16), int(val[3:5], 16), int(val[5:7], 16), int(val[7:9], 16))
-                        self.properties[tile_id].update({name: val})
-
-                elif child.tag == "animation":
-                    if tile_id not in self.animations:
-                        self.animations[tile_id] = []
-
-                    for frame in child:
-                        self.animations[tile_id].append(
-                            {
-                                'id': int(frame.get('tileid')),
-                                'duration': int(frame.get('duration'))
-                            }
-                        )
+    def property_table(self, name: str) -> array:
+        """
+        Returns the values of a bool, int or float tile property, indexed by tile id.
+        Tiles without the property have 0 (False). Tables are compiled on first use.
+        """
+        table = self._property_tables.get(name)
+        if table is None:
+            values = {tile_id: props[name] for tile_id, props in self.properties.items() if name in props}
+            typecode = table_typecode(values.values())
+            table = array(typecode, bytes(array(typecode).itemsize * self.tile_count))
+            for tile_id, value in values.items():
+                table[tile_id] = value
+            self._property_tables[name] = table
+        return table
+
+    def clear_property_tables(self):
+        """Drops the compiled property tables, to call after changing the tiles properties"""
+        self._property_tables = {}
 
     def get_tile_tex_coord(self, id: int):
         if id < self.tile_count:
             tx = (id % self.columns) * self.tile_width
             ty = (id // self.columns) * self.tile_height
-            return sf.Vector2(tx, ty)
+            return sf.Vector2(tx, ty) + self.texture_offset
         else:
             raise IndexError(f'Tile id {id} not found in tileset {self.name}.')
 
@@ -124,6 +164,10 @@ class MapTileset:
     def texture(self) -> sf.Texture:
         return self._data.texture
 
+    @property
+    def texture_offset(self) -> sf.Vector2:
+        return self._data.texture_offset
+
     @property
     def properties(self) -> Dict[int, Dict[str, Union[bool, int, float, str, sf.Color]]]:
         return self._data.properties
@@ -132,5 +176,11 @@ class MapTileset:
     def animations(self) -> Dict[int, List[Dict[str, int]]]:
         return self._data.animations
 
+    def property_table(self, name: str) -> array:
+        return self._data.property_table(name)
+
+    def clear_property_tables(self):
+        self._data.clear_property_tables()
+
     def get_tile_tex_coord(self, id: int):
         return self._data.get_tile_tex_coord(id)
@@ -0,0 +1,216 @@
+"""
+Reading of Tiled files (.tmx maps and .tsx tilesets) into plain python data.
+The returned dictionaries only contain builtin types and arrays, so they can be stored by the TmxCache.
+"""
+from typing import Dict, List, Optional, Tuple
+from array import array
+from xml.etree import ElementTree
+import base64
+import gzip
+import sys
+import zlib
+
+try:  # optional, only needed for zstd compressed layers
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..reslib.resource_path import find_resource
+
+# (name, type, value) of a property, as written in the Tiled file
+RawProperty = Tuple[str, str, str]
+
+
+def read_properties(elmnt: Optional[ElementTree.Element]) -> List[RawProperty]:
+    """Reads the properties of a `properties` element"""
+    properties = []
+    if elmnt is not None:
+        for prop in elmnt:
+            properties.append((prop.get('name'), prop.get('type'), prop.get('value')))
+    return properties
+
+
+def read_tileset(elmnt: ElementTree.Element) -> dict:
+    """Reads a `tileset` element, from a .tsx file or embedded in a map"""
+    image = elmnt.find('image')
+    tileset = {
+        'name': elmnt.get('name'),
+        'columns': int(elmnt.get('columns')),
+        'tilewidth': int(elmnt.get('tilewidth')),
+        'tileheight': int(elmnt.get('tileheight')),
+        'tilecount': int(elmnt.get('tilecount')),
+        'image': image.get('source'),
+        'imageheight': int(image.get('height')),
+        'properties': {},
+        'animations': {},
+    }
+    for tile in elmnt.findall('tile'):
+        tile_id = int(tile.get('id'))
+        for child in tile:
+            if child.tag == "properties":
+                if tile_id not in tileset['properties']:
+                    tileset['properties'][tile_id] = []
+                tileset['properties'][tile_id] += read_properties(child)
+
+            elif child.tag == "animation":
+                if tile_id not in tileset['animations']:
+                    tileset['animations'][tile_id] = []
+                for frame in child:
+                    tileset['animations'][tile_id].append((int(frame.get('tileid')), int(frame.get('duration'))))
+    return tileset
+
+
+# byte of each uint32 holding the flip flags (the 3 most significant bits), in native byte order
+_FLAGS_BYTE = 3 if sys.byteorder == "little" else 0
+# translation tables applied to the flags bytes : keeps the 3 flags bits only, clears them
+_FLAGS_TABLE = bytes(b >> 5 for b in range(256))
+_GID_TABLE = bytes(b & 0x1F for b in range(256))
+
+
+def decompress(raw: bytes, compression: Optional[str]) -> bytes:
+    """Decompresses base64 decoded layer data"""
+    if not compression:
+        return raw
+    if compression == "zlib":
+        return zlib.decompress(raw)
+    if compression == "gzip":
+        return gzip.decompress(raw)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard package is required to load zstd compressed layers.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    raise ValueError(f"Unsupported layer data compression {compression}.")
+
+
+def read_layer_data(elmnt: ElementTree.Element, encoding: Optional[str] = None,
+                    compression: Optional[str] = None) -> array:
+    """
+    Reads the gids of a `data` (or `chunk`) element into an array of unsigned ints, transformation flags included.
+    Base64 data is copied as is in the array, no python int is created per tile.
+    """
+    if encoding is None:
+        encoding, compression = elmnt.get('encoding'), elmnt.get('compression')
+    if encoding == "base64":
+        data = array('I')
+        data.frombytes(decompress(base64.b64decode(elmnt.text.strip()), compression))
+        # Tiled stores gids in little endian
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+    return array('I', (int(n) for n in elmnt.text.split(',')))
+
+
+def split_flags(data: array) -> Tuple[array, array]:
+    """
+    Splits raw gids into gids without transformation flags and the flags of each tile.
+    The flags of a tile are a number from 0 to 7 : its bits are the horizontal, vertical and diagonal flips flags.
+    The whole array is processed by bytes slicing, without looping over the tiles.
+    """
+    raw = bytearray(data.tobytes())
+    flags = array('B', raw[_FLAGS_BYTE::4].translate(_FLAGS_TABLE))
+    raw[_FLAGS_BYTE::4] = raw[_FLAGS_BYTE::4].translate(_GID_TABLE)
+    gids = array('I')
+    gids.frombytes(raw)
+    return gids, flags
+
+
+def read_chunks(elmnt: ElementTree.Element) -> List[Dict]:
+    """Reads the `chunk` elements of an infinite map layer `data` element"""
+    encoding, compression = elmnt.get('encoding'), elmnt.get('compression')
+    chunks = []
+    for chunk_elmnt in elmnt.findall('chunk'):
+        gids, flags = split_flags(read_layer_data(chunk_elmnt, encoding, compression))
+        chunks.append({
+            'x': int(chunk_elmnt.get('x')),
+            'y': int(chunk_elmnt.get('y')),
+            'width': int(chunk_elmnt.get('width')),
+            'height': int(chunk_elmnt.get('height')),
+            'data': gids,
+            'flags': flags,
+        })
+    return chunks
+
+
+def read_layer(elmnt: ElementTree.Element) -> dict:
+    """
+    Reads a tile `layer` element, gids and flip flags are stored in separate arrays.
+    Layers of infinite maps have their data split in chunks instead.
+    """
+    layer = {
+        'id': int(elmnt.get('id')),
+        'name': elmnt.get('name'),
+        'x': int(elmnt.get('startx', 0)),
+        'y': int(elmnt.get('starty', 0)),
+        'width': int(elmnt.get('width')),
+        'height': int(elmnt.get('height')),
+        'visible': not bool(elmnt.get('visible')),
+        'properties': read_properties(elmnt.find('properties')),
+        'data': None,
+        'flags': None,
+        'chunks': None,
+    }
+    data_elmnt = elmnt.find('data')
+    if data_elmnt.find('chunk') is not None:
+        layer['chunks'] = read_chunks(data_elmnt)
+    else:
+        layer['data'], layer['flags'] = split_flags(read_layer_data(data_elmnt))
+    return layer
+
+
+def read_objectgroup(elmnt: ElementTree.Element) -> dict:
+    """
+    Reads an `objectgroup` element. Each object is read as a tuple (kind, x, y, width, height, points),
+    kind being one of "rectangle", "ellipse", "point", "polyline" and "polygon".
+    """
+    objects = []
+    for object_elmnt in elmnt.findall('object'):
+        x = float(object_elmnt.get('x'))
+        y = float(object_elmnt.get('y'))
+        width = float(object_elmnt.get('width')) if object_elmnt.get('width') else 0
+        height = float(object_elmnt.get('height')) if object_elmnt.get('height') else 0
+        points = None
+        children = list(object_elmnt)
+        if not children:
+            kind = "rectangle"
+        else:
+            kind = children[0].tag
+            if kind in ("polyline", "polygon"):
+                points = []
+                for strpt in children[0].get('points').split():
+                    points.append((float(strpt.split(',')[0]), float(strpt.split(',')[1])))
+        objects.append((kind, x, y, width, height, points))
+
+    return {
+        'id': int(elmnt.get('id')),
+        'name': elmnt.get('name'),
+        'color': elmnt.get('color'),
+        'objects': objects,
+    }
+
+
+def read_tsx(path: str) -> dict:
+    """Reads a .tsx tileset file"""
+    return read_tileset(ElementTree.parse(find_resource(path)).getroot())
+
+
+def read_tmx(path: str) -> dict:
+    """Reads a .tmx map file"""
+    root = ElementTree.parse(find_resource(path)).getroot()
+    tilesets: List[Dict] = []
+    for tileset_elmnt in root.findall('tileset'):
+        tilesets.append({
+            'firstgid': int(tileset_elmnt.get('firstgid')),
+            'source': tileset_elmnt.get('source'),
+            # embedded tileset, only if the tileset is not in an external .tsx file
+            'tileset': read_tileset(tileset_elmnt) if tileset_elmnt.get('name') else None,
+        })
+    return {
+        'width': int(root.get('width')),
+        'height': int(root.get('height')),
+        'tilewidth': int(root.get('tilewidth')),
+        'tileheight': int(root.get('tileheight')),
+        'infinite': root.get('infinite') == "1",
+        'tilesets': tilesets,
+        'layers': [read_layer(layer_elmnt) for layer_elmnt in root.findall('layer')],
+        'objectgroups': [read_objectgroup(group_elmnt) for group_elmnt in root.findall('objectgroup')],
+    }
@@ -136,6 +136,10 @@ class BoxBorder():
         self._render_textures[(w, h)] = render_texture
         return render_texture.texture
 
+    def clear_cache(self):
+        """Frees the generated textures, they are generated again the next time they are needed"""
+        self._render_textures.clear()
+
 
 class ButtonStyle:
     __slots__ = ["width", "height", "size", "bounds", "margin", "font",